@@ -1,6 +1,5 @@
 """
 API package initialization.
-"""
-from .app import app
 
-__all__ = ['app']
+The application is built by api.app.create_app(); see wsgi.py.
+"""
@@ -1,33 +1,145 @@
 """
 Flask API for the discount dashboard.
 Provides endpoints to query and filter discount data.
+
+create_app() builds the application; wsgi.py exposes it to gunicorn (see
+gunicorn.conf.py) and `python -m api.app`, run from the backend
+directory, starts the Flask development server. The database schema is
+created or migrated by ensure_db(), not at import: in the gunicorn master
+before the workers fork, otherwise before a process's first request.
 """
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, jsonify, request
 from flask_cors import CORS
-import sys
 import os
+import base64
+import binascii
+import json
+import threading
 
-# Add backend directory to path
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-
-from models import Discount, SessionLocal, init_db
+from models import (
+    Discount, SessionLocal, init_db, compute_stats, load_summary,
+    search_condition, relevance_ranking, product_history, CanonicalProduct
+)
+from models.summary import SCHEDULER_STATUS_PATH
+from api.cache import cached_response, response_cache
+from api.metrics import PROMETHEUS_CONTENT_TYPE, init_metrics, metrics, serialization_timer
+from api.replica import READ_REPLICA, ReadReplica
+from api.serialization import parse_fields, rows_to_dicts, json_response, ndjson_response, dumps
+from utils.export import ARROW_AVAILABLE, Keyset, iter_chunks, stream_csv, stream_json, stream_arrow
 from datetime import datetime
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func, tuple_
+
+bp = Blueprint('api', __name__)
+
+# Memory-resident snapshot serving listings and stats (READ_REPLICA=true);
+# it is loaded on first use, not here
+replica = ReadReplica(on_swap=response_cache.clear) if READ_REPLICA else None
+
+_db_ready = False
+_db_lock = threading.Lock()
+
+
+def ensure_db():
+    """
+    Create or migrate the schema once per process.
+    
+    Runs before every request and returns at once after the first call.
+    The gunicorn master calls it before forking, so the workers inherit
+    _db_ready and never run init_db() themselves.
+    """
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            init_db()
+            _db_ready = True
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for frontend access
 
-# Initialize database on startup
-init_db()
+def create_app(config=None):
+    """
+    Application factory.
+    
+    Builds the Flask app with CORS, request metrics and the API routes.
+    Importing or calling it does not touch the database; ensure_db() runs
+    before the first request instead.
+    """
+    app = Flask(__name__)
+    if config:
+        app.config.update(config)
+    CORS(app)  # Enable CORS for frontend access
+    # Before the metrics hooks, so first-request schema setup isn't counted
+    app.before_request(ensure_db)
+    init_metrics(app)
+    app.register_blueprint(bp)
+    return app
 
 
-@app.route('/api/health', methods=['GET'])
+@bp.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
 
-@app.route('/api/discounts', methods=['GET'])
+def discount_filters(args):
+    """
+    Build SQLAlchemy filter conditions from request query parameters.
+    
+    Shared by every endpoint that accepts the /api/discounts filters.
+    """
+    conditions = [Discount.is_active == True]
+    
+    supermarket = args.get('supermarket')
+    if supermarket:
+        conditions.append(Discount.supermarket == supermarket)
+    
+    category = args.get('category')
+    if category:
+        conditions.append(Discount.category == category)
+    
+    min_discount = args.get('min_discount', type=float)
+    if min_discount:
+        conditions.append(Discount.discount_percentage >= min_discount)
+    
+    search = args.get('search')
+    if search:
+        conditions.append(search_condition(search))
+    
+    return conditions
+
+
+def encode_cursor(pct, discount_id):
+    """Encode the keyset position (discount_percentage, id) of a row as an opaque token."""
+    raw = json.dumps([pct, discount_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor token; raises ValueError if it is malformed."""
+    try:
+        pct, discount_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (float(pct) if pct is not None else None), int(discount_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def keyset_after(pct, discount_id):
+    """
+    Filter condition selecting the rows that follow (pct, id) in the
+    discount_percentage DESC NULLS LAST, id DESC ordering. The listing
+    queries spell out NULLS LAST, so NULL percentages sort last on every
+    dialect (PostgreSQL would otherwise put them first).
+    """
+    if pct is None:
+        return and_(Discount.discount_percentage.is_(None), Discount.id < discount_id)
+    return or_(
+        tuple_(Discount.discount_percentage, Discount.id) < tuple_(pct, discount_id),
+        Discount.discount_percentage.is_(None)
+    )
+
+
+@bp.route('/api/discounts', methods=['GET'])
+@cached_response
 def get_discounts():
     """
     Get all active discounts with optional filters.
@@ -36,61 +148,141 @@ def get_discounts():
     - supermarket: Filter by supermarket name
     - category: Filter by category
     - min_discount: Minimum discount percentage
-    - search: Search in product name
+    - search: Full-text prefix search in product name, description and category
+    - sort: 'discount' (default) or 'relevance' (requires search; uses offset
+      pagination)
     - limit: Maximum number of results (default: 100)
     - offset: Pagination offset (default: 0)
+    - cursor: Opaque token from a previous response's next_cursor; continues
+      after that row (keyset pagination, ignores offset)
+    - include_total: Set to false to skip counting matching rows (default: true)
+    - fields: Comma-separated list of fields to return (default: all)
+    - format: 'json' (default) or 'ndjson' to stream one discount per line
+      as rows are fetched. The stream has no total or next_cursor, and
+      returns every matching row unless limit is given.
+    
+    With the read replica enabled, JSON listings without search are served
+    from memory.
     """
     session = SessionLocal()
+    streaming = request.args.get('format') == 'ndjson'
+    # Set once the NDJSON stream has taken over closing the session
+    streamed = False
     
     try:
-        # Start with base query for active discounts
-        query = session.query(Discount).filter(Discount.is_active == True)
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Apply filters
-        supermarket = request.args.get('supermarket')
-        if supermarket:
-            query = query.filter(Discount.supermarket == supermarket)
+        if replica is not None and not streaming and not request.args.get('search'):
+            return replica_discounts(replica.get(), fields)
         
-        category = request.args.get('category')
-        if category:
-            query = query.filter(Discount.category == category)
+        conditions = discount_filters(request.args)
         
-        min_discount = request.args.get('min_discount', type=float)
-        if min_discount:
-            query = query.filter(Discount.discount_percentage >= min_discount)
-        
-        search = request.args.get('search')
-        if search:
-            query = query.filter(Discount.product_name.ilike(f'%{search}%'))
+        # Select only the requested columns; the keyset columns are appended
+        # so the next cursor can be built from the last row
+        columns = [getattr(Discount, f) for f in fields]
+        query = session.query(*columns, Discount.discount_percentage, Discount.id).filter(*conditions)
         
         # Get total count before pagination
-        total = query.count()
+        include_total = request.args.get('include_total', 'true').lower() not in ('false', '0', 'no')
+        include_total = include_total and not streaming
+        total = session.query(func.count(Discount.id)).filter(*conditions).scalar() if include_total else None
         
         # Apply pagination
         limit = request.args.get('limit', default=100, type=int)
         offset = request.args.get('offset', default=0, type=int)
         
-        # Order by discount percentage (highest first)
-        query = query.order_by(Discount.discount_percentage.desc())
+        ranking = None
+        if request.args.get('sort') == 'relevance' and request.args.get('search'):
+            ranking = relevance_ranking(request.args.get('search'))
         
-        # Apply limit and offset
-        discounts = query.limit(limit).offset(offset).all()
+        cursor = request.args.get('cursor')
+        if ranking is not None:
+            # Best match first; cursors only follow the discount ordering
+            ranked, rank = ranking
+            query = query.join(ranked, ranked.c.rowid == Discount.id).order_by(rank, Discount.id.desc())
+        else:
+            if cursor:
+                try:
+                    query = query.filter(keyset_after(*decode_cursor(cursor)))
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                offset = 0
+            
+            # Order by discount percentage (highest first), id breaks ties
+            query = query.order_by(Discount.discount_percentage.desc().nullslast(), Discount.id.desc())
         
-        return jsonify({
-            'discounts': [d.to_dict() for d in discounts],
-            'total': total,
+        if streaming:
+            if 'limit' in request.args:
+                query = query.limit(limit)
+            response = ndjson_response(session, query.offset(offset), fields)
+            streamed = True
+            return response
+        
+        # Fetch one extra row to know whether another page exists
+        rows = query.limit(limit + 1).offset(offset).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        response = {
+            'discounts': rows_to_dicts(rows, fields),
             'limit': limit,
-            'offset': offset
-        })
+            'offset': offset,
+            'next_cursor': (
+                encode_cursor(rows[-1][-2], rows[-1][-1]) if has_more and rows and ranking is None else None
+            )
+        }
+        if include_total:
+            response['total'] = total
         
+        return json_response(response)
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+    
     finally:
-        session.close()
+        if not streamed:
+            session.close()
 
 
-@app.route('/api/discounts/<int:discount_id>', methods=['GET'])
+def replica_discounts(snapshot, fields):
+    """Serve an /api/discounts page from a read replica snapshot, in the same shape as the database path."""
+    args = request.args
+    mask = snapshot.filter_mask(args.get('supermarket'), args.get('category'), args.get('min_discount', type=float))
+    
+    limit = max(args.get('limit', default=100, type=int), 0)
+    offset = max(args.get('offset', default=0, type=int), 0)
+    
+    start = 0
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            start = snapshot.start_after(*decode_cursor(cursor))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        offset = 0
+    
+    # Fetch one extra row to know whether another page exists
+    positions = snapshot.page(mask, start, offset, limit + 1)
+    has_more = len(positions) > limit
+    positions = positions[:limit]
+    
+    response = {
+        'discounts': snapshot.rows(positions, fields),
+        'limit': limit,
+        'offset': offset,
+        'next_cursor': encode_cursor(*snapshot.key(positions[-1])) if has_more and len(positions) else None
+    }
+    if args.get('include_total', 'true').lower() not in ('false', '0', 'no'):
+        response['total'] = snapshot.count(mask)
+    
+    return json_response(response)
+
+
+@bp.route('/api/discounts/<int:discount_id>', methods=['GET'])
+@cached_response
 def get_discount(discount_id):
     """Get a specific discount by ID."""
     session = SessionLocal()
@@ -101,101 +293,311 @@ def get_discount(discount_id):
         if not discount:
             return jsonify({'error': 'Discount not found'}), 404
         
-        return jsonify(discount.to_dict())
+        with serialization_timer():
+            payload = discount.to_dict()
+        return jsonify(payload)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    finally:
+        session.close()
+
+
+@bp.route('/api/products/<int:product_id>/history', methods=['GET'])
+@cached_response
+def get_product_history(product_id):
+    """
+    Get the price history of a product.
+    
+    product_id is the product_id of a discount. Returns the product with its
+    lowest and highest recorded prices, and its price runs oldest first:
+    each run covers consecutive observations at the same prices.
+    """
+    session = SessionLocal()
+    
+    try:
+        history = product_history(session, product_id)
+        
+        if history is None:
+            return jsonify({'error': 'Product not found'}), 404
         
+        return json_response(history)
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    finally:
+        session.close()
+
+
+# Offer columns returned by /api/compare
+COMPARE_FIELDS = [
+    'id', 'supermarket', 'product_name', 'original_price', 'discount_price',
+    'discount_percentage', 'valid_until', 'product_id', 'is_all_time_low'
+]
+
+
+@bp.route('/api/compare', methods=['GET'])
+@cached_response
+def compare_products():
+    """
+    Compare the active offers of the same product across supermarkets.
+    
+    Offers are grouped by canonical_id, the product identity assigned at
+    ingestion, so the comparison is an index lookup rather than a fuzzy
+    match of product names.
+    
+    Query parameters:
+    - canonical_id: Compare a single canonical product
+    - supermarket, category, min_discount, search: Filter offers as in
+      /api/discounts
+    - include_single: Set to true to include products offered by only one
+      supermarket (default: false)
+    - limit: Maximum number of products (default: 50)
+    - after: canonical_id from a previous response's next_after; continues
+      after that product
+    """
+    session = SessionLocal()
+    
+    try:
+        conditions = discount_filters(request.args) + [Discount.canonical_id.isnot(None)]
+        
+        canonical_id = request.args.get('canonical_id', type=int)
+        if canonical_id is not None:
+            conditions.append(Discount.canonical_id == canonical_id)
+        
+        after = request.args.get('after', type=int)
+        if after is not None:
+            conditions.append(Discount.canonical_id > after)
+        
+        limit = request.args.get('limit', default=50, type=int)
+        include_single = request.args.get('include_single', 'false').lower() in ('true', '1', 'yes')
+        
+        # Page of canonical products, walking ix_discounts_active_canonical
+        page = session.query(Discount.canonical_id).filter(*conditions).group_by(Discount.canonical_id)
+        if not include_single:
+            # More than one supermarket, without a COUNT(DISTINCT ...)
+            page = page.having(func.min(Discount.supermarket) < func.max(Discount.supermarket))
+        ids = [row[0] for row in page.order_by(Discount.canonical_id).limit(limit + 1)]
+        has_more = len(ids) > limit
+        ids = ids[:limit]
+        
+        if not ids:
+            return json_response({'products': [], 'limit': limit, 'next_after': None})
+        
+        offers = {}
+        columns = [getattr(Discount, f) for f in COMPARE_FIELDS]
+        rows = session.query(Discount.canonical_id, *columns).filter(
+            *conditions, Discount.canonical_id.in_(ids)
+        ).order_by(Discount.canonical_id, Discount.discount_price)
+        for row in rows:
+            offers.setdefault(row[0], []).append(dict(zip(COMPARE_FIELDS, row[1:])))
+        
+        canonicals = {
+            c.id: c for c in session.query(CanonicalProduct).filter(CanonicalProduct.id.in_(ids))
+        }
         
+        products = []
+        for canonical_id in ids:
+            product_offers = offers.get(canonical_id, [])
+            products.append(dict(
+                canonicals[canonical_id].to_dict(),
+                supermarkets=len({o['supermarket'] for o in product_offers}),
+                cheapest=product_offers[0] if product_offers else None,
+                offers=product_offers
+            ))
+        
+        return json_response({
+            'products': products,
+            'limit': limit,
+            'next_after': ids[-1] if has_more else None
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
     finally:
         session.close()
 
 
-@app.route('/api/supermarkets', methods=['GET'])
+# /api/export pages in the /api/discounts order, which the partial indexes serve
+DISCOUNT_KEYSET = Keyset(
+    [Discount.discount_percentage, Discount.id],
+    [Discount.discount_percentage.desc().nullslast(), Discount.id.desc()],
+    keyset_after
+)
+
+# Streaming formats of /api/export
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+@bp.route('/api/export', methods=['GET'])
+def export_discounts():
+    """
+    Export the active discounts matching the /api/discounts filters.
+    
+    Rows come in the /api/discounts order, read in keyset-paginated chunks
+    and written to the response as each chunk is fetched, so memory use
+    does not grow with the number of rows. Not cached: the body is streamed.
+    
+    Query parameters:
+    - supermarket, category, min_discount, search: As in /api/discounts
+    - fields: Comma-separated list of fields to return (default: all)
+    - format: 'csv' (default), 'json' (a single array) or 'arrow' (Arrow
+      IPC stream, requires pyarrow)
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': f"Unknown format: {fmt}"}), 400
+    if fmt == 'arrow' and not ARROW_AVAILABLE:
+        return jsonify({'error': 'Arrow export requires pyarrow'}), 400
+    
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conditions = discount_filters(request.args)
+    
+    def generate():
+        session = SessionLocal()
+        try:
+            chunks = iter_chunks(session, fields, conditions, keyset=DISCOUNT_KEYSET)
+            if fmt == 'csv':
+                yield from stream_csv(chunks, fields)
+            elif fmt == 'json':
+                yield from stream_json(chunks, fields, dumps)
+            else:
+                yield from stream_arrow(chunks, fields)
+        finally:
+            session.close()
+    
+    return Response(
+        generate(), mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename=discounts.{fmt}'}
+    )
+
+
+@bp.route('/api/supermarkets', methods=['GET'])
+@cached_response
 def get_supermarkets():
     """Get list of all supermarkets with active discounts."""
     session = SessionLocal()
     
     try:
-        supermarkets = session.query(Discount.supermarket).filter(
-            Discount.is_active == True
-        ).distinct().all()
+        summary = replica.get().summary if replica is not None else load_summary(session)
         
         return jsonify({
-            'supermarkets': [s[0] for s in supermarkets]
+            'supermarkets': summary['supermarkets'],
+            'generation': summary['generation']
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+    
     finally:
         session.close()
 
 
-@app.route('/api/categories', methods=['GET'])
+@bp.route('/api/categories', methods=['GET'])
+@cached_response
 def get_categories():
     """Get list of all categories with active discounts."""
     session = SessionLocal()
     
     try:
-        categories = session.query(Discount.category).filter(
-            Discount.is_active == True,
-            Discount.category.isnot(None)
-        ).distinct().all()
+        summary = replica.get().summary if replica is not None else load_summary(session)
         
         return jsonify({
-            'categories': sorted([c[0] for c in categories if c[0]])
+            'categories': summary['categories'],
+            'generation': summary['generation']
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+    
     finally:
         session.close()
 
 
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
+@cached_response
 def get_stats():
-    """Get statistics about discounts."""
+    """
+    Get statistics about discounts.
+    
+    Returns count, average, min, max and percentiles of the discount
+    percentage overall, per supermarket and per category. Accepts the same
+    filters as /api/discounts; unfiltered requests are served from the
+    precomputed summary. With the read replica enabled, requests without
+    search are answered from memory.
+    """
     session = SessionLocal()
     
     try:
-        total_discounts = session.query(Discount).filter(Discount.is_active == True).count()
-        
-        # Get discount count by supermarket
-        supermarket_counts = {}
-        supermarkets = session.query(Discount.supermarket).filter(
-            Discount.is_active == True
-        ).distinct().all()
+        conditions = discount_filters(request.args)
         
-        for sm in supermarkets:
-            supermarket_counts[sm[0]] = session.query(Discount).filter(
-                Discount.supermarket == sm[0],
-                Discount.is_active == True
-            ).count()
+        snapshot = replica.get() if replica is not None and not request.args.get('search') else None
+        if snapshot is not None and len(conditions) > 1:
+            args = request.args
+            mask = snapshot.filter_mask(
+                args.get('supermarket'), args.get('category'), args.get('min_discount', type=float)
+            )
+            return jsonify(snapshot.stats(mask))
         
-        # Calculate average discount percentage
-        avg_discount = session.query(Discount.discount_percentage).filter(
-            Discount.is_active == True,
-            Discount.discount_percentage.isnot(None)
-        ).all()
-        
-        avg_discount_pct = sum([d[0] for d in avg_discount if d[0]]) / len(avg_discount) if avg_discount else 0
+        if len(conditions) > 1:
+            return jsonify(compute_stats(session, conditions))
         
+        summary = snapshot.summary if snapshot is not None else load_summary(session)
         return jsonify({
-            'total_discounts': total_discounts,
-            'supermarket_counts': supermarket_counts,
-            'average_discount_percentage': round(avg_discount_pct, 2)
+            **summary['stats'],
+            'generation': summary['generation'],
+            'refreshed_at': summary['refreshed_at']
         })
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+    
     finally:
         session.close()
 
 
+@bp.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Get the request metrics of this process in the Prometheus text format.
+    
+    Per endpoint: request counts by status, a latency histogram, SQL
+    statements per request, and SQL and serialization time.
+    """
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@bp.route('/api/scheduler', methods=['GET'])
+def get_scheduler_status():
+    """
+    Get the collection scheduler's state and run timings.
+    
+    Returns the status last written by the scheduler: per-scraper interval,
+    next run, circuit breaker state and last run timings, plus expiry runs.
+    updated_at tells how fresh it is.
+    """
+    try:
+        with open(SCHEDULER_STATUS_PATH, 'r') as f:
+            return jsonify(json.load(f))
+    except FileNotFoundError:
+        return jsonify({'error': 'Scheduler has not run'}), 404
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e)}), 500
+
+
 if __name__ == '__main__':
-    import os
     # Only enable debug mode in development
     debug_mode = os.getenv('FLASK_ENV', 'production') == 'development'
-    app.run(debug=debug_mode, host='0.0.0.0', port=5000)
+    app = create_app()
+    app.run(debug=debug_mode, host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
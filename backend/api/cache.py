@@ -0,0 +1,134 @@
+"""
+Response cache for the read-only API endpoints.
+
+Discount data only changes when the data collector runs, so serialized
+responses are cached per endpoint and normalized query string, with a TTL
+and LRU eviction. The collector touches a data version file after every
+refresh (see models.summary); a changed version clears the cache, which
+also works when the collector runs in another process.
+
+Cached responses carry ETag and Last-Modified headers, so a repeat request
+with If-None-Match / If-Modified-Since gets a 304 without touching the
+database or serializing anything.
+"""
+from flask import Response, make_response, request
+import os
+
+from models.summary import DATA_VERSION_PATH
+from api.metrics import is_profiling
+from functools import wraps
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+import hashlib
+import threading
+import time
+
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '300'))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'mimetype', 'etag', 'last_modified', 'expires'])
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized responses with a TTL."""
+    
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, version_path=DATA_VERSION_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_path = version_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+    
+    def _check_version(self):
+        """Clear the cache if the data version file changed since the last request."""
+        try:
+            mtime_ns = os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        
+        if mtime_ns != self._version:
+            with self._lock:
+                self._entries.clear()
+                self._version = mtime_ns
+                if mtime_ns is not None:
+                    self._last_modified = datetime.fromtimestamp(
+                        mtime_ns // 1_000_000_000, timezone.utc
+                    )
+    
+    def get(self, key):
+        """Return the live entry for key, or None."""
+        self._check_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+    
+    def set(self, key, body, mimetype):
+        """Store a serialized response body and return its entry."""
+        entry = CacheEntry(
+            body=body,
+            mimetype=mimetype,
+            etag=hashlib.sha1(body).hexdigest(),
+            last_modified=self._last_modified,
+            expires=time.monotonic() + self.ttl
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+    
+    def clear(self):
+        """Drop every cached response (explicit invalidation)."""
+        with self._lock:
+            self._entries.clear()
+            self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+response_cache = ResponseCache()
+
+
+def cache_key():
+    """Key a request on its path and its sorted query arguments."""
+    args = sorted(request.args.items(multi=True))
+    return (request.path, tuple(args))
+
+
+def cached_response(view):
+    """
+    Serve a GET endpoint from the response cache.
+    
+    Only successful responses are cached; streamed responses and profiled
+    requests are passed through untouched. Every cached response is
+    conditional: a matching If-None-Match or If-Modified-Since yields 304.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if is_profiling():
+            return view(*args, **kwargs)
+        
+        key = cache_key()
+        entry = response_cache.get(key)
+        
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = response_cache.set(key, response.get_data(), response.mimetype)
+        
+        response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        # Let browsers keep the body but revalidate on every load
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    
+    return wrapper
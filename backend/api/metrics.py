@@ -0,0 +1,272 @@
+"""
+Request metrics and on-demand profiling for the API.
+
+Every request is timed per endpoint (its URL rule, so all of
+/api/discounts/<id> is one series), together with the SQL statements it
+ran and their time, taken from SQLAlchemy cursor events on the engine, and
+the time spent turning rows into JSON (rows_to_dicts, dumps and jsonify).
+/api/metrics renders the totals in the Prometheus text format.
+
+With API_PROFILING enabled, adding ?profile=1 to a request runs it under
+cProfile and returns a plain-text summary instead of the response: the
+request's time, SQL and serialization totals, and the top functions by
+cumulative time. The body of a streamed response is read inside the
+profile. Profiled requests bypass the response cache and are not counted
+in the metrics.
+
+Metrics are kept per process, so under gunicorn each worker reports its
+own. The duration of a streamed response ends at its first byte.
+"""
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+import os
+
+from models.database import engine
+from sqlalchemy import event
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import cProfile
+import io
+import pstats
+import threading
+import time
+
+API_METRICS = os.getenv('API_METRICS', 'true').lower() in ('true', '1', 'yes')
+API_PROFILING = os.getenv('API_PROFILING', 'false').lower() in ('true', '1', 'yes')
+
+# Functions listed in a ?profile=1 summary
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', '40'))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+class RequestStats:
+    """Timings of the request being served."""
+    
+    __slots__ = ('start', 'queries', 'query_time', 'serialization_time', 'profiler')
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.serialization_time = 0.0
+        self.profiler = None
+
+
+# Stats of the request the current thread is serving, None outside requests
+_current = ContextVar('request_stats', default=None)
+
+
+def record_serialization(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.serialization_time += seconds
+
+
+@contextmanager
+def serialization_timer():
+    """Count the time spent in the block as serialization time of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_serialization(time.perf_counter() - start)
+
+
+def is_profiling():
+    """Whether the current request runs under ?profile=1."""
+    stats = _current.get()
+    return stats is not None and stats.profiler is not None
+
+
+class Histogram:
+    """Per-label-set bucket counts, sums and counts of observed values."""
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = {}
+        self.sums = defaultdict(float)
+    
+    def observe(self, labels, value):
+        counts = self.counts.get(labels)
+        if counts is None:
+            # One count per bucket plus +Inf
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+    
+    def render(self, name, label_names):
+        lines = []
+        for labels, counts in sorted(self.counts.items()):
+            label_text = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label_text}}} {self.sums[labels]!r}')
+            lines.append(f'{name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class Metrics:
+    """Thread-safe request, SQL and serialization totals of this process."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = Histogram(LATENCY_BUCKETS)
+            self.queries_per_request = Histogram(QUERY_COUNT_BUCKETS)
+            self.sql_queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.serialization_seconds = defaultdict(float)
+    
+    def observe(self, endpoint, method, status, stats, elapsed):
+        """Record one finished request."""
+        key = (endpoint,)
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            self.latency.observe(key, elapsed)
+            self.queries_per_request.observe(key, stats.queries)
+            self.sql_queries[key] += stats.queries
+            self.sql_seconds[key] += stats.query_time
+            self.serialization_seconds[key] += stats.serialization_time
+    
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        def counter(name, help_text, values, label_names=('endpoint',)):
+            lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines.extend(f'{name}{{{_labels(label_names, k)}}} {v!r}' for k, v in sorted(values.items()))
+            return lines
+        
+        with self._lock:
+            lines = counter(
+                'api_requests_total', 'Requests served.', self.requests, ('endpoint', 'method', 'status')
+            )
+            lines += [
+                '# HELP api_request_duration_seconds Time to build a response, to the first byte when streamed.',
+                '# TYPE api_request_duration_seconds histogram',
+                *self.latency.render('api_request_duration_seconds', ('endpoint',)),
+                '# HELP api_sql_queries_per_request SQL statements executed per request.',
+                '# TYPE api_sql_queries_per_request histogram',
+                *self.queries_per_request.render('api_sql_queries_per_request', ('endpoint',)),
+            ]
+            lines += counter('api_sql_queries_total', 'SQL statements executed.', self.sql_queries)
+            lines += counter('api_sql_duration_seconds_total', 'Time spent executing SQL.', self.sql_seconds)
+            lines += counter(
+                'api_serialization_duration_seconds_total', 'Time spent serializing responses.',
+                self.serialization_seconds
+            )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get('query_start')
+    if stats is not None and starts:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - starts.pop()
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    starts = conn.info.get('query_start') if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(bind=engine):
+    """Count the statements run on bind and their time against the current request."""
+    if not event.contains(bind, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(bind, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(bind, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(bind, 'handle_error', _handle_error)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with jsonify() counted as serialization time."""
+    
+    def response(self, *args, **kwargs):
+        with serialization_timer():
+            return super().response(*args, **kwargs)
+
+
+def _start_request():
+    stats = RequestStats()
+    g.metrics_token = _current.set(stats)
+    if API_PROFILING and request.args.get('profile') == '1':
+        stats.profiler = cProfile.Profile()
+        stats.profiler.enable()
+
+
+def _finish_request(response):
+    stats = _current.get()
+    if stats is None:
+        return response
+    if stats.profiler is not None:
+        return profile_response(stats, response)
+    
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe(endpoint, request.method, response.status_code, stats, time.perf_counter() - stats.start)
+    return response
+
+
+def _teardown_request(exc):
+    stats = _current.get()
+    if stats is not None and stats.profiler is not None:
+        stats.profiler.disable()
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def profile_response(stats, response):
+    """Replace response with the profile summary of the request that built it."""
+    body = response.get_data()
+    stats.profiler.disable()
+    elapsed = time.perf_counter() - stats.start
+    
+    out = io.StringIO()
+    pstats.Stats(stats.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+    stats.profiler = None
+    summary = (
+        f"{request.method} {request.full_path} -> {response.status_code}, {len(body)} bytes "
+        f"in {elapsed * 1000:.1f} ms\n"
+        f"SQL: {stats.queries} queries in {stats.query_time * 1000:.1f} ms\n"
+        f"Serialization: {stats.serialization_time * 1000:.1f} ms\n\n"
+    )
+    return Response(summary + out.getvalue(), mimetype='text/plain')
+
+
+def init_metrics(app):
+    """Register the request hooks and SQL event hooks (unless API_METRICS is off)."""
+    if not API_METRICS:
+        return
+    app.json = TimedJSONProvider(app)
+    instrument_engine()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,256 @@
+"""
+In-process read replica of the active discounts.
+
+The active discounts only change when the data collector runs and fit
+comfortably in memory, so with READ_REPLICA enabled the API answers
+/api/discounts listings and /api/stats from a memory-resident snapshot
+instead of going through SQLAlchemy to SQLite.
+
+A snapshot holds every active row in the listing order (discount_percentage
+DESC, id DESC), so a page is a slice of the filtered positions and never
+needs a sort. ids and percentages are NumPy arrays, supermarket and
+category are stored as small integer codes with one boolean bitmap per
+value, and the other columns are object arrays only touched to build the
+rows of a page. Full-text search and relevance ranking still go to the
+database.
+
+The collector touches the data version file after every refresh (see
+models.summary). The next request that sees a new version starts a
+background load of a new snapshot and keeps serving the old one; the new
+snapshot replaces it with a single reference assignment, so a request
+always sees one consistent snapshot.
+"""
+import os
+
+from models import Discount, SessionLocal, load_summary
+from models.summary import DATA_VERSION_PATH, STATS_PERCENTILES, empty_stats
+from api.serialization import DISCOUNT_FIELDS
+from sqlalchemy import select
+import logging
+import math
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+READ_REPLICA = os.getenv('READ_REPLICA', 'false').lower() in ('true', '1', 'yes')
+
+# Rows fetched per round trip while loading a snapshot
+REPLICA_LOAD_BATCH_SIZE = 10000
+
+
+def _round(value):
+    return round(float(value), 2) if value is not None else None
+
+
+def _group_stats(values, count):
+    """
+    Stats of one group, matching models.summary.compute_stats.
+    
+    values are the group's non-null percentages in descending order; count
+    includes the rows without a percentage.
+    """
+    n = len(values)
+    if not n:
+        return empty_stats(count)
+    ascending = values[::-1]
+    return {
+        'count': count,
+        'average': _round(values.mean()),
+        'min': _round(ascending[0]),
+        'max': _round(values[0]),
+        # Nearest rank: the smallest value whose rank is at least p * n
+        **{name: _round(ascending[max(math.ceil(p * n), 1) - 1]) for name, p in STATS_PERCENTILES.items()}
+    }
+
+
+class Snapshot:
+    """Immutable column store of the active discounts, in listing order."""
+    
+    def __init__(self, columns, summary, version):
+        self.version = version
+        self.summary = summary
+        self.loaded_at = time.time()
+        self.size = len(columns['id'])
+        
+        self.ids = np.asarray(columns['id'], dtype=np.int64)
+        self.pct = np.array(
+            [np.nan if v is None else v for v in columns['discount_percentage']], dtype=np.float64
+        )
+        self._pct_null = np.isnan(self.pct)
+        
+        self.supermarkets, self.supermarket_codes, self.supermarket_bitmaps = self._encode(columns['supermarket'])
+        self.categories, self.category_codes, self.category_bitmaps = self._encode(columns['category'])
+        
+        self._objects = {}
+        for name in DISCOUNT_FIELDS:
+            if name not in ('id', 'supermarket', 'category'):
+                values = np.empty(self.size, dtype=object)
+                values[:] = columns[name]
+                self._objects[name] = values
+    
+    def _encode(self, values):
+        """Dictionary-encode a low-cardinality column into codes and per-value bitmaps."""
+        names = sorted({v for v in values if v is not None})
+        lookup = {name: code for code, name in enumerate(names)}
+        codes = np.fromiter((lookup.get(v, -1) for v in values), dtype=np.int16, count=len(values))
+        bitmaps = {name: codes == code for name, code in lookup.items()}
+        return np.array(names + [None], dtype=object), codes, bitmaps
+    
+    def filter_mask(self, supermarket=None, category=None, min_discount=None):
+        """Boolean mask of the rows matching the filters, or None for every row."""
+        mask = None
+        if supermarket:
+            mask = self.supermarket_bitmaps.get(supermarket, np.zeros(self.size, dtype=bool))
+        if category:
+            bitmap = self.category_bitmaps.get(category, np.zeros(self.size, dtype=bool))
+            mask = bitmap if mask is None else mask & bitmap
+        if min_discount:
+            above = self.pct >= min_discount
+            mask = above if mask is None else mask & above
+        return mask
+    
+    def count(self, mask):
+        return self.size if mask is None else int(np.count_nonzero(mask))
+    
+    def start_after(self, pct, discount_id):
+        """First position after the keyset (pct, id); the rows after a key form a suffix."""
+        if pct is None:
+            after = self._pct_null & (self.ids < discount_id)
+        else:
+            after = (self.pct < pct) | ((self.pct == pct) & (self.ids < discount_id)) | self._pct_null
+        return self.size - int(np.count_nonzero(after))
+    
+    def page(self, mask, start=0, offset=0, limit=100):
+        """Positions of up to limit matching rows, skipping offset rows from start."""
+        if mask is None:
+            begin = min(start + offset, self.size)
+            return np.arange(begin, min(begin + limit, self.size))
+        positions = np.flatnonzero(mask[start:]) + start
+        return positions[offset:offset + limit]
+    
+    def rows(self, positions, fields):
+        """Row dicts of the given positions with the requested fields."""
+        columns = []
+        for name in fields:
+            if name == 'id':
+                values = self.ids[positions].tolist()
+            elif name == 'supermarket':
+                values = self.supermarkets[self.supermarket_codes[positions]].tolist()
+            elif name == 'category':
+                values = self.categories[self.category_codes[positions]].tolist()
+            else:
+                values = self._objects[name][positions].tolist()
+            columns.append(values)
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+    
+    def key(self, position):
+        """Keyset (pct, id) of a position, for the next cursor."""
+        return self._objects['discount_percentage'][position], int(self.ids[position])
+    
+    def stats(self, mask):
+        """compute_stats() over the rows matching mask, without the database."""
+        selected = np.ones(self.size, dtype=bool) if mask is None else mask
+        
+        def group(bitmap):
+            rows = selected & bitmap
+            return _group_stats(self.pct[rows & ~self._pct_null], int(np.count_nonzero(rows)))
+        
+        by_supermarket = {}
+        for name, bitmap in self.supermarket_bitmaps.items():
+            if (selected & bitmap).any():
+                by_supermarket[name] = group(bitmap)
+        by_category = {}
+        for name, bitmap in self.category_bitmaps.items():
+            if (selected & bitmap).any():
+                by_category[name] = group(bitmap)
+        
+        overall = group(np.ones(self.size, dtype=bool)) if selected.any() else empty_stats()
+        return {
+            'total_discounts': overall['count'],
+            'supermarket_counts': {name: stats['count'] for name, stats in by_supermarket.items()},
+            'average_discount_percentage': overall['average'] or 0,
+            'overall': overall,
+            'by_supermarket': by_supermarket,
+            'by_category': by_category
+        }
+
+
+def load_snapshot(session, version=None):
+    """Read the active discounts and the summary into a new Snapshot."""
+    table = Discount.__table__
+    columns = {name: [] for name in DISCOUNT_FIELDS}
+    result = session.execute(
+        select(*[table.c[name] for name in DISCOUNT_FIELDS]).where(table.c.is_active == True)
+        .order_by(table.c.discount_percentage.desc().nullslast(), table.c.id.desc()),
+        execution_options={'yield_per': REPLICA_LOAD_BATCH_SIZE}
+    )
+    lists = [columns[name] for name in DISCOUNT_FIELDS]
+    for rows in result.partitions():
+        for values, row in zip(lists, zip(*rows)):
+            values.extend(row)
+    return Snapshot(columns, load_summary(session), version)
+
+
+class ReadReplica:
+    """Holds the current snapshot and swaps in a new one when the data version changes."""
+    
+    def __init__(self, session_factory=SessionLocal, version_path=DATA_VERSION_PATH, on_swap=None):
+        self.session_factory = session_factory
+        self.version_path = version_path
+        self.on_swap = on_swap
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._loading = False
+    
+    def _current_version(self):
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _load(self, version):
+        session = self.session_factory()
+        try:
+            start = time.perf_counter()
+            snapshot = load_snapshot(session, version)
+            logger.info(
+                f"Loaded read replica: {snapshot.size} active discounts in {time.perf_counter() - start:.2f}s"
+            )
+            return snapshot
+        finally:
+            session.close()
+    
+    def _reload(self, version):
+        try:
+            self._snapshot = self._load(version)
+            if self.on_swap:
+                self.on_swap()
+        except Exception:
+            logger.exception("Reloading the read replica failed; serving the previous snapshot")
+        finally:
+            self._loading = False
+    
+    def get(self):
+        """
+        Return the current snapshot.
+        
+        The first call loads it synchronously. Later calls that see a new
+        data version start a background reload and return the previous
+        snapshot until the new one is ready.
+        """
+        version = self._current_version()
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load(version)
+                return self._snapshot
+        
+        if version != snapshot.version and not self._loading:
+            with self._lock:
+                if not self._loading and self._snapshot.version != version:
+                    self._loading = True
+                    threading.Thread(target=self._reload, args=(version,), daemon=True).start()
+        return snapshot
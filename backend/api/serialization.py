@@ -0,0 +1,107 @@
+"""
+Fast JSON serialization for discount listings.
+
+List endpoints select only the columns they return, as plain row tuples,
+instead of loading Discount objects and calling to_dict() per row. The
+rows are encoded with orjson when it is installed (it serializes datetimes
+natively), falling back to the standard library json module. Time spent
+here counts as serialization time in the request metrics (api.metrics).
+"""
+from flask import Response
+from api.metrics import record_serialization, serialization_timer
+from datetime import datetime
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Rows fetched from the database and written per piece of an NDJSON stream
+NDJSON_BATCH_SIZE = int(os.getenv('NDJSON_BATCH_SIZE', '1000'))
+
+# Fields a client may request through ?fields=, in to_dict() order
+DISCOUNT_FIELDS = [
+    'id', 'supermarket', 'product_name', 'category', 'original_price',
+    'discount_price', 'discount_percentage', 'valid_from', 'valid_until',
+    'image_url', 'product_url', 'description', 'is_active', 'product_id',
+    'is_all_time_low', 'canonical_id', 'created_at', 'updated_at'
+]
+
+
+def parse_fields(value):
+    """
+    Parse a comma-separated fields parameter.
+    
+    Returns every field when value is empty; raises ValueError on unknown
+    fields. The id is always included so clients can key the rows.
+    """
+    if not value:
+        return list(DISCOUNT_FIELDS)
+    
+    requested = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in DISCOUNT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    if 'id' not in requested:
+        requested.insert(0, 'id')
+    # Keep the canonical order and drop duplicates
+    return [f for f in DISCOUNT_FIELDS if f in requested]
+
+
+def rows_to_dicts(rows, fields):
+    """Map projected row tuples onto dicts keyed by the requested fields."""
+    width = len(fields)
+    with serialization_timer():
+        return [dict(zip(fields, row[:width])) for row in rows]
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _encode(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(payload):
+    """Encode payload to JSON bytes with the fastest available backend."""
+    with serialization_timer():
+        return _encode(payload)
+
+
+def json_response(payload, status=200):
+    """Build a JSON Response without going through jsonify."""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def ndjson_response(session, query, fields, batch_size=NDJSON_BATCH_SIZE):
+    """
+    Stream the rows of query as newline-delimited JSON, one object per line.
+    
+    The query runs with yield_per, so rows are fetched batch_size at a time
+    while the response is written and memory stays flat however many rows
+    match. The session is closed when the stream ends.
+    """
+    width = len(fields)
+    
+    def generate():
+        try:
+            result = session.execute(query.statement, execution_options={'yield_per': batch_size})
+            for rows in result.partitions():
+                # One timing per batch rather than per row
+                start = time.perf_counter()
+                piece = b''.join(_encode(dict(zip(fields, row[:width]))) + b'\n' for row in rows)
+                record_serialization(time.perf_counter() - start)
+                yield piece
+        finally:
+            session.close()
+    
+    return Response(generate(), mimetype='application/x-ndjson')
@@ -0,0 +1,6 @@
+"""
+Benchmarks package initialization.
+
+Each bench_*.py module is a standalone script, e.g.:
+    python benchmarks/bench_ingestion.py
+"""
@@ -0,0 +1,123 @@
+"""
+Mixed read/write concurrency: default engine versus the tuned engine.
+
+Usage:
+    python benchmarks/bench_concurrency.py [SECONDS] [READERS]
+
+Preloads 50k discounts, then runs READERS threads issuing the
+/api/discounts first-page query while one writer thread keeps ingesting
+batches, as the collector does. Reports read throughput and latency, write
+throughput and lock errors for a bare create_engine() and for
+create_db_engine() (WAL, synchronous=NORMAL, mmap, busy_timeout, pool).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import synthetic_discounts, temp_database, remove_database
+from models import Discount
+from models.database import create_db_engine
+from utils.ingestion import bulk_ingest
+from sqlalchemy import create_engine
+import threading
+import time
+
+PRELOAD = 50_000
+WRITE_BATCH = 1000
+
+ENGINES = {
+    'default': lambda url: create_engine(url),
+    'tuned': create_db_engine,
+}
+
+
+def read_once(session_factory):
+    session = session_factory()
+    try:
+        session.query(
+            Discount.id, Discount.product_name, Discount.discount_price, Discount.discount_percentage
+        ).filter(Discount.is_active == True).order_by(
+            Discount.discount_percentage.desc(), Discount.id.desc()
+        ).limit(100).all()
+    finally:
+        session.close()
+
+
+def run(engine_factory, seconds, readers):
+    engine, session_factory, path = temp_database(engine_factory)
+    try:
+        bulk_ingest(synthetic_discounts(PRELOAD), session_factory=session_factory)
+        
+        stop = threading.Event()
+        latencies = []
+        counters = {'read_errors': 0, 'written': 0, 'write_errors': 0}
+        lock = threading.Lock()
+        
+        def reader():
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    read_once(session_factory)
+                except Exception:
+                    with lock:
+                        counters['read_errors'] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+        
+        def writer():
+            next_id = PRELOAD
+            while not stop.is_set():
+                try:
+                    bulk_ingest(
+                        synthetic_discounts(WRITE_BATCH, start=next_id),
+                        batch_size=WRITE_BATCH, session_factory=session_factory
+                    )
+                    counters['written'] += WRITE_BATCH
+                except Exception:
+                    counters['write_errors'] += 1
+                next_id += WRITE_BATCH
+        
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        
+        latencies.sort()
+        
+        def percentile(p):
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+        
+        return {
+            'reads_per_s': len(latencies) / seconds,
+            'p50_ms': percentile(0.5),
+            'p99_ms': percentile(0.99),
+            'read_errors': counters['read_errors'],
+            'rows_written_per_s': counters['written'] / seconds,
+            'write_errors': counters['write_errors'],
+        }
+    finally:
+        engine.dispose()
+        remove_database(path)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    
+    print(f"{readers} readers + 1 writer for {seconds}s on {PRELOAD} rows")
+    print(f"{'engine':>8} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'read err':>9} {'writes/s':>9} {'write err':>10}")
+    for name, engine_factory in ENGINES.items():
+        r = run(engine_factory, seconds, readers)
+        print(
+            f"{name:>8} {r['reads_per_s']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+            f"{r['read_errors']:>9} {r['rows_written_per_s']:>9.0f} {r['write_errors']:>10}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Page fetching: serial per-scraper requests versus the shared Fetcher.
+
+Usage:
+    python benchmarks/bench_fetch.py [PAGES] [LATENCY_MS]
+
+Serves the fixture pages from a local stand-in server with artificial
+latency (default 50 ms) and fetches PAGES pages (default 200) once with a
+plain requests.Session loop, as get_page used to, and once with
+Fetcher.fetch_many. A third run makes the server fail every page once to
+show the retries.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.fixture_server import serve_fixtures
+from scrapers.fetcher import Fetcher
+import requests
+import time
+
+
+def fetch_serial(urls):
+    session = requests.Session()
+    try:
+        return [session.get(url, timeout=10) for url in urls]
+    finally:
+        session.close()
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    
+    with serve_fixtures(latency=latency) as server:
+        urls = [f'{server.base_url}/bonus/{n}' for n in range(1, pages + 1)]
+        
+        start = time.perf_counter()
+        serial = fetch_serial(urls)
+        serial_time = time.perf_counter() - start
+        
+        fetcher = Fetcher(backoff=0.01)
+        try:
+            start = time.perf_counter()
+            pooled = fetcher.fetch_many(urls)
+            pooled_time = time.perf_counter() - start
+        finally:
+            fetcher.close()
+        
+        print(f"{pages} pages at {latency * 1000:.0f} ms latency")
+        print(f"  serial:      {serial_time:6.2f}s  ({sum(r.status_code == 200 for r in serial)} ok)")
+        print(
+            f"  fetch_many:  {pooled_time:6.2f}s  ({sum(r is not None and r.status_code == 200 for r in pooled)} ok, "
+            f"max {server.stats['max_in_flight']} in flight for one host)"
+        )
+    
+    with serve_fixtures(latency=latency, fail_first=1) as server:
+        urls = [f'{server.base_url}/bonus/{n}' for n in range(1, pages + 1)]
+        fetcher = Fetcher(backoff=0.01)
+        try:
+            start = time.perf_counter()
+            responses = fetcher.fetch_many(urls)
+            elapsed = time.perf_counter() - start
+        finally:
+            fetcher.close()
+        
+        print(
+            f"  with retries: {elapsed:5.2f}s  ({sum(r is not None and r.status_code == 200 for r in responses)} ok "
+            f"after {server.stats['failed']} transient 503s)"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Ingestion throughput: ORM session.add path versus Core bulk_ingest.
+
+Usage:
+    python benchmarks/bench_ingestion.py [N ...]
+
+Defaults to 10k, 100k and 1M synthetic discounts. Each run uses a fresh
+temporary SQLite database and reports rows per second.
+
+Only the first two columns compare like with like: the ORM path and the
+Core upsert both write the discount rows and nothing else. bulk_ingest
+also matches products and records the price history, so its first load
+writes three more tables; its re-runs show what a repeated scrape costs
+when nothing changed and when 10% of the prices changed, with the number
+of write statements each issued.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import synthetic_discounts, temp_database, remove_database
+from models import Discount
+from utils.ingestion import bulk_ingest, build_upsert, normalize_record, BULK_BATCH_SIZE, INSERT_COLUMNS
+from sqlalchemy import event
+from datetime import datetime
+import logging
+import time
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Every CHANGE_EVERY-th record gets a new price in the changed re-run
+CHANGE_EVERY = 10
+
+
+def bench_orm(n):
+    """The original collector path: one ORM object per row, single commit."""
+    engine, session_factory, path = temp_database()
+    session = session_factory()
+    try:
+        start = time.perf_counter()
+        for discount_data in synthetic_discounts(n):
+            session.add(Discount(**discount_data))
+        session.commit()
+        return time.perf_counter() - start
+    finally:
+        session.close()
+        engine.dispose()
+        remove_database(path)
+
+
+def bench_upsert(n, batch_size=BULK_BATCH_SIZE):
+    """Core executemany upserts of the discount rows alone, with a commit per batch."""
+    engine, session_factory, path = temp_database()
+    session = session_factory()
+    records = list(synthetic_discounts(n))
+    try:
+        start = time.perf_counter()
+        upsert = build_upsert(engine)
+        for offset in range(0, n, batch_size):
+            now = datetime.utcnow()
+            rows = []
+            for discount_data in records[offset:offset + batch_size]:
+                record = normalize_record(discount_data)
+                record['created_at'] = record['updated_at'] = now
+                rows.append({column: record.get(column) for column in INSERT_COLUMNS})
+            session.execute(upsert, rows)
+            session.commit()
+        return time.perf_counter() - start
+    finally:
+        session.close()
+        engine.dispose()
+        remove_database(path)
+
+
+def bench_bulk(n, batch_size=BULK_BATCH_SIZE):
+    """
+    bulk_ingest a first load, then re-run it unchanged and with changed prices.
+    
+    Returns [(seconds, write statements)] for the three runs.
+    """
+    engine, session_factory, path = temp_database()
+    writes = [0]
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_writes(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            writes[0] += 1
+    
+    records = list(synthetic_discounts(n))
+    changed = [
+        dict(r, discount_price=round(r['discount_price'] * 0.9, 2)) if i % CHANGE_EVERY == 0 else r
+        for i, r in enumerate(records)
+    ]
+    try:
+        runs = []
+        for run in (records, records, changed):
+            writes[0] = 0
+            start = time.perf_counter()
+            bulk_ingest(run, batch_size=batch_size, session_factory=session_factory)
+            runs.append((time.perf_counter() - start, writes[0]))
+        return runs
+    finally:
+        engine.dispose()
+        remove_database(path)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    logging.disable(logging.INFO)
+    
+    print(
+        f"{'rows':>10} {'orm rows/s':>12} {'upsert rows/s':>14} {'speedup':>8} | "
+        f"{'bulk_ingest rows/s (writes)':>28} {'unchanged':>18} {'10% changed':>18}"
+    )
+    for n in sizes:
+        orm_time = bench_orm(n)
+        upsert_time = bench_upsert(n)
+        runs = bench_bulk(n)
+        print(
+            f"{n:>10} {n / orm_time:>12,.0f} {n / upsert_time:>14,.0f} {orm_time / upsert_time:>7.1f}x | "
+            + ' '.join(
+                f"{f'{n / seconds:,.0f} ({writes})':>{width}}"
+                for (seconds, writes), width in zip(runs, (28, 18, 18))
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Load test: startup time, throughput and latency of the API over HTTP.
+
+Usage:
+    python benchmarks/bench_load.py [--rows N] [--concurrency C] [--duration S]
+                                    [--server dev|gunicorn|all] [--url URL]
+
+Loads N synthetic discounts (default 20k) into a temporary database, starts
+each server on a free local port and reports how long it takes to answer
+/api/health (including the lazy schema setup). Then C client threads
+(default 8), each on its own keep-alive connection, request a mix of API
+URLs for S seconds (default 10), and the harness reports requests/s with
+p50 and p99 latency per URL and overall.
+
+Servers:
+    dev        python -m api.app (the threaded Flask development server)
+    gunicorn   gunicorn -c gunicorn.conf.py wsgi:app (skipped if not installed)
+
+--url runs the load against a server that is already running instead,
+e.g. --url http://localhost:5000. --no-cache disables the response cache
+of the servers the harness starts, so every request reaches the database.
+"""
+import sys
+import os
+import tempfile
+
+# Point the backend at a temporary database before anything imports it
+DB_FD, DB_PATH = tempfile.mkstemp(suffix='.db', prefix='bench_')
+os.close(DB_FD)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import synthetic_discounts, remove_database
+from models import SessionLocal, init_db, refresh_summary
+from models.database import engine
+from utils.ingestion import bulk_ingest
+from urllib.parse import urlsplit
+import argparse
+import http.client
+import importlib.util
+import logging
+import socket
+import subprocess
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+URLS = [
+    '/api/discounts',
+    '/api/discounts?supermarket=Jumbo&limit=20',
+    '/api/discounts?category=Zuivel&min_discount=30',
+    '/api/discounts?search=kaas',
+    '/api/stats',
+    '/api/supermarkets',
+    '/api/compare?limit=20',
+]
+
+SERVERS = {
+    'dev': [sys.executable, '-m', 'api.app'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+}
+
+STARTUP_TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[max(int(p * len(sorted_values) + 0.5), 1) - 1]
+
+
+def wait_until_ready(host, port, process):
+    """Poll /api/health until it answers 200; return the seconds it took."""
+    start = time.perf_counter()
+    while time.perf_counter() - start < STARTUP_TIMEOUT:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return time.perf_counter() - start
+            conn.close()
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Server did not answer within {STARTUP_TIMEOUT}s")
+
+
+def client(host, port, urls, deadline, timings, errors):
+    """Request urls round robin on one keep-alive connection until the deadline."""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        url = urls[i % len(urls)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', url)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(url)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(url)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        timings.append((url, time.perf_counter() - start))
+    conn.close()
+
+
+def run_load(host, port, concurrency, duration):
+    """Drive the server with concurrency clients; return (timings, errors, elapsed)."""
+    # Warm up every URL once (first-request setup, caches, replica load)
+    client(host, port, URLS, time.perf_counter() + 0.5, [], [])
+    
+    timings, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        # Each client starts at a different URL so the mix is even from the start
+        threading.Thread(target=client, args=(host, port, URLS[i:] + URLS[:i], deadline, timings, errors))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, errors, time.perf_counter() - start
+
+
+def report(label, timings, errors, elapsed, startup_s=None):
+    startup = f", ready in {startup_s:.2f}s" if startup_s is not None else ''
+    print(f"\n{label}: {len(timings)} requests in {elapsed:.1f}s, {len(errors)} errors{startup}")
+    print(f"{'request':>50} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for url in URLS + [None]:
+        latencies = sorted(t for u, t in timings if url is None or u == url)
+        print(
+            f"{url or 'all':>50} {len(latencies) / elapsed:>8.1f} "
+            f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}"
+        )
+
+
+def run_server(name, args):
+    """Start one server against the temporary database, load it, then stop it."""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), LOG_LEVEL='warning')
+    env.pop('FLASK_ENV', None)
+    if args.no_cache:
+        env['RESPONSE_CACHE_TTL'] = '0'
+    process = subprocess.Popen(
+        SERVERS[name], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        startup_s = wait_until_ready('127.0.0.1', port, process)
+        timings, errors, elapsed = run_load('127.0.0.1', port, args.concurrency, args.duration)
+        report(name, timings, errors, elapsed, startup_s)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the API over HTTP')
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--server', choices=sorted(SERVERS) + ['all'], default='all')
+    parser.add_argument('--url', help='load an already running server instead')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    
+    try:
+        if args.url:
+            target = urlsplit(args.url)
+            timings, errors, elapsed = run_load(target.hostname, target.port or 80, args.concurrency, args.duration)
+            report(args.url, timings, errors, elapsed)
+            return
+        
+        init_db()
+        bulk_ingest(synthetic_discounts(args.rows))
+        session = SessionLocal()
+        try:
+            refresh_summary(session)
+        finally:
+            session.close()
+        engine.dispose()
+        
+        print(f"{args.rows} rows, {args.concurrency} clients, {args.duration:g}s per server")
+        names = sorted(SERVERS) if args.server == 'all' else [args.server]
+        for name in names:
+            if name == 'gunicorn' and importlib.util.find_spec('gunicorn') is None:
+                print("\ngunicorn: not installed, skipped")
+                continue
+            run_server(name, args)
+    finally:
+        engine.dispose()
+        remove_database(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Product matching: naive pairwise comparison versus blocked matching.
+
+Usage:
+    python benchmarks/bench_matching.py [N ...]
+
+Defaults to 1k, 5k and 20k store product names: every product is listed by
+each supermarket, spelled the way that store spells it. The naive matcher
+scores every name against every canonical product created so far (O(n^2));
+match_products only scores the candidates in the same block that share a
+name token. Both report the time taken and the number of canonical
+products found; the naive matcher is skipped above NAIVE_LIMIT names.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import temp_database, remove_database
+from models.matching import match_products, parse_name, similarity, PRODUCT_MATCH_THRESHOLD
+import random
+import time
+
+DEFAULT_SIZES = [1_000, 5_000, 20_000]
+NAIVE_LIMIT = 20_000
+
+BRANDS = ['Coca-Cola', 'Heineken', 'Douwe Egberts', 'Campina', 'Lays', 'Unox', 'Milka', 'Ariel', None]
+ITEMS = [
+    'Halfvolle melk', 'Pils', 'Aroma rood', 'Naturel chips', 'Rookworst', 'Hele melk chocolade',
+    'Vloeibaar wasmiddel', 'Griekse yoghurt', 'Volkoren brood', 'Jong belegen kaas'
+]
+FLAVOURS = ['', 'Original', 'Paprika', 'Vanille', 'Extra', 'Family', 'Zero', 'Light']
+# (spelling A, spelling B) of the same size
+SIZES = [
+    ('1 liter', '1L'), ('500 g', '0.5 kg'), ('6 x 330 ml', '6x33cl'), ('250 gram', '250g'),
+    ('1,5 l', '1.5 ltr'), ('4 stuks', '4-pack'), ('750 ml', '75 cl')
+]
+STORE_PREFIXES = ['AH ', 'Jumbo ', '', '']
+
+
+def product_names(n, seed=42):
+    """n store product names: groups of up to four spellings of one product."""
+    rng = random.Random(seed)
+    names = []
+    i = 0
+    while len(names) < n:
+        brand = rng.choice(BRANDS)
+        item = f'{rng.choice(ITEMS)} {rng.choice(FLAVOURS)} {i}'.replace('  ', ' ')
+        size = rng.choice(SIZES)
+        for store, prefix in enumerate(STORE_PREFIXES):
+            name = f'{brand} {item}' if brand else f'{prefix}{item}'
+            names.append(f'{name} {size[store % 2]}')
+        i += 1
+    return names[:n]
+
+
+def naive_match(names):
+    """Score every name against every canonical product so far."""
+    canonicals = []
+    for name in names:
+        parsed = parse_name(name)
+        scores = [similarity(parsed, c) for c in canonicals]
+        if not scores or max(scores) < PRODUCT_MATCH_THRESHOLD:
+            canonicals.append(parsed)
+    return len(canonicals)
+
+
+def blocked_match(names):
+    engine, session_factory, path = temp_database()
+    session = session_factory()
+    try:
+        matched = match_products(session, names)
+        session.commit()
+        return len(set(matched.values()))
+    finally:
+        session.close()
+        engine.dispose()
+        remove_database(path)
+
+
+def timed(fn, names):
+    start = time.perf_counter()
+    result = fn(names)
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'names':>8} {'naive s':>9} {'canon':>7} {'blocked s':>10} {'canon':>7} {'speedup':>9}")
+    for n in sizes:
+        names = product_names(n)
+        blocked_s, blocked_count = timed(blocked_match, names)
+        if n <= NAIVE_LIMIT:
+            naive_s, naive_count = timed(naive_match, names)
+            print(
+                f"{n:>8} {naive_s:>9.2f} {naive_count:>7} {blocked_s:>10.2f} {blocked_count:>7} "
+                f"{naive_s / blocked_s:>8.1f}x"
+            )
+        else:
+            print(f"{n:>8} {'-':>9} {'-':>7} {blocked_s:>10.2f} {blocked_count:>7} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Listing page parsing: full BeautifulSoup tree versus selective parsing.
+
+Usage:
+    python benchmarks/bench_parsing.py [ROUNDS]
+
+Parses every saved fixture page ROUNDS times (default 20) with each
+strategy and extracts the same product fields:
+
+- soup:        BeautifulSoup(content, 'lxml') + select(), as get_page does
+- strainer:    BeautifulSoup restricted to <article> with a SoupStrainer
+- lxml-dom:    lxml.html.fromstring + XPath over the whole tree
+- iter_cards:  scrapers.parsing.iter_cards (iterparse, cards only)
+- next_data:   the __NEXT_DATA__ JSON payload, no HTML parsing at all
+
+Before timing, every strategy's products are checked field by field against
+the soup strategy (next_data by name and URL, since its prices are numbers).
+The same check runs on a copy of the pages whose cards are <div> elements,
+which contain <div> children of their own.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.fixtures import fixture_paths
+from scrapers.parsing import compile_fields, iter_cards, extract_next_data
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import html as lxml_html
+import time
+
+CARD_FIELDS = {
+    'product_name': './/h3[@class="product-title"]',
+    'category': './/span[@class="product-category"]',
+    'original_price': './/span[@class="price-old"]',
+    'discount_price': './/span[@class="price-now"]',
+    'description': './/p[@class="promo-label"]',
+    'product_url': './/a[@class="product-link"]/@href',
+}
+SOUP_FIELDS = {
+    'product_name': '.product-title',
+    'category': '.product-category',
+    'original_price': '.price-old',
+    'discount_price': '.price-now',
+    'description': '.promo-label',
+}
+COMPILED_FIELDS = compile_fields(CARD_FIELDS)
+
+
+def _soup_cards(soup, tag='article'):
+    products = []
+    for card in soup.select(f'{tag}.product-card'):
+        product = {}
+        for name, selector in SOUP_FIELDS.items():
+            node = card.select_one(selector)
+            product[name] = node.get_text(strip=True) if node else None
+        link = card.select_one('a.product-link')
+        product['product_url'] = link.get('href') if link else None
+        products.append(product)
+    return products
+
+
+def parse_soup(content):
+    return _soup_cards(BeautifulSoup(content, 'lxml'))
+
+
+def parse_strainer(content):
+    return _soup_cards(BeautifulSoup(content, 'lxml', parse_only=SoupStrainer('article')))
+
+
+def parse_lxml_dom(content):
+    tree = lxml_html.fromstring(content)
+    products = []
+    for card in tree.xpath('//article[contains(concat(" ", @class, " "), " product-card ")]'):
+        product = {}
+        for name, xpath in COMPILED_FIELDS.items():
+            result = xpath(card)
+            if not result:
+                product[name] = None
+            elif isinstance(result[0], str):
+                product[name] = result[0].strip()
+            else:
+                product[name] = result[0].text_content().strip()
+        products.append(product)
+    return products
+
+
+def parse_iter_cards(content):
+    return list(iter_cards(content, 'article', 'product-card', COMPILED_FIELDS))
+
+
+def parse_next_data(content):
+    return extract_next_data(content)['props']['pageProps']['products']
+
+
+def div_cards(content):
+    """The page with its <article> cards turned into <div> cards."""
+    return content.replace(b'<article class="product-card"', b'<div class="product-card"').replace(
+        b'</article>', b'</div>'
+    )
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return ' '.join(value.split()) or None
+    return value
+
+
+def check_fields(name, products, expected, fields):
+    """Assert that products carry the same field values as expected, in order."""
+    assert len(products) == len(expected), f"{name} found {len(products)} products, expected {len(expected)}"
+    for found, wanted in zip(products, expected):
+        for field in fields:
+            assert _normalize(found.get(field)) == _normalize(wanted[field]), (
+                f"{name}: {field} is {found.get(field)!r}, expected {wanted[field]!r}"
+            )
+
+
+STRATEGIES = [
+    ('soup', parse_soup),
+    ('strainer', parse_strainer),
+    ('lxml-dom', parse_lxml_dom),
+    ('iter_cards', parse_iter_cards),
+    ('next_data', parse_next_data),
+]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    pages = []
+    for path in fixture_paths():
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    
+    if not pages:
+        print("No fixture pages found; run python benchmarks/fixtures.py first")
+        return
+    
+    expected = [parse_soup(content) for content in pages]
+    for content, products in zip(pages, expected):
+        for name, parse in STRATEGIES[1:]:
+            fields = ['product_name', 'product_url'] if name == 'next_data' else CARD_FIELDS
+            check_fields(name, parse(content), products, fields)
+        
+        divs = div_cards(content)
+        check_fields('soup (div cards)', _soup_cards(BeautifulSoup(divs, 'lxml'), 'div'), products, CARD_FIELDS)
+        check_fields(
+            'iter_cards (div cards)', list(iter_cards(divs, 'div', 'product-card', COMPILED_FIELDS)),
+            products, CARD_FIELDS
+        )
+    
+    total_kb = sum(len(content) for content in pages) / 1024
+    count = sum(len(products) for products in expected)
+    print(f"{len(pages)} pages ({total_kb:.0f} KB, {count} products) x {rounds} rounds")
+    
+    baseline = None
+    for name, parse in STRATEGIES:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for content in pages:
+                parse(content)
+        per_page = (time.perf_counter() - start) / (rounds * len(pages)) * 1000
+        
+        baseline = baseline or per_page
+        print(f"  {name:<11} {per_page:8.2f} ms/page  ({baseline / per_page:5.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Scrape pipeline: fetch-and-parse in one thread versus the process-pool pipeline.
+
+Usage:
+    python benchmarks/bench_pipeline.py [PAGES] [LATENCY_MS]
+
+Serves the fixture pages from the local stand-in server (default 10 ms
+latency) and collects PAGES pages (default 120) into a throwaway database,
+parsing each page with a full BeautifulSoup tree as the existing scrapers
+do. The serial run fetches, parses and ingests page by page on one thread;
+the pipelined runs use run_pipeline with 1, 2 and 4 parse processes (up
+to the number of cores). Parsing is CPU bound, so pipeline throughput
+scales with cores until the fetch or write stage becomes the bottleneck.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.fixture_server import serve_fixtures
+from benchmarks.synthetic import temp_database, remove_database
+from scrapers.base_scraper import BaseScraper
+from utils.data_collector import run_pipeline
+from utils.ingestion import bulk_ingest
+from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import time
+
+
+class FixtureScraper(BaseScraper):
+    """Scraper for the fixture server's listing pages."""
+    
+    def __init__(self, base_url='', pages=0):
+        super().__init__("Fixture Market")
+        self.base_url = base_url
+        self.pages = pages
+        # Keep the benchmark independent of the on-disk page cache
+        self.page_cache = None
+    
+    def page_urls(self):
+        return (f'{self.base_url}/bonus/{n}' for n in range(1, self.pages + 1))
+    
+    @classmethod
+    def parse_listing(cls, url, content):
+        soup = BeautifulSoup(content, 'lxml')
+        valid_from = datetime.now()
+        discounts = []
+        for card in soup.select('article.product-card'):
+            original_price = cls.parse_price(card.select_one('.price-old').get_text())
+            discount_price = cls.parse_price(card.select_one('.price-now').get_text())
+            discounts.append({
+                'product_name': card.select_one('.product-title').get_text(strip=True),
+                'category': card.select_one('.product-category').get_text(strip=True),
+                'original_price': original_price,
+                'discount_price': discount_price,
+                'discount_percentage': cls.calculate_discount_percentage(original_price, discount_price),
+                'product_url': card.select_one('a.product-link')['href'],
+                'description': card.select_one('.promo-label').get_text(strip=True),
+                'valid_from': valid_from,
+            })
+        return discounts
+    
+    def scrape(self):
+        discounts = []
+        for url in self.page_urls():
+            content = self.get_content(url)
+            for discount_data in self.parse_listing(url, content):
+                discount_data['supermarket'] = self.supermarket_name
+                discounts.append(discount_data)
+        return discounts
+
+
+def run_serial(base_url, pages):
+    engine, session_factory, path = temp_database()
+    scraper = FixtureScraper(base_url, pages)
+    try:
+        start = time.perf_counter()
+        records = list(scraper.iter_discounts())
+        bulk_ingest(records, session_factory=session_factory)
+        return time.perf_counter() - start, len(records)
+    finally:
+        scraper.close()
+        engine.dispose()
+        remove_database(path)
+
+
+def run_pipelined(base_url, pages, workers):
+    engine, session_factory, path = temp_database()
+    scraper = FixtureScraper(base_url, pages)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        # Start the workers before timing, as the collector's shared pool would be warm
+        list(pool.map(abs, range(workers)))
+        start = time.perf_counter()
+        count, _ = run_pipeline(
+            scraper, scraper.page_urls(), session_factory=session_factory, parse_pool=pool
+        )
+        return time.perf_counter() - start, count
+    finally:
+        pool.shutdown()
+        scraper.close()
+        engine.dispose()
+        remove_database(path)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 10) / 1000
+    cores = os.cpu_count() or 1
+    
+    with serve_fixtures(latency=latency) as server:
+        print(f"{pages} pages at {latency * 1000:.0f} ms latency, {cores} cores")
+        
+        serial_time, count = run_serial(server.base_url, pages)
+        print(f"  serial:               {serial_time:6.2f}s  {pages / serial_time:6.1f} pages/s  ({count} records)")
+        
+        for workers in sorted({1, min(2, cores), min(4, cores)}):
+            pipeline_time, count = run_pipelined(server.base_url, pages, workers)
+            print(
+                f"  pipeline, {workers} process{'es' if workers > 1 else '  '}: "
+                f"{pipeline_time:6.2f}s  {pages / pipeline_time:6.1f} pages/s  ({count} records)"
+            )
+
+
+if __name__ == '__main__':
+    main()
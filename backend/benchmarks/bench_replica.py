@@ -0,0 +1,97 @@
+"""
+API latency: SQLite through SQLAlchemy versus the in-memory read replica.
+
+Usage:
+    python benchmarks/bench_replica.py [N]
+
+Loads N synthetic discounts (default 100k) into a temporary database and
+times /api/discounts and /api/stats requests through the Flask test client,
+with the response cache disabled, first against the database and then
+against the read replica. Also reports how long a replica snapshot takes
+to load.
+"""
+import sys
+import os
+import tempfile
+
+# Point the backend at a temporary database and disable the response cache
+# before anything imports it
+DB_FD, DB_PATH = tempfile.mkstemp(suffix='.db', prefix='bench_')
+os.close(DB_FD)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['RESPONSE_CACHE_TTL'] = '0'
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from api.app import create_app
+from api.replica import ReadReplica
+from benchmarks.synthetic import synthetic_discounts, remove_database
+from models import SessionLocal, init_db, refresh_summary
+from models.database import engine
+from utils.ingestion import bulk_ingest
+import logging
+import time
+
+# The module holding the replica the views read
+app_module = sys.modules['api.app']
+
+URLS = [
+    '/api/discounts',
+    '/api/discounts?supermarket=Jumbo',
+    '/api/discounts?category=Zuivel&min_discount=30',
+    '/api/discounts?supermarket=Lidl&category=Brood&include_total=false',
+    '/api/discounts?offset=5000',
+    '/api/stats?supermarket=Jumbo',
+    '/api/stats?category=Zuivel&min_discount=30',
+]
+REPEAT = 20
+
+
+def time_url(client, url):
+    """Return the median wall time of REPEAT requests in milliseconds."""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    logging.disable(logging.INFO)
+    
+    try:
+        init_db()
+        bulk_ingest(synthetic_discounts(n))
+        session = SessionLocal()
+        try:
+            refresh_summary(session)
+        finally:
+            session.close()
+        
+        client = create_app().test_client()
+        app_module.replica = None
+        database_ms = {url: time_url(client, url) for url in URLS}
+        
+        app_module.replica = ReadReplica()
+        start = time.perf_counter()
+        snapshot = app_module.replica.get()
+        load_s = time.perf_counter() - start
+        replica_ms = {url: time_url(client, url) for url in URLS}
+        
+        print(f"{n} rows, snapshot of {snapshot.size} active rows loaded in {load_s:.2f}s")
+        print(f"{'request':>56} {'db ms':>8} {'replica ms':>11} {'speedup':>9}")
+        for url in URLS:
+            print(
+                f"{url:>56} {database_ms[url]:>8.2f} {replica_ms[url]:>11.2f} "
+                f"{database_ms[url] / replica_ms[url]:>8.1f}x"
+            )
+    finally:
+        engine.dispose()
+        remove_database(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
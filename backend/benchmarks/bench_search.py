@@ -0,0 +1,65 @@
+"""
+Product search latency: ILIKE '%term%' scan versus the FTS5 index.
+
+Usage:
+    python benchmarks/bench_search.py [N]
+
+Loads N synthetic discounts (default 100k) into a temporary database and
+times the /api/discounts search query (count plus first page of 100) for
+a handful of terms using both paths.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import synthetic_discounts, temp_database, remove_database
+from models import Discount
+from models.search import setup_fulltext, search_condition
+from utils.ingestion import bulk_ingest
+import time
+
+TERMS = ['melk', 'koffie aroma', 'kip', 'shamp', 'gratis', '1234']
+REPEAT = 5
+
+
+def run_query(session, condition):
+    query = session.query(Discount).filter(Discount.is_active == True, condition)
+    query.count()
+    query.order_by(Discount.discount_percentage.desc(), Discount.id.desc()).limit(100).all()
+
+
+def time_query(session_factory, condition):
+    """Return the best-of-REPEAT wall time in milliseconds."""
+    best = float('inf')
+    for _ in range(REPEAT):
+        session = session_factory()
+        try:
+            start = time.perf_counter()
+            run_query(session, condition)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            session.close()
+    return best * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    
+    engine, session_factory, path = temp_database()
+    try:
+        setup_fulltext(engine)
+        bulk_ingest(synthetic_discounts(n), session_factory=session_factory)
+        
+        print(f"{n} rows")
+        print(f"{'term':>14} {'ilike ms':>10} {'fts ms':>10} {'speedup':>9}")
+        for term in TERMS:
+            ilike_ms = time_query(session_factory, Discount.product_name.ilike(f'%{term}%'))
+            fts_ms = time_query(session_factory, search_condition(term, bind=engine))
+            print(f"{term:>14} {ilike_ms:>10.2f} {fts_ms:>10.2f} {ilike_ms / fts_ms:>8.1f}x")
+    finally:
+        engine.dispose()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
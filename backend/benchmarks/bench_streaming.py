@@ -0,0 +1,91 @@
+"""
+Large listings: one JSON document versus a streamed NDJSON response.
+
+Usage:
+    python benchmarks/bench_streaming.py [N]
+
+Loads N synthetic discounts (default 100k) into a temporary database and
+requests all of them from /api/discounts, once as JSON (limit=N) and once
+with format=ndjson. Each mode runs in a fresh process so its peak RSS is
+its own. Reports time to first byte, total time, and the peak RSS growth
+over the process's footprint before the request.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import resource
+import subprocess
+import time
+
+MODES = {
+    'json': '/api/discounts?limit={n}&include_total=false',
+    'ndjson': '/api/discounts?format=ndjson'
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode, n):
+    """Run one request in this process (the DATABASE_URL is already set) and print the result as JSON."""
+    from api.app import create_app
+    
+    client = create_app().test_client()
+    client.get('/api/health')
+    baseline = peak_rss_mb()
+    
+    start = time.perf_counter()
+    response = client.get(MODES[mode].format(n=n), buffered=False)
+    body = iter(response.response)
+    size = len(next(body, b''))
+    ttfb = time.perf_counter() - start
+    for piece in body:
+        size += len(piece)
+    total = time.perf_counter() - start
+    response.close()
+    
+    print(json.dumps({
+        'ttfb_ms': ttfb * 1000, 'total_s': total, 'bytes': size, 'rss_mb': peak_rss_mb() - baseline
+    }))
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--measure':
+        measure(sys.argv[2], int(sys.argv[3]))
+        return
+    
+    from benchmarks.synthetic import synthetic_discounts, temp_database, remove_database
+    from models.search import setup_fulltext
+    from utils.ingestion import bulk_ingest
+    
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    engine, session_factory, path = temp_database()
+    try:
+        setup_fulltext(engine)
+        bulk_ingest(synthetic_discounts(n), session_factory=session_factory)
+        engine.dispose()
+        
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}')
+        print(f"{n} rows")
+        print(f"{'mode':>8} {'ttfb ms':>10} {'total s':>9} {'MB sent':>9} {'peak RSS +MB':>13}")
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--measure', mode, str(n)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{mode:>8} {result['ttfb_ms']:>10.1f} {result['total_s']:>9.2f} "
+                f"{result['bytes'] / 1e6:>9.1f} {result['rss_mb']:>13.1f}"
+            )
+    finally:
+        engine.dispose()
+        remove_database(path)
+
+
+if __name__ == '__main__':
+    main()
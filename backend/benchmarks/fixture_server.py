@@ -0,0 +1,146 @@
+"""
+Local stand-in for a supermarket website, serving the fixture pages.
+
+GET /bonus/<n> returns fixture page n (cycling through the saved pages)
+with an ETag and Last-Modified header, gzip when the client accepts it,
+304 for matching conditional requests, and optional artificial latency and
+transient 503 failures to exercise retries.
+
+Run standalone:
+    python benchmarks/fixture_server.py [PORT]
+or use serve_fixtures() as a context manager from a script.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.fixtures import fixture_paths
+from contextlib import contextmanager
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import hashlib
+import threading
+import time
+
+# Fixed Last-Modified for all fixture pages
+LAST_MODIFIED = formatdate(1_700_000_000, usegmt=True)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """HTTP server holding the fixture pages and request counters."""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, latency=0.0, fail_first=0):
+        super().__init__(address, FixtureHandler)
+        self.latency = latency
+        # Number of 503 responses to send for each path before serving it
+        self.fail_first = fail_first
+        self.pages = []
+        for path in fixture_paths():
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.pages.append((body, gzip.compress(body), f'"{hashlib.sha1(body).hexdigest()}"'))
+        
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'failed': 0, 'in_flight': 0, 'max_in_flight': 0}
+    
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.stats['requests'] += 1
+            server.stats['in_flight'] += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.stats['in_flight'])
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            self._respond()
+        finally:
+            with server.lock:
+                server.stats['in_flight'] -= 1
+    
+    def _respond(self):
+        server = self.server
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'bonus' or not parts[1].isdigit() or not server.pages:
+            self.send_error(404)
+            return
+        
+        with server.lock:
+            failures = server.failures.get(self.path, 0)
+            if failures < server.fail_first:
+                server.failures[self.path] = failures + 1
+                server.stats['failed'] += 1
+                fail = True
+            else:
+                fail = False
+        if fail:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        body, compressed, etag = server.pages[(int(parts[1]) - 1) % len(server.pages)]
+        
+        if self.headers.get('If-None-Match') == etag or self.headers.get('If-Modified-Since') == LAST_MODIFIED:
+            with server.lock:
+                server.stats['not_modified'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        payload = compressed if use_gzip else body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@contextmanager
+def serve_fixtures(latency=0.0, fail_first=0, port=0):
+    """Run a FixtureServer on a background thread for the duration of the block."""
+    server = FixtureServer(('127.0.0.1', port), latency=latency, fail_first=fail_first)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = FixtureServer(('127.0.0.1', port))
+    print(f"Serving {len(server.pages)} fixture pages at {server.base_url}/bonus/<n>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
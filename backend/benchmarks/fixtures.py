@@ -0,0 +1,111 @@
+"""
+Fixture bonus listing pages for scraper and parser benchmarks.
+
+The pages mimic a supermarket bonus listing: a grid of product cards plus
+the same products embedded as __NEXT_DATA__ and ld+json, surrounded by the
+navigation and footer markup real pages carry.
+
+Regenerate the saved pages with:
+    python benchmarks/fixtures.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from benchmarks.synthetic import synthetic_discounts
+from html import escape
+import json
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+PAGES = 3
+PRODUCTS_PER_PAGE = 60
+
+# Filler markup so the product grid is a realistic fraction of the page
+NAV_LINKS = ''.join(
+    f'<li class="nav-item"><a href="/producten/categorie-{i}">Categorie {i}</a></li>'
+    for i in range(80)
+)
+FOOTER = ''.join(
+    f'<div class="footer-col"><h4>Kolom {i}</h4><p>{"Service en contact. " * 20}</p></div>'
+    for i in range(12)
+)
+
+
+def _card(product):
+    return f"""
+    <article class="product-card" data-product-id="{escape(product['product_url'])}">
+      <a class="product-link" href="{escape(product['product_url'])}">
+        <img class="product-image" src="{escape(product['image_url'])}" alt="">
+        <h3 class="product-title">{escape(product['product_name'])}</h3>
+      </a>
+      <span class="product-category">{escape(product['category'])}</span>
+      <div class="price">
+        <span class="price-old">€{product['original_price']:.2f}</span>
+        <span class="price-now">€{product['discount_price']:.2f}</span>
+      </div>
+      <p class="promo-label">{escape(product['description'] or '')}</p>
+    </article>"""
+
+
+def render_listing_page(page, products_per_page=PRODUCTS_PER_PAGE):
+    """Render one listing page as an HTML string."""
+    products = list(synthetic_discounts(products_per_page, seed=page, start=page * products_per_page))
+    for product in products:
+        product.pop('valid_from')
+        product.pop('valid_until')
+    
+    next_data = {'props': {'pageProps': {'page': page, 'products': products}}}
+    ld_json = {
+        '@context': 'https://schema.org',
+        '@type': 'ItemList',
+        'itemListElement': [
+            {
+                '@type': 'Product',
+                'name': p['product_name'],
+                'url': p['product_url'],
+                'offers': {'@type': 'Offer', 'price': p['discount_price'], 'priceCurrency': 'EUR'}
+            }
+            for p in products
+        ]
+    }
+    
+    return f"""<!DOCTYPE html>
+<html lang="nl">
+<head>
+  <meta charset="utf-8">
+  <title>Bonus - pagina {page}</title>
+  <script type="application/ld+json">{json.dumps(ld_json)}</script>
+</head>
+<body>
+  <nav class="main-nav"><ul>{NAV_LINKS}</ul></nav>
+  <main>
+    <h1>Bonus aanbiedingen</h1>
+    <section class="product-grid">{''.join(_card(p) for p in products)}
+    </section>
+  </main>
+  <footer>{FOOTER}</footer>
+  <script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script>
+</body>
+</html>
+"""
+
+
+def fixture_paths():
+    """Return the paths of the saved fixture pages."""
+    return sorted(
+        os.path.join(FIXTURES_DIR, name)
+        for name in os.listdir(FIXTURES_DIR) if name.endswith('.html')
+    )
+
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for page in range(1, PAGES + 1):
+        path = os.path.join(FIXTURES_DIR, f'bonus_page_{page}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(render_listing_page(page))
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Synthetic discount data and throwaway databases for benchmarks.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models.database import Base, create_db_engine
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta
+import random
+import tempfile
+
+SUPERMARKETS = ['Albert Heijn', 'Jumbo', 'Lidl', 'Dirk']
+CATEGORIES = [
+    'Zuivel', 'Brood', 'Koffie & Thee', 'Groente & Fruit', 'Vlees',
+    'Dranken', 'Snoep', 'Diepvries', 'Huishouden', 'Verzorging'
+]
+PRODUCTS = [
+    'Melk Halfvolle', 'Brood Volkoren', 'Koffie Aroma Rood', 'Appels Elstar',
+    'Kipfilet', 'Coca Cola', 'Chocolade Reep', 'Pizza Margherita',
+    'Wasmiddel', 'Shampoo', 'Kaas Jong Belegen', 'Yoghurt Griekse'
+]
+
+
+def synthetic_discounts(n, seed=42, start=0):
+    """Yield n distinct, realistic-looking discount records numbered from start."""
+    rng = random.Random(seed)
+    valid_from = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    for i in range(start, start + n):
+        supermarket = SUPERMARKETS[i % len(SUPERMARKETS)]
+        original_price = round(rng.uniform(0.5, 15.0), 2)
+        discount_price = round(original_price * rng.uniform(0.4, 0.95), 2)
+        yield {
+            'supermarket': supermarket,
+            'product_name': f'{rng.choice(PRODUCTS)} {i}',
+            'category': rng.choice(CATEGORIES),
+            'original_price': original_price,
+            'discount_price': discount_price,
+            'discount_percentage': round((original_price - discount_price) / original_price * 100, 2),
+            'valid_from': valid_from,
+            'valid_until': valid_from + timedelta(days=rng.randint(1, 14)),
+            'image_url': f'https://example.com/img/{i}.jpg',
+            'product_url': f'https://example.com/{supermarket.lower().replace(" ", "-")}/p/{i}',
+            'description': rng.choice(['1+1 gratis', '2e halve prijs', '25% korting', None]),
+            'is_active': True
+        }
+
+
+def temp_database(engine_factory=create_db_engine):
+    """
+    Create an empty SQLite database in a temporary directory.
+    
+    engine_factory(url) builds the engine, so benchmarks can compare
+    configurations. Returns (engine, session_factory, path); the caller
+    removes the file with remove_database.
+    """
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='bench_')
+    os.close(fd)
+    engine = engine_factory(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine), path
+
+
+def remove_database(path):
+    """Delete a temporary database along with its WAL, shared-memory and version files."""
+    for suffix in ('', '-wal', '-shm', '-version'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
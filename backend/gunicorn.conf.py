@@ -0,0 +1,50 @@
+"""
+gunicorn configuration for the API.
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Runs WEB_CONCURRENCY worker processes (default 2 * CPUs + 1), each with
+GUNICORN_THREADS threads (gthread workers), so a slow export or streamed
+listing does not hold up a whole process. Settings come from the
+environment:
+
+    PORT               listen port (default 5000)
+    WEB_CONCURRENCY    worker processes
+    GUNICORN_THREADS   threads per worker (default 4)
+    GUNICORN_TIMEOUT   seconds before a silent worker is restarted (default 60)
+    GUNICORN_PRELOAD   import the app once in the master (default false)
+
+The master runs api.app.ensure_db() before any worker starts. Forked
+workers inherit the imported module with the schema marked ready, so they
+never run init_db() and never race each other through a migration.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = 5
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() in ('true', '1', 'yes')
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Create or migrate the schema before the workers are forked."""
+    from api.app import ensure_db
+    from models.database import engine
+    ensure_db()
+    # Forked workers must not share the master's SQLite connections
+    engine.dispose()
+
+
+def post_fork(server, worker):
+    """Drop any pooled connections inherited from the master, leaving them open for it."""
+    from models.database import engine
+    engine.dispose(close=False)
@@ -1,6 +1,20 @@
 """
 Models package initialization.
 """
-from .database import Discount, init_db, get_db, SessionLocal
+from .database import (
+    Discount, DiscountSummary, Product, PriceRun, CanonicalProduct, CanonicalToken, ScrapeCheckpoint,
+    init_db, get_db, SessionLocal
+)
+from .summary import compute_stats, refresh_summary, load_summary
+from .search import search_condition, relevance_ranking
+from .history import record_observations, product_history
+from .matching import match_products
 
-__all__ = ['Discount', 'init_db', 'get_db', 'SessionLocal']
+__all__ = [
+    'Discount', 'DiscountSummary', 'Product', 'PriceRun', 'CanonicalProduct', 'CanonicalToken',
+    'ScrapeCheckpoint',
+    'init_db', 'get_db', 'SessionLocal',
+    'compute_stats', 'refresh_summary', 'load_summary',
+    'search_condition', 'relevance_ranking',
+    'record_observations', 'product_history', 'match_products'
+]
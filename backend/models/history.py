@@ -0,0 +1,312 @@
+"""
+Price history of every supermarket product.
+
+Ingestion records one observation per product per batch in which one of
+its offers is scraped. Observations are run-length encoded in
+price_history: while a product keeps its prices, the latest run is
+extended in place, and a row is only appended when a price changes.
+Re-scraped offers whose content is unchanged only extend runs, by a fixed
+two statements per batch. The products table keeps the running lowest and highest price, so
+the all-time-low flag of an offer is decided at ingestion time from a
+single product row instead of scanning the history at query time.
+"""
+from .database import Discount, Product, PriceRun
+from .matching import match_products
+from sqlalchemy import ARRAY, DateTime, Integer, bindparam, case, column, func, insert, literal, or_, select, update
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from itertools import groupby
+import json
+
+# Rows replayed per transaction by backfill_price_history
+BACKFILL_BATCH_SIZE = 5000
+
+# Product columns ingestion needs to extend runs and decide all-time lows
+PRODUCT_STATE_COLUMNS = [
+    'id', 'supermarket', 'product_key', 'product_name', 'canonical_id', 'lowest_price', 'highest_price',
+    'last_price', 'last_original_price', 'last_run_id'
+]
+
+
+def is_all_time_low(price, lowest_price, highest_price):
+    """
+    Whether price is at or below every price recorded before.
+    
+    A product that has only ever been seen at one price is not flagged, so
+    the flag marks offers that are actually cheaper than usual.
+    """
+    if price is None or lowest_price is None:
+        return False
+    return price <= lowest_price and price < highest_price
+
+
+def _id_set(session, ids):
+    """
+    A subquery of ids bound as a single parameter, so a batch of any size
+    is one statement: json_each() on SQLite, unnest() on PostgreSQL.
+    """
+    ids = list(ids)
+    if session.get_bind().dialect.name == 'postgresql':
+        return select(func.unnest(literal(ids, ARRAY(Integer))))
+    return select(column('value')).select_from(func.json_each(literal(json.dumps(ids))))
+
+
+def _load_products(session, keys):
+    products = Product.__table__
+    rows = session.execute(
+        select(*[products.c[name] for name in PRODUCT_STATE_COLUMNS]).where(
+            products.c.supermarket.in_({supermarket for supermarket, _ in keys}),
+            products.c.product_key.in_({product_key for _, product_key in keys})
+        )
+    )
+    return {(row[1], row[2]): dict(zip(PRODUCT_STATE_COLUMNS, row)) for row in rows}
+
+
+def record_observations(session, records, now=None):
+    """
+    Record the prices of a batch of normalized records in the price history.
+    
+    Sets product_id, canonical_id and is_all_time_low on every record, the
+    flag against the prices recorded before this batch. New products are
+    matched onto canonical products by name. When a batch holds several
+    offers of the same product, its lowest price is recorded. Active offers
+    whose flag is superseded by a new low are cleared. Does not commit.
+    
+    Runs are appended with INSERT ... SELECT from the product rows, and runs
+    and product timestamps are moved by one set-based UPDATE each, with the
+    batch's ids bound as a single parameter, so per-product parameters are
+    only sent for new products and for products whose prices changed.
+    """
+    now = now or datetime.utcnow()
+    records = [r for r in records if r.get('product_key')]
+    if not records:
+        return
+    
+    # Lowest price per product in this batch
+    observed = {}
+    for record in records:
+        key = (record['supermarket'], record['product_key'])
+        price = record.get('discount_price')
+        if price is not None and (key not in observed or price < observed[key][0]):
+            observed[key] = (price, record.get('original_price'), record.get('product_name'))
+    
+    keys = {(r['supermarket'], r['product_key']) for r in records}
+    products = _load_products(session, keys)
+    
+    missing = keys - products.keys()
+    if missing:
+        names = {key: r.get('product_name') for r in records for key in [(r['supermarket'], r['product_key'])]}
+        canonical_ids = match_products(session, {names[key] for key in missing if names[key]})
+        new_products = []
+        for supermarket, product_key in missing:
+            price, original_price, name = observed.get((supermarket, product_key), (None, None, None))
+            name = name or names[(supermarket, product_key)]
+            new_products.append({
+                'supermarket': supermarket, 'product_key': product_key, 'product_name': name,
+                'canonical_id': canonical_ids.get(name),
+                'observations': 0, 'lowest_price': price, 'highest_price': price,
+                'last_price': price, 'last_original_price': original_price
+            })
+        session.execute(insert(Product.__table__), new_products)
+        products.update(_load_products(session, missing))
+    
+    for record in records:
+        key = (record['supermarket'], record['product_key'])
+        product = products[key]
+        record['product_id'] = product['id']
+        record['canonical_id'] = product['canonical_id']
+        lowest = None if key in missing else product['lowest_price']
+        if lowest is not None and key in observed:
+            # A cheaper offer of the same product in this batch takes the low
+            lowest = min(lowest, observed[key][0])
+        record['is_all_time_low'] = is_all_time_low(record.get('discount_price'), lowest, product['highest_price'])
+    
+    new_runs, extended_runs, changed_products, new_lows = [], [], [], []
+    for key, (price, original_price, name) in observed.items():
+        product = products[key]
+        if key in missing:
+            new_runs.append(product['id'])
+            continue
+        
+        lowest, highest = product['lowest_price'], product['highest_price']
+        same_prices = (product['last_price'], product['last_original_price']) == (price, original_price)
+        if product['last_run_id'] is not None and same_prices:
+            extended_runs.append(product['last_run_id'])
+        else:
+            new_runs.append(product['id'])
+        
+        if lowest is not None and price < lowest:
+            new_lows.append({'b_product_id': product['id'], 'b_price': price})
+        
+        if not same_prices or (name and name != product['product_name']):
+            changed_products.append({
+                'b_id': product['id'],
+                'b_name': name or product['product_name'],
+                'b_lowest': price if lowest is None else min(lowest, price),
+                'b_highest': price if highest is None else max(highest, price),
+                'b_price': price,
+                'b_original_price': original_price
+            })
+    
+    runs = PriceRun.__table__
+    table = Product.__table__
+    
+    if changed_products:
+        # SET expressions see the old row, so lowest_price_at compares against the previous low
+        session.execute(
+            update(table).where(table.c.id == bindparam('b_id')).values(
+                product_name=bindparam('b_name'),
+                lowest_price_at=case(
+                    (or_(table.c.lowest_price.is_(None), bindparam('b_lowest') < table.c.lowest_price), None),
+                    else_=table.c.lowest_price_at
+                ),
+                lowest_price=bindparam('b_lowest'),
+                highest_price=bindparam('b_highest'),
+                last_price=bindparam('b_price'),
+                last_original_price=bindparam('b_original_price')
+            ),
+            changed_products
+        )
+    
+    if new_runs:
+        new_ids = _id_set(session, new_runs)
+        session.execute(insert(runs).from_select(
+            ['product_id', 'discount_price', 'original_price', 'first_seen', 'last_seen', 'observations'],
+            select(
+                table.c.id, table.c.last_price, table.c.last_original_price,
+                literal(now, DateTime), literal(now, DateTime), literal(1)
+            ).where(table.c.id.in_(new_ids))
+        ))
+        latest_run = select(func.max(runs.c.id)).where(runs.c.product_id == table.c.id).scalar_subquery()
+        session.execute(update(table).where(table.c.id.in_(new_ids)).values(last_run_id=latest_run))
+    
+    if extended_runs:
+        session.execute(
+            update(runs).where(runs.c.id.in_(_id_set(session, extended_runs))).values(
+                last_seen=now, observations=runs.c.observations + 1
+            )
+        )
+    
+    if observed:
+        # New lows were reset to NULL above, as were the new products' first timestamps
+        observed_ids = _id_set(session, (products[key]['id'] for key in observed))
+        session.execute(
+            update(table).where(table.c.id.in_(observed_ids)).values(
+                first_seen=func.coalesce(table.c.first_seen, now),
+                last_seen=now,
+                lowest_price_at=func.coalesce(table.c.lowest_price_at, now),
+                observations=table.c.observations + 1
+            )
+        )
+    
+    if new_lows:
+        # Older offers of these products are no longer at the all-time low
+        discounts = Discount.__table__
+        session.execute(
+            update(discounts).where(
+                discounts.c.is_active == True,
+                discounts.c.product_id == bindparam('b_product_id'),
+                discounts.c.discount_price > bindparam('b_price'),
+                discounts.c.is_all_time_low == True
+            ).values(is_all_time_low=False),
+            new_lows
+        )
+
+
+def extend_observations(session, discount_ids, now=None):
+    """
+    Record a re-scrape of stored offers whose content did not change.
+    
+    Extends the latest run and moves last_seen and observations of the
+    products of the given discounts, with two set-based UPDATEs whatever
+    the batch size. Products already observed at now by
+    record_observations in the same batch are left alone, and a run is
+    only extended while the offer's price is still the product's latest.
+    Does not commit.
+    """
+    now = now or datetime.utcnow()
+    discount_ids = list(discount_ids)
+    if not discount_ids:
+        return
+    
+    runs = PriceRun.__table__
+    table = Product.__table__
+    discounts = Discount.__table__
+    not_yet_seen = or_(table.c.last_seen.is_(None), table.c.last_seen < now)
+    unchanged_ids = _id_set(session, discount_ids)
+    
+    session.execute(
+        update(runs).where(runs.c.id.in_(
+            select(table.c.last_run_id).join(discounts, discounts.c.product_id == table.c.id).where(
+                discounts.c.id.in_(unchanged_ids),
+                discounts.c.discount_price == table.c.last_price,
+                not_yet_seen
+            )
+        )).values(last_seen=now, observations=runs.c.observations + 1)
+    )
+    session.execute(
+        update(table).where(
+            table.c.id.in_(select(discounts.c.product_id).where(discounts.c.id.in_(unchanged_ids))),
+            not_yet_seen
+        ).values(last_seen=now, observations=table.c.observations + 1)
+    )
+
+
+def product_history(session, product_id):
+    """Return the product with its price runs, oldest first, or None if it does not exist."""
+    product = session.get(Product, product_id)
+    if product is None:
+        return None
+    
+    runs = session.execute(
+        select(PriceRun).where(PriceRun.product_id == product_id).order_by(PriceRun.first_seen)
+    ).scalars()
+    return {
+        'product': product.to_dict(),
+        'history': [run.to_dict() for run in runs]
+    }
+
+
+def backfill_price_history(bind):
+    """
+    Seed products and price history from the discounts already stored.
+    
+    Rows are replayed in ingestion order, grouped by created_at (a bulk
+    ingestion batch shares one timestamp), and their product_id and
+    is_all_time_low columns are filled in, along with canonical_id.
+    """
+    session = sessionmaker(bind=bind)()
+    try:
+        rows = session.execute(
+            select(
+                Discount.id, Discount.supermarket, Discount.product_key, Discount.product_name,
+                Discount.discount_price, Discount.original_price, Discount.created_at
+            ).where(Discount.product_key.isnot(None)).order_by(Discount.created_at, Discount.id)
+        ).mappings().all()
+        
+        table = Discount.__table__
+        mark = update(table).where(table.c.id == bindparam('b_id')).values(
+            product_id=bindparam('b_product_id'), is_all_time_low=bindparam('b_is_all_time_low'),
+            canonical_id=bindparam('b_canonical_id')
+        )
+        
+        for created_at, group in groupby(rows, key=lambda row: row['created_at']):
+            group = [dict(row) for row in group]
+            for start in range(0, len(group), BACKFILL_BATCH_SIZE):
+                batch = group[start:start + BACKFILL_BATCH_SIZE]
+                record_observations(session, batch, now=created_at)
+                session.execute(mark, [
+                    {
+                        'b_id': r['id'], 'b_product_id': r['product_id'],
+                        'b_is_all_time_low': r['is_all_time_low'], 'b_canonical_id': r['canonical_id']
+                    }
+                    for r in batch
+                ])
+                session.commit()
+    
+    except Exception:
+        session.rollback()
+        raise
+    
+    finally:
+        session.close()
@@ -0,0 +1,323 @@
+"""
+Product identity across supermarkets.
+
+Every store product is matched onto a canonical product when it is first
+ingested, so comparing prices across supermarkets is an indexed lookup on
+canonical_id instead of a fuzzy comparison of every pair of names at query
+time.
+
+Names are normalized into a brand, a size and a set of name tokens
+("Coca-Cola 6 x 330 ml" -> brand "coca cola", size "6x330ml"). A product
+whose normalized form (its signature) already exists joins that canonical
+product. Otherwise candidates are blocked: the brand, the size, and any
+numbers and variant words such as "zero" or "halfvolle" (together the
+block) must agree, and a candidate must share a name token, found through
+the canonical_tokens inverted index on (block, token). The Jaccard
+similarity of the tokens must then reach PRODUCT_MATCH_THRESHOLD.
+
+Scrapers ingest concurrently, so two batches can create the same canonical
+product at once. Canonical products and their tokens are inserted with ON
+CONFLICT DO NOTHING and the ids are read back by signature, so the later
+batch adopts the row the earlier one committed.
+"""
+from .database import Discount, Product, CanonicalProduct, CanonicalToken
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker
+from collections import namedtuple
+import os
+import re
+import unicodedata
+
+# Minimum token Jaccard similarity for a near match
+PRODUCT_MATCH_THRESHOLD = float(os.getenv('PRODUCT_MATCH_THRESHOLD', '0.6'))
+
+# Values per IN (...) list, below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 900
+
+# Store-brand prefixes, dropped so house brands of different stores compare
+HOUSE_BRANDS = ['albert heijn', 'ah', 'jumbo', 'lidl', 'dirk', '1 de beste']
+
+# Brands recognized anywhere in a name, as normalized token sequences
+KNOWN_BRANDS = [
+    'coca cola', 'pepsi', 'fanta', 'sprite', 'red bull', 'spa', 'chaudfontaine', 'lipton',
+    'heineken', 'grolsch', 'amstel', 'hertog jan', 'bavaria',
+    'douwe egberts', 'nescafe', 'lavazza', 'senseo', 'pickwick',
+    'unox', 'calve', 'knorr', 'conimex', 'honig', 'hak', 'bonduelle', 'iglo', 'dr oetker',
+    'campina', 'arla', 'optimel', 'melkunie', 'becel', 'blue band', 'zwan', 'mora',
+    'lays', 'doritos', 'pringles', 'milka', 'tonys chocolonely', 'verkade', 'lu', 'liga',
+    'bolletje', 'magnum', 'ola', 'ben jerrys', 'chiquita',
+    'robijn', 'ariel', 'dreft', 'andrelon', 'dove', 'nivea', 'zwitsal'
+]
+
+STOPWORDS = {'de', 'het', 'een', 'van', 'met', 'en', 'of', 'per', 'voor', 'in'}
+
+# Words that make a different product of the same brand and size
+VARIANTS = {
+    'zero', 'light', 'diet', 'max', 'suikervrij', 'decaf', 'cafeinevrij', 'alcoholvrij', '0.0%',
+    'volle', 'halfvolle', 'magere', 'lactosevrij', 'bio', 'biologisch', 'vegan', 'vegetarisch'
+}
+
+# Units mapped to a base unit and factor
+UNITS = {
+    'kg': ('g', 1000), 'kilo': ('g', 1000), 'g': ('g', 1), 'gr': ('g', 1), 'gram': ('g', 1), 'mg': ('g', 0.001),
+    'l': ('ml', 1000), 'lt': ('ml', 1000), 'ltr': ('ml', 1000), 'liter': ('ml', 1000), 'cl': ('ml', 10),
+    'ml': ('ml', 1)
+}
+UNIT_PATTERN = '|'.join(sorted(UNITS, key=len, reverse=True))
+MULTIPACK_RE = re.compile(rf'\b(\d+)\s*x\s*(\d+(?:\.\d+)?)\s*({UNIT_PATTERN})\b')
+SIZE_RE = re.compile(rf'\b(\d+(?:\.\d+)?)\s*({UNIT_PATTERN})\b')
+COUNT_RE = re.compile(r'\b(\d+)\s*-?\s*(?:pack|pak|stuks|stuk|st)\b')
+
+QUOTES_RE = re.compile(r"['’`]")
+DECIMAL_COMMA_RE = re.compile(r'(\d),(\d)')
+SEPARATORS_RE = re.compile(r'[^a-z0-9.%]+|(?<!\d)\.|\.(?!\d)')
+HAS_DIGIT = re.compile(r'\d').search
+
+# Brand lengths in words, longest first, for word n-gram lookups
+BRAND_LENGTHS = sorted({len(b.split()) for b in KNOWN_BRANDS}, reverse=True)
+BRAND_SET = set(KNOWN_BRANDS)
+
+# words are the tokens a candidate may share; the others are part of the block
+ParsedName = namedtuple('ParsedName', ['brand', 'size', 'tokens', 'words', 'block', 'signature'])
+
+
+def normalize_text(name):
+    """Lowercase, strip accents, and reduce punctuation to spaces (keeping decimals)."""
+    text = name.lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        text = text.replace('×', 'x')
+    text = QUOTES_RE.sub('', text)
+    text = DECIMAL_COMMA_RE.sub(r'\1.\2', text)
+    text = SEPARATORS_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def _quantity(value, unit):
+    base, factor = UNITS[unit]
+    return f'{float(value) * factor:g}{base}'
+
+
+def _extract_size(text):
+    """Return (size, text without it); sizes are normalized to g, ml or a count."""
+    match = MULTIPACK_RE.search(text)
+    if match:
+        size = f'{int(match.group(1))}x{_quantity(match.group(2), match.group(3))}'
+    else:
+        match = SIZE_RE.search(text)
+        if match:
+            size = _quantity(match.group(1), match.group(2))
+        else:
+            match = COUNT_RE.search(text)
+            if not match:
+                return None, text
+            size = f'{int(match.group(1))}x'
+    return size, (text[:match.start()] + ' ' + text[match.end():]).strip()
+
+
+def _strip_prefix(text, prefixes):
+    for prefix in prefixes:
+        if text == prefix or text.startswith(prefix + ' '):
+            return text[len(prefix):].strip()
+    return text
+
+
+def parse_name(name):
+    """Normalize a product name into brand, size, name tokens and signature."""
+    text = _strip_prefix(normalize_text(name), HOUSE_BRANDS)
+    size, text = _extract_size(text)
+    
+    words = text.split()
+    brand = next((
+        candidate
+        for n in BRAND_LENGTHS for i in range(len(words) - n + 1)
+        for candidate in [' '.join(words[i:i + n])] if candidate in BRAND_SET
+    ), None)
+    
+    tokens = frozenset(t for t in words if t not in STOPWORDS)
+    return _parsed(brand, size, tokens)
+
+
+def _parsed(brand, size, tokens):
+    exact = {t for t in tokens if t in VARIANTS or HAS_DIGIT(t)}
+    block = f"{brand or ''}|{size or ''}|{' '.join(sorted(exact))}"
+    return ParsedName(brand, size, tokens, tokens - exact, block, f"{block}|{' '.join(sorted(tokens))}")
+
+
+def similarity(a, b):
+    """
+    Similarity of two parsed names between 0 and 1.
+    
+    Names in different blocks (brand, size, numbers or variant differ) never match;
+    otherwise this is the Jaccard similarity of their tokens.
+    """
+    if a.block != b.block:
+        return 0.0
+    if not a.tokens or not b.tokens:
+        return 1.0 if a.tokens == b.tokens else 0.0
+    return len(a.tokens & b.tokens) / len(a.tokens | b.tokens)
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def _insert_ignore(session, table):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect."""
+    dialect = postgresql if session.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def match_products(session, names):
+    """
+    Map product names onto canonical product ids, creating canonical
+    products for names that match none.
+    
+    Exact signatures are looked up through their unique index; the other
+    names are scored against the candidates sharing a token with them,
+    including canonical products created earlier in the same call. Returns
+    a dict of name -> canonical id. Does not commit.
+    """
+    parsed = {name: parse_name(name) for name in names if name and name.strip()}
+    if not parsed:
+        return {}
+    
+    canonical = CanonicalProduct.__table__
+    known = {}
+    for signatures in _chunks({p.signature for p in parsed.values()}):
+        for row in session.execute(
+            select(canonical.c.signature, canonical.c.id).where(canonical.c.signature.in_(signatures))
+        ):
+            known[row[0]] = row[1]
+    
+    # Candidates for the remaining names, blocked on shared tokens
+    unmatched = {name: p for name, p in parsed.items() if p.signature not in known}
+    candidates = {}
+    by_posting = {}
+    candidate_ids = set()
+    tokens = CanonicalToken.__table__
+    # Each chunk of blocks is looked up with the words of its names; the
+    # cross product is filtered against the postings actually asked for
+    names = sorted(unmatched.values(), key=lambda p: p.block)
+    for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+        chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+        postings = {(p.block, word) for p in chunk for word in p.words}
+        if not postings:
+            continue
+        for block, token, canonical_id in session.execute(
+            select(tokens.c.block, tokens.c.token, tokens.c.canonical_id).where(
+                tokens.c.block.in_({block for block, _ in postings}),
+                tokens.c.token.in_({token for _, token in postings})
+            )
+        ):
+            if (block, token) in postings:
+                by_posting.setdefault((block, token), set()).add(canonical_id)
+                candidate_ids.add(canonical_id)
+    for ids in _chunks(candidate_ids):
+        for row in session.execute(
+            select(canonical.c.id, canonical.c.brand, canonical.c.size, canonical.c.tokens, canonical.c.signature)
+            .where(canonical.c.id.in_(ids))
+        ):
+            candidates[row.id] = _parsed(row.brand, row.size, frozenset((row.tokens or '').split()))
+    
+    known.update((c.signature, canonical_id) for canonical_id, c in candidates.items())
+    
+    # Signature of the canonical product each name is assigned to
+    assigned = {name: p.signature for name, p in parsed.items() if name not in unmatched}
+    # Canonical products created by this call
+    created = {}
+    created_by_posting = {}
+    for name in sorted(unmatched):
+        p = unmatched[name]
+        if p.signature in created:
+            assigned[name] = p.signature
+            continue
+        
+        best, best_score = None, 0.0
+        for posting in [(p.block, word) for word in p.words]:
+            for canonical_id in by_posting.get(posting, ()):
+                score = similarity(p, candidates[canonical_id])
+                if score > best_score:
+                    best, best_score = candidates[canonical_id].signature, score
+            for signature in created_by_posting.get(posting, ()):
+                score = similarity(p, created[signature][1])
+                if score > best_score:
+                    best, best_score = signature, score
+        
+        if best is not None and best_score >= PRODUCT_MATCH_THRESHOLD:
+            assigned[name] = best
+            continue
+        
+        created[p.signature] = (name, p)
+        for word in p.words:
+            created_by_posting.setdefault((p.block, word), set()).add(p.signature)
+        assigned[name] = p.signature
+    
+    if created:
+        # A concurrent batch may have created some of these signatures since
+        # the lookup above; its rows win and their ids are read back below
+        session.execute(_insert_ignore(session, canonical), [
+            {
+                'signature': signature, 'name': name, 'brand': p.brand,
+                'size': p.size, 'tokens': ' '.join(sorted(p.tokens))
+            }
+            for signature, (name, p) in created.items()
+        ])
+        for signatures in _chunks(created):
+            for row in session.execute(
+                select(canonical.c.signature, canonical.c.id).where(canonical.c.signature.in_(signatures))
+            ):
+                known[row[0]] = row[1]
+        
+        token_rows = [
+            {'block': p.block, 'token': token, 'canonical_id': known[signature]}
+            for signature, (_, p) in created.items() for token in p.words
+        ]
+        if token_rows:
+            session.execute(_insert_ignore(session, CanonicalToken.__table__), token_rows)
+    
+    return {name: known[signature] for name, signature in assigned.items()}
+
+
+def backfill_canonical_ids(bind):
+    """Match every stored product without a canonical id and copy the ids onto its discounts."""
+    session = sessionmaker(bind=bind)()
+    try:
+        products = Product.__table__
+        rows = session.execute(
+            select(products.c.id, products.c.product_name).where(
+                products.c.canonical_id.is_(None), products.c.product_name.isnot(None)
+            )
+        ).all()
+        
+        for start in range(0, len(rows), LOOKUP_CHUNK_SIZE * 5):
+            batch = rows[start:start + LOOKUP_CHUNK_SIZE * 5]
+            matched = match_products(session, {name for _, name in batch})
+            session.execute(
+                update(products).where(products.c.id == bindparam('b_id')).values(
+                    canonical_id=bindparam('b_canonical_id')
+                ),
+                [{'b_id': product_id, 'b_canonical_id': matched.get(name)} for product_id, name in batch]
+            )
+            session.commit()
+        
+        discounts = Discount.__table__
+        session.execute(
+            update(discounts).where(
+                discounts.c.canonical_id.is_(None), discounts.c.product_id.isnot(None)
+            ).values(canonical_id=(
+                select(products.c.canonical_id).where(products.c.id == discounts.c.product_id).scalar_subquery()
+            ))
+        )
+        session.commit()
+    
+    except Exception:
+        session.rollback()
+        raise
+    
+    finally:
+        session.close()
@@ -0,0 +1,134 @@
+"""
+Full-text product search backed by an SQLite FTS5 index.
+
+discounts_fts is an external-content FTS5 table over product_name,
+description and category, kept in sync with discounts by triggers. The
+unicode61 tokenizer strips diacritics so "creme" matches "Crème fraîche".
+On other databases, or an SQLite build without FTS5, search falls back to
+ILIKE on product_name.
+"""
+from .database import Discount, engine
+from sqlalchemy import column, literal_column, select, table, text
+from sqlalchemy.exc import OperationalError
+import re
+
+FTS_TABLE = 'discounts_fts'
+
+# FTS5 virtual table plus the triggers that mirror changes from discounts
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        product_name, description, category,
+        content='discounts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON discounts BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, product_name, description, category)
+        VALUES (new.id, new.product_name, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON discounts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, description, category)
+        VALUES ('delete', old.id, old.product_name, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF product_name, description, category ON discounts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, description, category)
+        VALUES ('delete', old.id, old.product_name, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, product_name, description, category)
+        VALUES (new.id, new.product_name, new.description, new.category);
+    END""",
+]
+
+fts_table = table(FTS_TABLE, column('rowid'), column('rank'))
+
+# Cache of fulltext availability per database URL
+_fulltext_enabled = {}
+
+
+def setup_fulltext(bind=None):
+    """
+    Create the FTS index and sync triggers if the database supports them.
+    
+    A newly created index is populated from the existing discounts rows.
+    Returns True when full-text search is available.
+    """
+    bind = bind or engine
+    if bind.dialect.name != 'sqlite':
+        _fulltext_enabled[str(bind.url)] = False
+        return False
+    
+    try:
+        with bind.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            for statement in FTS_SCHEMA:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        enabled = True
+    except OperationalError:
+        # SQLite compiled without FTS5
+        enabled = False
+    
+    _fulltext_enabled[str(bind.url)] = enabled
+    return enabled
+
+
+def fulltext_enabled(bind=None):
+    """Return whether the FTS index exists for this database."""
+    bind = bind or engine
+    key = str(bind.url)
+    if key not in _fulltext_enabled:
+        if bind.dialect.name != 'sqlite':
+            _fulltext_enabled[key] = False
+        else:
+            with bind.connect() as conn:
+                _fulltext_enabled[key] = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first() is not None
+    return _fulltext_enabled[key]
+
+
+def fts_query(term):
+    """
+    Translate a free-text search term into an FTS5 MATCH expression.
+    
+    Every word becomes a quoted prefix query and all words must match,
+    so "volk bro" finds "Brood Volkoren". Returns None if the term has
+    no searchable words.
+    """
+    tokens = re.findall(r'\w+', term or '', re.UNICODE)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _match_select(match):
+    return select(fts_table.c.rowid, fts_table.c.rank).where(
+        literal_column(FTS_TABLE).op('MATCH')(match)
+    )
+
+
+def search_condition(term, bind=None):
+    """Filter condition restricting discounts to those matching term."""
+    match = fts_query(term)
+    if match is None or not fulltext_enabled(bind):
+        return Discount.product_name.ilike(f'%{term}%')
+    return Discount.id.in_(_match_select(match).with_only_columns(fts_table.c.rowid))
+
+
+def relevance_ranking(term, bind=None):
+    """
+    Return a (subquery, order_by) pair ranking matches by BM25 relevance.
+    
+    Join the subquery on rowid == Discount.id and order by the returned
+    column, best match first. Returns None when full-text search is not
+    available for this term.
+    """
+    match = fts_query(term)
+    if match is None or not fulltext_enabled(bind):
+        return None
+    ranked = _match_select(match).subquery('fts_rank')
+    return ranked, ranked.c.rank
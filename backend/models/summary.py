@@ -0,0 +1,179 @@
+"""
+Precomputed discount summary backing the dashboard's overview endpoints.
+
+/api/stats, /api/supermarkets and /api/categories read a single summary
+row instead of aggregating over the discounts table. The data collector
+rebuilds the summary after every ingestion and expiry pass, bumping a
+generation number so clients can tell when the data changed.
+"""
+from .database import Discount, DiscountSummary, DB_DIR, DATABASE_URL
+from sqlalchemy import case, func, literal, literal_column, select, union_all
+from sqlalchemy.engine import make_url
+from datetime import datetime
+import json
+import os
+
+# Percentiles reported in stats (nearest-rank method)
+STATS_PERCENTILES = {'p25': 0.25, 'p50': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+# The summary table holds exactly one row
+SUMMARY_ID = 1
+
+
+def _data_version_path(database_url):
+    """
+    The version file of a database: beside a SQLite file (as <file>-version,
+    like its -wal and -shm files), else data/data_version.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        return os.path.abspath(url.database) + '-version'
+    return os.path.join(DB_DIR, 'data_version')
+
+
+# Touched on every refresh so API processes can invalidate their caches
+DATA_VERSION_PATH = os.getenv('DATA_VERSION_PATH') or _data_version_path(DATABASE_URL)
+
+# Written by the collection scheduler, served by /api/scheduler
+SCHEDULER_STATUS_PATH = os.path.join(DB_DIR, 'scheduler_status.json')
+
+
+def _grouped_stats_select(dimension, group_column, conditions):
+    """
+    Build a grouped aggregate over discount_percentage for one dimension.
+    
+    Percentiles are computed in SQL with window functions: every row is
+    ranked within its group, and the nearest-rank percentile p is the
+    smallest value whose rank is at least p * n.
+    """
+    pct = Discount.discount_percentage
+    ranked = select(
+        group_column.label('grp'),
+        pct.label('pct'),
+        func.row_number().over(
+            partition_by=[group_column, pct.is_(None)], order_by=pct
+        ).label('rn'),
+        func.count(pct).over(partition_by=group_column).label('n')
+    ).where(*conditions).subquery()
+    
+    percentile_columns = [
+        func.min(case((ranked.c.rn >= fraction * ranked.c.n, ranked.c.pct))).label(name)
+        for name, fraction in STATS_PERCENTILES.items()
+    ]
+    
+    return select(
+        literal(dimension).label('dimension'),
+        ranked.c.grp,
+        func.count().label('count'),
+        func.avg(ranked.c.pct).label('avg'),
+        func.min(ranked.c.pct).label('min'),
+        func.max(ranked.c.pct).label('max'),
+        *percentile_columns
+    ).group_by(ranked.c.grp)
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def empty_stats(count=0):
+    """Stats of a group without percentages: every key, with None values."""
+    return {
+        'count': count, 'average': None, 'min': None, 'max': None,
+        **{name: None for name in STATS_PERCENTILES}
+    }
+
+
+def compute_stats(session, conditions):
+    """
+    Compute discount statistics for the rows matching conditions.
+    
+    Returns count, average, min, max and percentiles of the discount
+    percentage overall, per supermarket and per category, from a single
+    aggregate query.
+    """
+    stmt = union_all(
+        _grouped_stats_select('overall', literal_column("'all'"), conditions),
+        _grouped_stats_select('supermarket', Discount.supermarket, conditions),
+        _grouped_stats_select(
+            'category', Discount.category, list(conditions) + [Discount.category.isnot(None)]
+        )
+    )
+    
+    groups = {'overall': {}, 'supermarket': {}, 'category': {}}
+    for row in session.execute(stmt).mappings():
+        groups[row['dimension']][row['grp']] = {
+            'count': row['count'],
+            'average': _round(row['avg']),
+            'min': _round(row['min']),
+            'max': _round(row['max']),
+            **{name: _round(row[name]) for name in STATS_PERCENTILES}
+        }
+    
+    overall = groups['overall'].get('all') or empty_stats()
+    
+    return {
+        'total_discounts': overall['count'],
+        'supermarket_counts': {
+            name: stats['count'] for name, stats in groups['supermarket'].items()
+        },
+        'average_discount_percentage': overall['average'] or 0,
+        'overall': overall,
+        'by_supermarket': groups['supermarket'],
+        'by_category': groups['category']
+    }
+
+
+def refresh_summary(session):
+    """
+    Rebuild the summary from the active discounts and bump its generation.
+    
+    Commits the session. Returns the new summary dict.
+    """
+    stats = compute_stats(session, [Discount.is_active == True])
+    payload = {
+        'stats': stats,
+        'supermarkets': sorted(stats['by_supermarket']),
+        'categories': sorted(stats['by_category'])
+    }
+    
+    summary = session.get(DiscountSummary, SUMMARY_ID)
+    if summary is None:
+        summary = DiscountSummary(id=SUMMARY_ID, generation=0)
+        session.add(summary)
+    
+    summary.generation += 1
+    summary.payload = json.dumps(payload)
+    summary.refreshed_at = datetime.utcnow()
+    session.commit()
+    
+    mark_data_changed(summary.generation)
+    
+    return _summary_dict(summary, payload)
+
+
+def mark_data_changed(generation):
+    """Record a new data generation in the version file watched by the API cache."""
+    with open(DATA_VERSION_PATH, 'w') as f:
+        f.write(str(generation))
+
+
+def load_summary(session):
+    """
+    Return the current summary, building it first if none exists yet.
+    
+    The result contains generation, refreshed_at, stats, supermarkets
+    and categories.
+    """
+    summary = session.get(DiscountSummary, SUMMARY_ID)
+    if summary is None:
+        return refresh_summary(session)
+    return _summary_dict(summary, json.loads(summary.payload))
+
+
+def _summary_dict(summary, payload):
+    return {
+        'generation': summary.generation,
+        'refreshed_at': summary.refreshed_at.isoformat(),
+        **payload
+    }
@@ -1,11 +1,14 @@
 """
 Base scraper class for supermarket discount scrapers.
 """
-from abc import ABC, abstractmethod
+from abc import ABC
 from datetime import datetime
-from typing import List, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import requests
 from bs4 import BeautifulSoup
+from .fetcher import get_fetcher
+from .page_cache import get_page_cache
+from .parsing import compile_fields, iter_cards, extract_next_data, extract_ld_json
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -13,24 +16,94 @@ logger = logging.getLogger(__name__)
 
 
 class BaseScraper(ABC):
-    """Abstract base class for supermarket scrapers."""
+    """
+    Abstract base class for supermarket scrapers.
+    
+    Subclasses implement either scrape(), returning every discount at once,
+    or iter_discounts(), yielding them one at a time. Streaming scrapers
+    are ingested in bounded batches and can be resumed after a crash.
+    
+    Listing pages are best parsed selectively: subclasses declare the tag
+    and class of their product cards plus an XPath per field (relative to
+    the card) and call parse_cards(), or read embedded JSON with
+    parse_next_data() / parse_ld_json(), instead of building a full soup.
+    
+    Scrapers whose catalog is a set of listing pages can instead implement
+    page_urls() and parse_listing(); the collector then fetches pages on
+    threads and parses them in a process pool, off the GIL.
+    """
+    
+    # Product card declaration used by parse_cards()
+    card_tag: Optional[str] = None
+    card_class: Optional[str] = None
+    card_fields: Dict[str, str] = {}
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.scrape is BaseScraper.scrape and cls.iter_discounts is BaseScraper.iter_discounts:
+            raise TypeError(f"{cls.__name__} must implement scrape() or iter_discounts()")
+        # Compile the card XPaths once per class, not once per page
+        cls._compiled_card_fields = compile_fields(cls.card_fields)
     
     def __init__(self, supermarket_name: str):
         self.supermarket_name = supermarket_name
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # Shared across scrapers: pooled connections, per-host limits, retries
+        self.fetcher = get_fetcher()
+        # Conditional-request cache under data/raw (None when disabled)
+        self.page_cache = get_page_cache()
+        # State saved by checkpoint() on an interrupted run, handed back on resume
+        self.resume_state: Any = None
+        self.checkpoint_state: Any = None
     
-    @abstractmethod
     def scrape(self) -> List[Dict]:
         """
         Scrape discount data from the supermarket website.
         Returns a list of dictionaries with discount information.
         """
-        pass
+        return list(self.iter_discounts())
+    
+    def iter_discounts(self) -> Iterator[Dict]:
+        """
+        Yield discount dictionaries one at a time.
+        
+        The collector consumes this stream. The default implementation
+        yields from scrape(); streaming scrapers override it, start from
+        self.resume_state when it is set, and call checkpoint() as they go.
+        """
+        yield from self.scrape()
+    
+    def page_urls(self) -> Optional[Iterable[str]]:
+        """
+        Listing page URLs for the collector's fetch/parse pipeline.
+        
+        Return None (the default) to be collected through iter_discounts()
+        instead. May be a lazy iterable.
+        """
+        return None
     
-    def parse_price(self, price_str: str) -> float:
+    @classmethod
+    def parse_listing(cls, url: str, content: bytes) -> List[Dict]:
+        """
+        Parse one listing page into discount dictionaries.
+        
+        Runs in a worker process, so it must not touch instance state such
+        as the session; the collector fills in 'supermarket' when missing.
+        """
+        raise NotImplementedError(f"{cls.__name__} does not implement parse_listing()")
+    
+    def checkpoint(self, state: Any):
+        """
+        Record a JSON-serializable resume position.
+        
+        Call it whenever every record before that position has been
+        yielded (e.g. {'page': n} before starting page n). The collector
+        persists it with each committed batch; records yielded after it
+        may be scraped again on resume, which the upsert makes harmless.
+        """
+        self.checkpoint_state = state
+    
+    @staticmethod
+    def parse_price(price_str: str) -> float:
         """Parse price string to float."""
         try:
             # Remove currency symbols and convert comma to dot
@@ -39,22 +112,125 @@ class BaseScraper(ABC):
         except (ValueError, AttributeError):
             return 0.0
     
-    def calculate_discount_percentage(self, original_price: float, discount_price: float) -> float:
+    @staticmethod
+    def calculate_discount_percentage(original_price: float, discount_price: float) -> float:
         """Calculate discount percentage."""
         if original_price > 0:
             return round(((original_price - discount_price) / original_price) * 100, 2)
         return 0.0
     
-    def get_page(self, url: str) -> BeautifulSoup:
-        """Fetch and parse a webpage."""
+    def parse_page(self, content: bytes) -> BeautifulSoup:
+        """Parse raw page content into a full BeautifulSoup tree."""
+        return BeautifulSoup(content, 'lxml')
+    
+    def parse_cards(self, content: bytes) -> Iterator[Dict[str, Optional[str]]]:
+        """
+        Yield the declared card_fields of every product card on a page.
+        
+        Only the card elements are materialized, so this is several times
+        faster than parse_page() on large listing pages.
+        """
+        if not self.card_tag:
+            raise NotImplementedError(f"{type(self).__name__} does not declare card_tag")
+        return iter_cards(content, self.card_tag, self.card_class, self._compiled_card_fields)
+    
+    def parse_next_data(self, content: bytes) -> Optional[Dict]:
+        """Decode the page's __NEXT_DATA__ JSON without parsing the HTML."""
+        return extract_next_data(content)
+    
+    def parse_ld_json(self, content: bytes) -> List:
+        """Decode the page's ld+json blocks without parsing the HTML."""
+        return extract_ld_json(content)
+    
+    def _request_headers(self, url: str) -> Optional[Dict]:
+        """Conditional-request validators from the page cache, if enabled."""
+        return self.page_cache.conditional_headers(url) if self.page_cache else None
+    
+    def _resolve(self, url: str, response) -> Tuple[Optional[bytes], bool]:
+        """
+        Turn a fetched response into (content, changed).
+        
+        Failed requests give (None, False). With the page cache enabled, a
+        304 is served from disk and changed reports whether the body differs
+        from the copy cached on the previous run.
+        """
+        if response is None:
+            return None, False
         try:
-            response = self.session.get(url, timeout=10)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'lxml')
         except requests.RequestException as e:
             logger.error(f"Error fetching {url}: {e}")
+            return None, False
+        if self.page_cache:
+            return self.page_cache.resolve(url, response)
+        return response.content, True
+    
+    def _keep(self, url: str, content: Optional[bytes], changed: bool, skip_unchanged: bool) -> Optional[bytes]:
+        """
+        Drop an unchanged page when asked to, counting it in the page cache stats.
+        
+        Without skip_unchanged nothing depends on the page being ingested,
+        so a changed page is committed to the cache right away.
+        """
+        if content is None:
             return None
+        if not skip_unchanged:
+            if changed:
+                self.commit_page(url)
+            return content
+        if not changed:
+            self.page_cache.record_skipped()
+            return None
+        return content
+    
+    def commit_page(self, url: str):
+        """
+        Mark a page fetched with skip_unchanged as processed.
+        
+        Call it once the page's records are committed; until then the next
+        run still sees the page as changed and processes it again.
+        """
+        if self.page_cache:
+            self.page_cache.commit(url)
+    
+    def get_content(self, url: str, skip_unchanged: bool = False) -> Optional[bytes]:
+        """
+        Fetch a webpage and return its raw body, for the selective parsers.
+        
+        With skip_unchanged, a page identical to the one cached on the
+        previous run gives None, so its discounts are not ingested again;
+        a page that is returned must be passed to commit_page() once its
+        discounts are stored.
+        """
+        content, changed = self._resolve(url, self.fetcher.fetch(url, self._request_headers(url)))
+        return self._keep(url, content, changed, skip_unchanged)
+    
+    def get_page(self, url: str, skip_unchanged: bool = False) -> BeautifulSoup:
+        """Fetch and fully parse a webpage (None as for get_content)."""
+        content = self.get_content(url, skip_unchanged)
+        return None if content is None else self.parse_page(content)
+    
+    def fetch_many_content(self, urls: List[str], skip_unchanged: bool = False) -> List[Optional[bytes]]:
+        """
+        Fetch many pages concurrently through the shared fetcher.
+        
+        Returns raw bodies in the order of urls, with None for pages that
+        could not be fetched (or, with skip_unchanged, did not change).
+        """
+        headers = [self._request_headers(url) for url in urls]
+        responses = self.fetcher.fetch_many(urls, headers)
+        pages = []
+        for url, response in zip(urls, responses):
+            content, changed = self._resolve(url, response)
+            pages.append(self._keep(url, content, changed, skip_unchanged))
+        return pages
+    
+    def fetch_many(self, urls: List[str], skip_unchanged: bool = False) -> List[Optional[BeautifulSoup]]:
+        """Fetch and fully parse many pages concurrently (None as for fetch_many_content)."""
+        return [
+            None if content is None else self.parse_page(content)
+            for content in self.fetch_many_content(urls, skip_unchanged)
+        ]
     
     def close(self):
-        """Close the session."""
-        self.session.close()
+        """Release the scraper's resources; the shared fetcher stays open for the other scrapers."""
@@ -0,0 +1,151 @@
+"""
+Shared HTTP fetcher for all scrapers.
+
+Every scraper fetches through one process-wide Fetcher, so keep-alive
+connections are pooled across scrapers. Pages are fetched concurrently on a
+shared worker pool with a per-host concurrency limit, transient failures
+(connection errors, timeouts, 429 and 5xx responses) are retried with
+exponential backoff plus jitter, and responses are requested compressed.
+
+Scrapers already run on the collector's worker threads, so concurrency is
+thread based: urllib3's connection pools are thread-safe, whereas an async
+client session would be bound to a single event loop.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+import logging
+import os
+import random
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '16'))
+FETCH_PER_HOST = int(os.getenv('FETCH_PER_HOST', '4'))
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', '3'))
+FETCH_BACKOFF = float(os.getenv('FETCH_BACKOFF', '0.5'))
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '10'))
+# Longest wait between retries, whatever the backoff or a Retry-After header asks for
+FETCH_MAX_BACKOFF = float(os.getenv('FETCH_MAX_BACKOFF', '30'))
+
+# Responses worth retrying; everything else is returned as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class Fetcher:
+    """Thread-safe, pooled HTTP client with per-host limits and retries."""
+    
+    def __init__(self, workers=FETCH_WORKERS, per_host=FETCH_PER_HOST, retries=FETCH_RETRIES,
+                 backoff=FETCH_BACKOFF, timeout=FETCH_TIMEOUT, max_backoff=FETCH_MAX_BACKOFF):
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=max(per_host, 1), max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch')
+        self._host_limits = {}
+        self._lock = threading.Lock()
+    
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+    
+    def _retry_delay(self, attempt, response=None):
+        """Exponential backoff with full jitter, honouring Retry-After; at most max_backoff."""
+        if response is not None and 'Retry-After' in response.headers:
+            retry_after = response.headers['Retry-After']
+            try:
+                return min(max(float(retry_after), 0.0), self.max_backoff)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    return min(max(delay, 0.0), self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        base = self.backoff * (2 ** attempt)
+        return min(base + random.uniform(0, base), self.max_backoff)
+    
+    def fetch(self, url, headers=None):
+        """
+        Fetch a URL, retrying transient failures.
+        
+        Returns the final requests.Response (whatever its status), or None
+        if the request never got a response.
+        """
+        limit = self._host_limit(url)
+        
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                with limit:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                error = f'HTTP {response.status_code}'
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            except requests.RequestException as e:
+                logger.error(f"Error fetching {url}: {e}")
+                return None
+            
+            if attempt == self.retries:
+                logger.error(f"Giving up on {url} after {attempt + 1} attempts: {error}")
+                return response
+            
+            delay = self._retry_delay(attempt, response)
+            logger.warning(f"Retrying {url} in {delay:.2f}s ({error})")
+            time.sleep(delay)
+    
+    def fetch_many(self, urls, headers=None):
+        """
+        Fetch URLs concurrently; returns responses (or None) in input order.
+        
+        headers is either one dict for every request or a list with one
+        dict (or None) per URL.
+        """
+        if not isinstance(headers, list):
+            headers = [headers] * len(urls)
+        futures = [
+            self.executor.submit(self.fetch, url, url_headers)
+            for url, url_headers in zip(urls, headers)
+        ]
+        return [future.result() for future in futures]
+    
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+_shared_fetcher = None
+_shared_lock = threading.Lock()
+
+
+def get_fetcher():
+    """Return the process-wide Fetcher, creating it on first use."""
+    global _shared_fetcher
+    with _shared_lock:
+        if _shared_fetcher is None:
+            _shared_fetcher = Fetcher()
+        return _shared_fetcher
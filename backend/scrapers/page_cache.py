@@ -0,0 +1,154 @@
+"""
+On-disk HTTP cache for scraped pages.
+
+Bonus pages change roughly weekly, so every fetched page is stored under
+data/raw/http_cache as a gzip-compressed body plus a small JSON metadata
+file holding its ETag, Last-Modified and content hash. The next fetch sends
+If-None-Match / If-Modified-Since; a 304 is served from disk, and a 200
+whose body hashes the same as the cached copy is reported as unchanged so
+scrapers can skip parsing it.
+
+A changed page is only staged (as .pending files) when it is fetched, and
+becomes the cached copy once commit() is called for it, after its records
+have been stored. A page whose parse or ingest failed is thus still
+compared against the old copy on the next run, and processed again.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'data', 'raw', 'http_cache'
+))
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', '1') not in ('0', 'false', 'no')
+
+
+class PageCache:
+    """Conditional-request cache of page bodies keyed by URL."""
+    
+    def __init__(self, directory=PAGE_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.reset_stats()
+    
+    def reset_stats(self):
+        """Zero the counters, e.g. at the start of a collection run."""
+        with self._lock:
+            self.stats = {'hits': 0, 'unchanged': 0, 'misses': 0, 'skipped': 0, 'bytes_saved': 0}
+    
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+    
+    def record_skipped(self):
+        """Count a page a scraper dropped without parsing because it did not change."""
+        self._count('skipped')
+    
+    def _paths(self, url, pending=False):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        suffix = '.pending' if pending else ''
+        return base + '.json' + suffix, base + '.html.gz' + suffix
+    
+    def _read_meta(self, url):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def conditional_headers(self, url):
+        """Validators to send with the next request for url."""
+        meta = self._read_meta(url)
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+    
+    def load(self, url):
+        """Return the cached body for url, or None."""
+        _, body_path = self._paths(url)
+        try:
+            with gzip.open(body_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def resolve(self, url, response):
+        """
+        Combine a response with the cache.
+        
+        Returns (content, changed): the page body (from disk on a 304) and
+        whether it differs from the previously cached copy. Returns
+        (None, False) if a 304 arrives but nothing is cached. A changed
+        page is staged until commit(url).
+        """
+        if response.status_code == 304:
+            content = self.load(url)
+            if content is not None:
+                self._count('hits')
+                self._count('bytes_saved', len(content))
+            return content, False
+        
+        content = response.content
+        digest = hashlib.sha1(content).hexdigest()
+        meta = self._read_meta(url)
+        changed = not meta or meta.get('sha1') != digest
+        self._count('misses' if changed else 'unchanged')
+        # An unchanged body only refreshes the validators of the cached copy
+        self._store(url, response, content, digest, pending=changed)
+        return content, changed
+    
+    def commit(self, url):
+        """Make the page staged for url the cached copy, once its records are stored."""
+        meta_path, body_path = self._paths(url)
+        pending_meta, pending_body = self._paths(url, pending=True)
+        try:
+            os.replace(pending_body, body_path)
+            os.replace(pending_meta, meta_path)
+        except FileNotFoundError:
+            pass
+    
+    def _store(self, url, response, content, digest, pending=False):
+        meta_path, body_path = self._paths(url, pending)
+        if pending:
+            self._atomic_write(body_path, gzip.compress(content))
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha1': digest,
+            'size': len(content),
+            'fetched_at': time.time()
+        }
+        self._atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+    
+    def _atomic_write(self, path, data):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_page_cache():
+    """Return the process-wide PageCache, or None when caching is disabled."""
+    global _shared_cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = PageCache()
+        return _shared_cache
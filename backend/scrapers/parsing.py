@@ -0,0 +1,105 @@
+"""
+Selective HTML parsing helpers for scrapers.
+
+Building a full BeautifulSoup tree for a large listing page costs far more
+than the product cards on it are worth. These helpers pull out only what a
+scraper needs:
+
+- iter_cards() streams the page through lxml's iterparse and materializes
+  just the elements matching a declared card tag/class, extracting fields
+  with precompiled XPath expressions and discarding everything else.
+- extract_next_data() and extract_ld_json() find embedded JSON payloads
+  (Next.js __NEXT_DATA__, schema.org ld+json) with a regex and decode them
+  without building any DOM at all.
+"""
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional
+from lxml import etree
+import json
+import re
+
+NEXT_DATA_RE = re.compile(
+    rb'<script[^>]*\bid=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE
+)
+LD_JSON_RE = re.compile(
+    rb'<script[^>]*\btype=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.DOTALL | re.IGNORECASE
+)
+
+
+def extract_next_data(content: bytes) -> Optional[Dict]:
+    """Return the decoded __NEXT_DATA__ payload of a page, or None."""
+    match = NEXT_DATA_RE.search(content)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def extract_ld_json(content: bytes) -> List:
+    """Return every decodable ld+json block on a page."""
+    blocks = []
+    for match in LD_JSON_RE.finditer(content):
+        try:
+            blocks.append(json.loads(match.group(1)))
+        except ValueError:
+            continue
+    return blocks
+
+
+def compile_fields(fields: Dict[str, str]) -> Dict[str, etree.XPath]:
+    """Precompile a mapping of field name to XPath relative to a card."""
+    return {name: etree.XPath(expr) for name, expr in fields.items()}
+
+
+def _value(result) -> Optional[str]:
+    if isinstance(result, list):
+        if not result:
+            return None
+        result = result[0]
+    if isinstance(result, etree._Element):
+        text = ''.join(result.itertext())
+    else:
+        text = str(result)
+    text = ' '.join(text.split())
+    return text or None
+
+
+def _discard(element) -> None:
+    """Free a finished element and the siblings parsed before it."""
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def iter_cards(content: bytes, tag: str, css_class: Optional[str] = None,
+               fields: Optional[Dict[str, etree.XPath]] = None) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    Yield one dict of extracted fields per card element on a page.
+    
+    A card is an element named tag (and carrying css_class, if given) that
+    is not inside another card. Elements with the card's tag nested inside
+    a card (e.g. the price <div> of a <div> card) are left alone until the
+    card itself ends. Each card is cleared after its fields are extracted,
+    along with the siblings before it, so memory stays bounded by a single
+    card.
+    """
+    fields = fields or {}
+    card = None
+    for event, element in etree.iterparse(
+        BytesIO(content), events=('start', 'end'), tag=tag, html=True, recover=True, no_network=True
+    ):
+        if card is None:
+            if event == 'start':
+                if css_class is None or css_class in (element.get('class') or '').split():
+                    card = element
+            else:
+                # A non-card element with the card's tag, outside any card
+                _discard(element)
+        elif event == 'end' and element is card:
+            yield {name: _value(xpath(card)) for name, xpath in fields.items()}
+            _discard(card)
+            card = None
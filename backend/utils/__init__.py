@@ -1,6 +1,7 @@
 """
 Utilities package initialization.
 """
-from .data_collector import collect_all_discounts, clear_old_discounts
+from .data_collector import collect_all_discounts, clear_old_discounts, run_scrapers
+from .scheduler import Scheduler, run_scheduler
 
-__all__ = ['collect_all_discounts', 'clear_old_discounts']
+__all__ = ['collect_all_discounts', 'clear_old_discounts', 'run_scrapers', 'Scheduler', 'run_scheduler']
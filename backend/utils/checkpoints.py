@@ -0,0 +1,47 @@
+"""
+Checkpoints for resumable streaming scrapes.
+
+While a scraper streams records, the collector stores its latest resume
+state in scrape_checkpoints inside each batch transaction, so the saved
+position never runs ahead of the committed data. A finished run deletes
+its checkpoint; after a crash the next run hands the state back to the
+scraper as resume_state.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models import ScrapeCheckpoint, SessionLocal
+import json
+
+
+def load_checkpoint(scraper_name):
+    """Return the saved resume state for a scraper, or None."""
+    session = SessionLocal()
+    try:
+        checkpoint = session.get(ScrapeCheckpoint, scraper_name)
+        if checkpoint is None or checkpoint.state is None:
+            return None
+        return json.loads(checkpoint.state)
+    finally:
+        session.close()
+
+
+def save_checkpoint(session, scraper_name, state, records):
+    """Stage a checkpoint in the caller's transaction (not committed here)."""
+    checkpoint = session.get(ScrapeCheckpoint, scraper_name)
+    if checkpoint is None:
+        checkpoint = ScrapeCheckpoint(scraper=scraper_name)
+        session.add(checkpoint)
+    checkpoint.state = json.dumps(state) if state is not None else None
+    checkpoint.records = records
+
+
+def clear_checkpoint(scraper_name):
+    """Delete a scraper's checkpoint after a completed run."""
+    session = SessionLocal()
+    try:
+        session.query(ScrapeCheckpoint).filter(ScrapeCheckpoint.scraper == scraper_name).delete()
+        session.commit()
+    finally:
+        session.close()
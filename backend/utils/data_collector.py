@@ -6,8 +6,21 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from scrapers import SCRAPERS
-from models import Discount, init_db, SessionLocal
+from scrapers.page_cache import get_page_cache
+from models import Discount, init_db, SessionLocal, refresh_summary
+from utils.ingestion import bulk_ingest
+from utils.normalization import normalize_batch, RejectsReport
+from sqlalchemy import func
+from utils.checkpoints import load_checkpoint, save_checkpoint, clear_checkpoint
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from datetime import datetime
+from functools import partial
 import logging
+import multiprocessing
+import queue
+import threading
+import time
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,72 +28,477 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Concurrency settings for the scraper runner
+SCRAPER_MAX_WORKERS = int(os.getenv('SCRAPER_MAX_WORKERS', '4'))
+SCRAPER_TIMEOUT = float(os.getenv('SCRAPER_TIMEOUT', '120'))
 
-def collect_all_discounts():
-    """Run all scrapers and store discount data in the database."""
+# Fetch/parse pipeline settings for scrapers implementing page_urls()
+PIPELINE_FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', '8'))
+PIPELINE_PARSE_WORKERS = int(os.getenv('PIPELINE_PARSE_WORKERS', str(os.cpu_count() or 1)))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '32'))
+
+# End-of-stream marker passed between pipeline stages
+_DONE = object()
+
+
+class ScrapeCancelled(Exception):
+    """Raised inside a streaming scrape once its timeout has passed."""
+
+
+class _StageFailure:
+    """Carries an exception from a pipeline stage to the writer."""
+    
+    def __init__(self, error):
+        self.error = error
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """
+    Return the process pool shared by all pipelined scrapers.
+    
+    Workers are spawned rather than forked: the collector is multi-threaded
+    and forking it could copy held locks into the children.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PIPELINE_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _parse_pool
+
+
+def _put(stage_queue, item, stop):
+    """Blocking put that gives up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_pipeline(scraper, urls, cancelled=None, session_factory=None, parse_pool=None,
+                 fetch_workers=None, queue_size=None, prepare=None):
+    """
+    Collect a scraper's listing pages through a three-stage pipeline.
+    
+    Fetch threads download pages into a bounded queue of raw bodies; a
+    dispatcher feeds them to a process pool running the scraper's
+    parse_listing(), keeping at most queue_size pages in flight, and puts
+    the parsed discounts on a second bounded queue; the calling thread is
+    the single writer, draining it into bulk_ingest. A full queue blocks
+    the stage before it, so a slow writer throttles parsing and fetching.
+    
+    Pages identical to the copy in the page cache are dropped before the
+    parse queue (counted as skipped in the cache stats), so an unchanged
+    listing costs one conditional request and no parsing or writes. A page
+    becomes the cached copy only once the batch holding its records has
+    committed, so a failed or cancelled run processes it again next time.
+    Pages that fail to fetch or parse are logged and skipped; prepare is
+    passed on to bulk_ingest. Returns (records scraped, ingest stats), like
+    a streaming scrape.
+    """
+    cancelled = cancelled or threading.Event()
+    parse_pool = parse_pool or get_parse_pool()
+    fetch_workers = fetch_workers or PIPELINE_FETCH_WORKERS
+    queue_size = queue_size or PIPELINE_QUEUE_SIZE
+    scraper_class = type(scraper)
+    
+    raw_pages = queue.Queue(maxsize=queue_size)
+    parsed_pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    url_iter = iter(urls)
+    url_lock = threading.Lock()
+    
+    def fetch_stage():
+        try:
+            while not stop.is_set():
+                with url_lock:
+                    url = next(url_iter, None)
+                if url is None:
+                    break
+                content = scraper.get_content(url, skip_unchanged=True)
+                if content is not None and not _put(raw_pages, (url, content), stop):
+                    return
+        except Exception as e:
+            _put(raw_pages, _StageFailure(e), stop)
+        finally:
+            _put(raw_pages, _DONE, stop)
+    
+    def forward(url, future):
+        try:
+            records = future.result()
+        except Exception as e:
+            logger.error(f"Error parsing {url}: {e}")
+            return True
+        return _put(parsed_pages, (url, records), stop)
+    
+    def parse_stage():
+        in_flight = deque()
+        finished = 0
+        try:
+            while finished < fetch_workers and not stop.is_set():
+                try:
+                    item = raw_pages.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    finished += 1
+                    continue
+                if isinstance(item, _StageFailure):
+                    _put(parsed_pages, item, stop)
+                    return
+                
+                url, content = item
+                in_flight.append((url, parse_pool.submit(scraper_class.parse_listing, url, content)))
+                # Bound the pages held by the pool; forward in fetch order
+                while len(in_flight) >= queue_size:
+                    if not forward(*in_flight.popleft()):
+                        return
+            
+            while in_flight and not stop.is_set():
+                forward(*in_flight.popleft())
+            _put(parsed_pages, _DONE, stop)
+        except Exception as e:
+            _put(parsed_pages, _StageFailure(e), stop)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+    
+    progress = {'count': 0}
+    # (url, records pulled once the page is consumed) of pages not yet committed
+    consumed = deque()
+    
+    def commit_pages(count):
+        while consumed and consumed[0][1] <= count:
+            scraper.commit_page(consumed.popleft()[0])
+    
+    def records():
+        while True:
+            if cancelled.is_set():
+                raise ScrapeCancelled(f"{scraper.supermarket_name} cancelled")
+            try:
+                item = parsed_pages.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _StageFailure):
+                raise item.error
+            url, page = item
+            consumed.append((url, progress['count'] + len(page)))
+            for discount_data in page:
+                discount_data.setdefault('supermarket', scraper.supermarket_name)
+                progress['count'] += 1
+                yield discount_data
+    
+    threads = [
+        threading.Thread(target=fetch_stage, name=f'pipeline-fetch-{n}', daemon=True)
+        for n in range(fetch_workers)
+    ]
+    threads.append(threading.Thread(target=parse_stage, name='pipeline-parse', daemon=True))
+    for thread in threads:
+        thread.start()
+    
+    try:
+        # bulk_ingest pulls exactly one batch before committing it, so every
+        # record pulled so far is committed when after_commit runs
+        ingest_stats = bulk_ingest(
+            records(), session_factory=session_factory, prepare=prepare,
+            after_commit=lambda: commit_pages(progress['count'])
+        )
+        commit_pages(progress['count'])
+        return progress['count'], ingest_stats
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def _stream_scraper(scraper_name, scraper_class, cancelled):
+    """
+    Stream one scraper's discounts into the database.
+    
+    Records are ingested in bounded batches, each committed together with
+    the scraper's checkpoint, so memory stays flat and a crashed run can
+    resume where it stopped. Scrapers that list their pages through
+    page_urls() go through run_pipeline() instead. Each batch is
+    normalized and validated first; invalid records are written to a
+    rejects report. Returns (records scraped, ingest stats).
+    """
+    scraper = scraper_class()
+    rejects = RejectsReport(scraper_name)
+    prepare = partial(normalize_batch, report=rejects)
+    
+    urls = scraper.page_urls()
+    if urls is not None:
+        try:
+            return run_pipeline(scraper, urls, cancelled, prepare=prepare)
+        finally:
+            scraper.close()
+            _report_rejects(rejects)
+    
+    scraper.resume_state = load_checkpoint(scraper_name)
+    if scraper.resume_state is not None:
+        logger.info(f"Resuming {scraper_name} from checkpoint {scraper.resume_state}")
+    
+    progress = {'count': 0}
+    # (url, records pulled once the page is consumed) of pages not yet committed
+    consumed = deque()
+    
+    def commit_pages(count):
+        while consumed and consumed[0][1] <= count:
+            scraper.commit_page(consumed.popleft()[0])
+    
+    def records():
+        for discount_data in scraper.iter_discounts():
+            if cancelled.is_set():
+                raise ScrapeCancelled(f"{scraper_name} cancelled")
+            progress['count'] += 1
+            yield discount_data
+    
+    def checkpoint(session):
+        save_checkpoint(session, scraper_name, scraper.checkpoint_state, progress['count'])
+    
+    try:
+        ingest_stats = bulk_ingest(records(), before_commit=checkpoint, prepare=prepare)
+        clear_checkpoint(scraper_name)
+        return progress['count'], ingest_stats
+    finally:
+        scraper.close()
+        _report_rejects(rejects)
+
+
+def _report_rejects(rejects):
+    """Log a scraper's rejected records and save them as CSV."""
+    if not rejects.total:
+        return
+    reasons = ', '.join(f"{count} {reason}" for reason, count in rejects.counts.items())
+    try:
+        path = rejects.write()
+    except OSError as e:
+        logger.error(f"Error writing rejects report for {rejects.name}: {e}")
+        path = None
+    logger.warning(f"Rejected {rejects.total} records from {rejects.name} ({reasons}); report: {path}")
+
+
+def run_scrapers(scrapers=None, max_workers=None, timeout=None):
+    """
+    Run scrapers concurrently on a bounded thread pool, streaming their
+    discounts into the database as they are produced.
+    
+    Each scraper gets its own timeout, measured from the moment it starts
+    running; a timed-out scraper stops at its next record and keeps what
+    it already committed. A scraper that raises or times out is reported
+    on its own and does not affect the others.
+    
+    Returns a dict mapping scraper name to a result dict with the keys
+    status ('ok', 'error' or 'timeout'), count, ingest, duration and error.
+    """
+    scrapers = SCRAPERS if scrapers is None else scrapers
+    max_workers = max_workers or SCRAPER_MAX_WORKERS
+    timeout = timeout or SCRAPER_TIMEOUT
+    
+    started = {}
+    cancelled = {name: threading.Event() for name in scrapers}
+    results = {}
+    
+    def task(scraper_name, scraper_class):
+        started[scraper_name] = time.monotonic()
+        logger.info(f"Running {scraper_name} scraper...")
+        return _stream_scraper(scraper_name, scraper_class, cancelled[scraper_name])
+    
+    def record(scraper_name, status, count=0, ingest=None, error=None):
+        start = started.get(scraper_name)
+        results[scraper_name] = {
+            'status': status,
+            'count': count,
+            'ingest': ingest,
+            'duration': round(time.monotonic() - start, 3) if start else 0.0,
+            'error': error
+        }
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraper')
+    futures = {
+        executor.submit(task, name, scraper_class): name
+        for name, scraper_class in scrapers.items()
+    }
+    pending = set(futures)
+    
+    try:
+        while pending:
+            # Wake up in time for the nearest deadline of a running scraper
+            now = time.monotonic()
+            deadlines = [
+                started[futures[f]] + timeout
+                for f in pending if futures[f] in started
+            ]
+            wait_for = max(min(deadlines) - now, 0) if deadlines else 0.1
+            
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                scraper_name = futures[future]
+                try:
+                    count, ingest_stats = future.result()
+                    record(scraper_name, 'ok', count=count, ingest=ingest_stats)
+                except Exception as e:
+                    logger.error(f"Error scraping {scraper_name}: {e}")
+                    record(scraper_name, 'error', error=str(e))
+            
+            now = time.monotonic()
+            for future in list(pending):
+                scraper_name = futures[future]
+                start = started.get(scraper_name)
+                if start is not None and now - start >= timeout:
+                    # Threads cannot be killed; ask the stream to stop instead
+                    cancelled[scraper_name].set()
+                    future.cancel()
+                    pending.discard(future)
+                    logger.error(f"Scraper {scraper_name} timed out after {timeout}s")
+                    record(scraper_name, 'timeout', error=f'Timed out after {timeout}s')
+    
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    # Report in registry order rather than completion order
+    return {name: results[name] for name in scrapers}
+
+
+def collect_all_discounts(max_workers=None, timeout=None):
+    """
+    Run all scrapers concurrently and stream their discounts into the database.
+    
+    Returns the per-scraper results from run_scrapers.
+    """
     logger.info("Starting discount data collection")
     
     # Initialize database
     init_db()
     
-    session = SessionLocal()
-    total_saved = 0
+    page_cache = get_page_cache()
+    if page_cache:
+        page_cache.reset_stats()
     
-    try:
-        for scraper_name, scraper_class in SCRAPERS.items():
-            logger.info(f"Running {scraper_name} scraper...")
-            scraper = scraper_class()
-            
-            try:
-                discounts = scraper.scrape()
-                
-                for discount_data in discounts:
-                    discount = Discount(**discount_data)
-                    session.add(discount)
-                    total_saved += 1
-                
-                logger.info(f"Added {len(discounts)} discounts from {scraper_name}")
-                
-            except Exception as e:
-                logger.error(f"Error scraping {scraper_name}: {e}")
-                
-            finally:
-                scraper.close()
+    start = time.monotonic()
+    results = run_scrapers(max_workers=max_workers, timeout=timeout)
+    logger.info(f"Scrapers finished in {time.monotonic() - start:.2f}s")
+    
+    if page_cache:
+        cache_stats = page_cache.stats
+        logger.info(
+            f"Page cache: {cache_stats['hits']} hits (304), {cache_stats['unchanged']} unchanged, "
+            f"{cache_stats['misses']} misses, {cache_stats['skipped']} pages skipped, "
+            f"{cache_stats['bytes_saved']} bytes saved"
+        )
+    
+    totals = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+    
+    for scraper_name, result in results.items():
+        if result['status'] != 'ok':
+            logger.warning(f"{scraper_name}: {result['status']} ({result['error']})")
+            continue
         
-        session.commit()
-        logger.info(f"Total discounts saved: {total_saved}")
+        ingest_stats = result['ingest']
+        for key in totals:
+            totals[key] += ingest_stats[key]
         
+        logger.info(
+            f"Scraped {result['count']} discounts from {scraper_name} "
+            f"in {result['duration']}s: {ingest_stats['inserted']} new, "
+            f"{ingest_stats['updated']} updated, {ingest_stats['unchanged']} unchanged, "
+            f"{ingest_stats['rejected']} rejected"
+        )
+    
+    logger.info(
+        f"Total discounts written: {totals['inserted'] + totals['updated']} "
+        f"({totals['unchanged']} unchanged, {totals['rejected']} rejected)"
+    )
+    
+    update_summary()
+    
+    return results
+
+
+def update_summary():
+    """Rebuild the precomputed summary served by the overview endpoints."""
+    session = SessionLocal()
+    try:
+        summary = refresh_summary(session)
+        logger.info(f"Refreshed discount summary (generation {summary['generation']})")
+    
     except Exception as e:
-        logger.error(f"Error during collection: {e}")
+        logger.error(f"Error refreshing discount summary: {e}")
         session.rollback()
-        
+    
     finally:
         session.close()
 
 
-def clear_old_discounts():
-    """Remove inactive or expired discounts from the database."""
-    from datetime import datetime
+def clear_old_discounts(now=None):
+    """
+    Mark discounts whose valid_until has passed as inactive.
     
+    The filter is served by the partial ix_discounts_active_expiry index as
+    a range scan over the active rows that have expired, so a run only
+    touches the rows that expired since the previous one. Returns the
+    number of rows marked inactive.
+    """
+    now = now or datetime.now()
     session = SessionLocal()
+    expired = 0
     try:
         # Mark discounts as inactive if their valid_until date has passed
         expired = session.query(Discount).filter(
-            Discount.valid_until < datetime.now(),
-            Discount.is_active == True
-        ).update({Discount.is_active: False})
+            Discount.is_active == True,
+            Discount.valid_until < now
+        ).update({Discount.is_active: False}, synchronize_session=False)
         
         session.commit()
         logger.info(f"Marked {expired} discounts as inactive")
-        
+    
     except Exception as e:
         logger.error(f"Error clearing old discounts: {e}")
         session.rollback()
-        
+    
+    finally:
+        session.close()
+    
+    if expired:
+        update_summary()
+    
+    return expired
+
+
+def next_expiry(now=None):
+    """
+    Return the earliest valid_until of an active discount after now, or None.
+    
+    A single probe into the partial ix_discounts_active_expiry index, used
+    by the scheduler to sleep until the next discount actually expires.
+    """
+    now = now or datetime.now()
+    session = SessionLocal()
+    try:
+        return session.query(func.min(Discount.valid_until)).filter(
+            Discount.is_active == True,
+            Discount.valid_until >= now
+        ).scalar()
     finally:
         session.close()
 
 
 if __name__ == '__main__':
-    collect_all_discounts()
-    clear_old_discounts()
+    if '--schedule' in sys.argv:
+        from utils.scheduler import run_scheduler
+        run_scheduler()
+    else:
+        collect_all_discounts()
+        clear_old_discounts()
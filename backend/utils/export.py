@@ -0,0 +1,370 @@
+"""
+Columnar snapshots of the discounts table for offline analysis.
+
+export_snapshot() streams the table in keyset-paginated chunks (by id, so
+memory stays bounded by the chunk size) into one file per supermarket and
+ISO week of valid_from:
+
+    data/processed/discounts/<supermarket>/<YYYY-Www>/discounts.parquet
+
+Each chunk is appended to its partition's open writer as a Parquet row
+group (or Arrow IPC record batch), so files are not rewritten as the table
+grows. A manifest.json lists the partitions with their row counts, and
+load_snapshot() reads them back memory-mapped. Parquet and Arrow need
+pyarrow; without it the snapshot falls back to CSV files.
+
+The chunk iterator and the stream encoders also back /api/export.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models.database import Discount, SessionLocal, DB_DIR
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+from collections import namedtuple
+from datetime import datetime
+import csv
+import io
+import json
+import logging
+import re
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+ARROW_AVAILABLE = pa is not None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(DB_DIR, 'processed'))
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '10000'))
+EXPORT_COMPRESSION = os.getenv('EXPORT_COMPRESSION', 'snappy')
+
+# Every column of the discounts table, in table order
+EXPORT_COLUMNS = [c.name for c in Discount.__table__.columns]
+
+# Snapshot formats and their file extensions
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow', 'csv': 'csv'}
+
+SNAPSHOT_NAME = 'discounts'
+MANIFEST_NAME = 'manifest.json'
+
+# How iter_chunks pages: the key columns, the ORDER BY clauses, and
+# after(*key) building the condition for the rows following a key
+Keyset = namedtuple('Keyset', ['columns', 'order_by', 'after'])
+
+ID_KEYSET = Keyset(
+    [Discount.__table__.c.id], [Discount.__table__.c.id], lambda discount_id: Discount.__table__.c.id > discount_id
+)
+
+
+def default_format():
+    """Parquet when pyarrow is installed, CSV otherwise."""
+    return 'parquet' if ARROW_AVAILABLE else 'csv'
+
+
+def arrow_schema(columns=EXPORT_COLUMNS):
+    """Arrow schema of the given discounts columns."""
+    fields = []
+    for name in columns:
+        column_type = Discount.__table__.c[name].type
+        if isinstance(column_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column_type, DateTime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def rows_to_arrow(rows, schema):
+    """Build an Arrow table from row tuples in schema column order."""
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+    )
+
+
+def _begin_snapshot(session):
+    """
+    Open one read transaction for all the chunks of an export.
+    
+    pysqlite runs SELECTs outside any transaction, so every chunk would
+    read the database as of its own query; an explicit BEGIN keeps a single
+    read snapshot (under WAL) until the session ends. PostgreSQL sessions
+    get REPEATABLE READ, whose snapshot is taken at the first query.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql' and not session.in_transaction():
+        session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    elif dialect == 'sqlite':
+        connection = session.connection()
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql('BEGIN')
+
+
+def iter_chunks(session, columns=EXPORT_COLUMNS, conditions=(), chunk_size=EXPORT_CHUNK_SIZE, keyset=ID_KEYSET):
+    """
+    Yield the discounts matching conditions as lists of row tuples.
+    
+    Pages with a keyset instead of OFFSET (by default by id, a primary key
+    range lookup), so each chunk starts where the previous one ended. Pick
+    a keyset whose order an index serves under the conditions. All chunks
+    are read in one transaction, so they form a consistent snapshot even
+    while the collector writes; it ends when the session is closed.
+    """
+    _begin_snapshot(session)
+    table = Discount.__table__
+    selected = [table.c[name] for name in columns]
+    width = len(keyset.columns)
+    query = select(*keyset.columns, *selected).where(*conditions).order_by(*keyset.order_by).limit(chunk_size)
+    
+    rows = session.execute(query).all()
+    while rows:
+        yield [row[width:] for row in rows]
+        if len(rows) < chunk_size:
+            return
+        rows = session.execute(query.where(keyset.after(*rows[-1][:width]))).all()
+
+
+def partition_of(supermarket, valid_from):
+    """(supermarket directory, ISO week) a row is written to."""
+    directory = re.sub(r'[^a-z0-9]+', '-', (supermarket or 'unknown').lower()).strip('-') or 'unknown'
+    if valid_from is None:
+        return directory, 'unknown'
+    year, week, _ = valid_from.isocalendar()
+    return directory, f'{year}-W{week:02d}'
+
+
+class _CsvWriter:
+    """CSV stand-in for the pyarrow writers, used without pyarrow."""
+    
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+    
+    def write(self, rows):
+        self.writer.writerows(rows)
+    
+    def close(self):
+        self.file.close()
+
+
+class _ArrowWriter:
+    """Appends chunks to a Parquet file as row groups, or to an Arrow IPC file as record batches."""
+    
+    def __init__(self, path, schema, fmt):
+        self.schema = schema
+        if fmt == 'parquet':
+            self.writer = pq.ParquetWriter(path, schema, compression=EXPORT_COMPRESSION)
+        else:
+            self.writer = pa.ipc.new_file(path, schema)
+    
+    def write(self, rows):
+        self.writer.write_table(rows_to_arrow(rows, self.schema))
+    
+    def close(self):
+        self.writer.close()
+
+
+def export_snapshot(output_dir=EXPORT_DIR, fmt=None, chunk_size=EXPORT_CHUNK_SIZE, session_factory=SessionLocal):
+    """
+    Write a partitioned snapshot of the whole discounts table.
+    
+    The snapshot is built next to the previous one and swapped in with a
+    rename, so readers never see a half-written snapshot. Returns the
+    manifest dict.
+    """
+    if fmt is None:
+        fmt = default_format()
+        if not ARROW_AVAILABLE:
+            logger.warning("pyarrow is not installed, exporting CSV instead of Parquet")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt != 'csv' and not ARROW_AVAILABLE:
+        raise RuntimeError(f"{fmt} export requires pyarrow")
+    
+    target = os.path.join(output_dir, SNAPSHOT_NAME)
+    building = f'{target}.tmp'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    
+    schema = arrow_schema() if fmt != 'csv' else None
+    supermarket_index = EXPORT_COLUMNS.index('supermarket')
+    valid_from_index = EXPORT_COLUMNS.index('valid_from')
+    
+    writers = {}
+    partitions = {}
+    total = 0
+    session = session_factory()
+    try:
+        for rows in iter_chunks(session, chunk_size=chunk_size):
+            groups = {}
+            for row in rows:
+                key = partition_of(row[supermarket_index], row[valid_from_index])
+                groups.setdefault(key, []).append(row)
+            
+            for key, group in groups.items():
+                if key not in writers:
+                    directory = os.path.join(building, *key)
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'{SNAPSHOT_NAME}.{FORMATS[fmt]}')
+                    writers[key] = (
+                        _CsvWriter(path, EXPORT_COLUMNS) if fmt == 'csv' else _ArrowWriter(path, schema, fmt)
+                    )
+                    partitions[key] = {
+                        'supermarket': group[0][supermarket_index], 'week': key[1],
+                        'path': os.path.relpath(path, building), 'rows': 0
+                    }
+                writers[key].write(group)
+                partitions[key]['rows'] += len(group)
+            total += len(rows)
+    
+    finally:
+        for writer in writers.values():
+            writer.close()
+        session.close()
+    
+    manifest = {
+        'format': fmt,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': total,
+        'columns': EXPORT_COLUMNS,
+        'partitions': [partitions[key] for key in sorted(partitions)]
+    }
+    with open(os.path.join(building, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    previous = f'{target}.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(target):
+        os.rename(target, previous)
+    os.rename(building, target)
+    shutil.rmtree(previous, ignore_errors=True)
+    
+    logger.info(f"Exported {total} discounts to {target} ({fmt}, {len(partitions)} partitions)")
+    return manifest
+
+
+def _read_partition(path, fmt, columns):
+    if fmt == 'parquet':
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if fmt == 'arrow':
+        # Arrow IPC files map straight into memory without decoding
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table.select(columns) if columns else table
+    return None
+
+
+def load_snapshot(output_dir=EXPORT_DIR, columns=None, supermarket=None, weeks=None):
+    """
+    Load the current snapshot as a pandas DataFrame.
+    
+    Partitions are pruned by supermarket name and ISO week ('2024-W07')
+    before any file is opened. Parquet and Arrow files are memory-mapped.
+    """
+    import pandas as pd
+    
+    target = os.path.join(output_dir, SNAPSHOT_NAME)
+    with open(os.path.join(target, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    fmt = manifest['format']
+    
+    selected = [
+        p for p in manifest['partitions']
+        if (supermarket is None or p['supermarket'] == supermarket) and (weeks is None or p['week'] in weeks)
+    ]
+    paths = [os.path.join(target, p['path']) for p in selected]
+    
+    if fmt == 'csv':
+        datetimes = [
+            name for name in manifest['columns']
+            if isinstance(Discount.__table__.c[name].type, DateTime) and (columns is None or name in columns)
+        ]
+        frames = [pd.read_csv(path, usecols=columns, parse_dates=datetimes) for path in paths]
+        if not frames:
+            return pd.DataFrame(columns=columns or manifest['columns'])
+        return pd.concat(frames, ignore_index=True)
+    
+    if not ARROW_AVAILABLE:
+        raise RuntimeError(f"Loading a {fmt} snapshot requires pyarrow")
+    tables = [_read_partition(path, fmt, columns) for path in paths]
+    if not tables:
+        return arrow_schema(columns or manifest['columns']).empty_table().to_pandas()
+    return pa.concat_tables(tables).to_pandas()
+
+
+def _drain(buffer):
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def stream_csv(chunks, columns):
+    """Encode row chunks as CSV, one piece per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield _drain(buffer)
+    for rows in chunks:
+        writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+        )
+        yield _drain(buffer)
+
+
+def stream_json(chunks, columns, dumps):
+    """Encode row chunks as one JSON array of objects, one piece per chunk."""
+    first = True
+    for rows in chunks:
+        if not rows:
+            continue
+        body = dumps([dict(zip(columns, row)) for row in rows])
+        # Splice the chunk's array into the running one
+        yield (b'[' if first else b',') + body[1:-1]
+        first = False
+    yield b'[]' if first else b']'
+
+
+def stream_arrow(chunks, columns):
+    """Encode row chunks as an Arrow IPC stream, one record batch per chunk."""
+    schema = arrow_schema(columns)
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, schema) as writer:
+        yield _drain(buffer)
+        for rows in chunks:
+            writer.write_table(rows_to_arrow(rows, schema))
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def main():
+    """Command line entry point."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Export a columnar snapshot of the discounts table')
+    parser.add_argument(
+        '--format', choices=sorted(FORMATS), default=None, help='default: parquet, or csv without pyarrow'
+    )
+    parser.add_argument('--output', default=EXPORT_DIR)
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    manifest = export_snapshot(args.output, args.format, args.chunk_size)
+    print(f"Exported {manifest['rows']} discounts in {len(manifest['partitions'])} partitions ({manifest['format']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Incremental ingestion of scraped discounts.
+
+Rows are identified by a natural key (supermarket + product_key + valid_from)
+and written with INSERT ... ON CONFLICT DO UPDATE. A record without a
+valid_from is keyed on the day it is ingested, because a NULL in a unique
+index never conflicts. A content hash is stored
+per row so that re-running a scraper only writes the rows that changed.
+The changed rows of every batch are also recorded in the price history
+(see models.history), which sets the product_id, canonical_id and
+is_all_time_low columns.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models import Discount, SessionLocal
+from models.history import extend_observations, record_observations
+from datetime import datetime
+from sqlalchemy import or_, select
+from itertools import islice
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of records written and committed per transaction by bulk_ingest
+BULK_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '5000'))
+
+# Fields that make up the scraped content of a discount
+HASHED_FIELDS = [
+    'product_name', 'category', 'original_price', 'discount_price',
+    'discount_percentage', 'valid_until', 'image_url', 'product_url', 'description'
+]
+
+# Columns that an upsert may overwrite on an existing row
+UPDATABLE_FIELDS = HASHED_FIELDS + [
+    'content_hash', 'is_active', 'updated_at', 'product_id', 'is_all_time_low', 'canonical_id'
+]
+
+# Every column written on insert (executemany needs uniform parameter sets)
+INSERT_COLUMNS = [c.name for c in Discount.__table__.columns if c.name != 'id']
+
+
+def normalize_record(discount_data, today=None):
+    """
+    Prepare a scraped record for ingestion.
+    
+    Validity dates are truncated to whole days so that repeated scrapes of
+    the same offer map onto the same natural key, and the product_key and
+    content_hash columns are filled in. A missing valid_from becomes today
+    (the start of the local day), as the scrapers do for offers without a
+    start date.
+    """
+    record = dict(discount_data)
+    
+    valid_from = record.get('valid_from')
+    if valid_from is None:
+        record['valid_from'] = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    elif isinstance(valid_from, datetime):
+        record['valid_from'] = valid_from.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    valid_until = record.get('valid_until')
+    if isinstance(valid_until, datetime):
+        record['valid_until'] = valid_until.replace(hour=23, minute=59, second=59, microsecond=0)
+    
+    record['product_key'] = record.get('product_url') or record.get('product_name')
+    record['content_hash'] = compute_content_hash(record)
+    record.setdefault('is_active', True)
+    record.setdefault('is_all_time_low', False)
+    return record
+
+
+def compute_content_hash(record):
+    """Return a stable SHA-1 hex digest over the scraped content of a record."""
+    parts = []
+    for field in HASHED_FIELDS:
+        value = record.get(field)
+        if value is None:
+            parts.append('')
+        elif isinstance(value, datetime):
+            parts.append(value.isoformat())
+        else:
+            parts.append(repr(value))
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def natural_key(record):
+    """Return the natural key tuple of a normalized record."""
+    return (record['supermarket'], record['product_key'], record.get('valid_from'))
+
+
+def _insert_for(bind):
+    """Return the dialect-specific insert construct supporting ON CONFLICT."""
+    if bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def build_upsert(bind):
+    """
+    Build an INSERT ... ON CONFLICT DO UPDATE statement for discounts.
+    
+    The update only fires when the content hash or the all-time-low flag
+    differs, so an unchanged row that slips through is still not rewritten.
+    """
+    insert = _insert_for(bind)
+    stmt = insert(Discount.__table__)
+    excluded = stmt.excluded
+    table = Discount.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=['supermarket', 'product_key', 'valid_from'],
+        set_={field: excluded[field] for field in UPDATABLE_FIELDS},
+        where=or_(
+            table.c.content_hash != excluded.content_hash,
+            table.c.is_all_time_low.is_distinct_from(excluded.is_all_time_low)
+        )
+    )
+
+
+def _existing_hashes(session, records):
+    """Load the stored (content hash, id) for every natural key in the batch."""
+    supermarkets = {r['supermarket'] for r in records}
+    product_keys = {r['product_key'] for r in records}
+    rows = session.execute(
+        select(
+            Discount.supermarket, Discount.product_key, Discount.valid_from, Discount.content_hash, Discount.id
+        ).where(
+            Discount.supermarket.in_(supermarkets),
+            Discount.product_key.in_(product_keys)
+        )
+    )
+    return {(r[0], r[1], r[2]): (r[3], r[4]) for r in rows}
+
+
+def upsert_discounts(session, discounts):
+    """
+    Upsert scraped discounts, skipping rows whose content is unchanged.
+    
+    Unchanged rows are not rewritten; they only extend the price history
+    of their products, so a re-scrape that changes nothing costs two
+    UPDATEs per batch. Does not commit; the caller owns the transaction.
+    Returns a dict with inserted, updated and unchanged counts.
+    """
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    
+    # Deduplicate within the batch (last occurrence wins)
+    records = {}
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for discount_data in discounts:
+        record = normalize_record(discount_data, today)
+        records[natural_key(record)] = record
+    
+    if not records:
+        return stats
+    
+    existing = _existing_hashes(session, records.values())
+    changed, unchanged_ids = {}, []
+    for key, record in records.items():
+        stored_hash, stored_id = existing.get(key, (None, None))
+        if stored_hash is None:
+            stats['inserted'] += 1
+        elif stored_hash == record['content_hash']:
+            stats['unchanged'] += 1
+            unchanged_ids.append(stored_id)
+            continue
+        else:
+            stats['updated'] += 1
+        changed[key] = record
+    
+    now = datetime.utcnow()
+    if changed:
+        record_observations(session, changed.values(), now)
+        rows = []
+        for record in changed.values():
+            record.setdefault('created_at', now)
+            record['updated_at'] = now
+            rows.append({column: record.get(column) for column in INSERT_COLUMNS})
+        session.execute(build_upsert(session.get_bind()), rows)
+    
+    # Last, so products that record_observations just observed are skipped
+    extend_observations(session, unchanged_ids, now)
+    
+    return stats
+
+
+def _batches(records, batch_size):
+    """Yield lists of at most batch_size records from any iterable."""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_ingest(records, batch_size=None, session_factory=None, before_commit=None, prepare=None,
+                after_commit=None):
+    """
+    Ingest records in batches using Core executemany upserts.
+    
+    Bypasses ORM object construction entirely: each batch is a single
+    INSERT ... ON CONFLICT statement executed with a list of parameter
+    dicts, followed by a commit. Accepts any iterable, so records can be
+    streamed from a generator in constant memory.
+    
+    before_commit(session), if given, runs inside every batch transaction,
+    e.g. to save a checkpoint atomically with the batch; after_commit(), if
+    given, runs once it is committed. prepare(batch), if
+    given, returns the records of a batch to write, e.g. normalize_batch
+    dropping invalid ones; dropped records are counted as rejected.
+    
+    Returns the accumulated upsert counts plus the number of batches.
+    """
+    batch_size = batch_size or BULK_BATCH_SIZE
+    session_factory = session_factory or SessionLocal
+    stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0, 'batches': 0}
+    
+    session = session_factory()
+    try:
+        for batch in _batches(records, batch_size):
+            if prepare:
+                scraped = len(batch)
+                batch = prepare(batch)
+                stats['rejected'] += scraped - len(batch)
+            
+            batch_stats = upsert_discounts(session, batch)
+            if before_commit:
+                before_commit(session)
+            session.commit()
+            if after_commit:
+                after_commit()
+            
+            for key, value in batch_stats.items():
+                stats[key] += value
+            stats['batches'] += 1
+        
+        return stats
+    
+    except Exception:
+        session.rollback()
+        raise
+    
+    finally:
+        session.close()
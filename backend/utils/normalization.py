@@ -0,0 +1,289 @@
+"""
+Vectorized normalization and validation of scraped discounts.
+
+Scrapers hand over prices however the site prints them: floats, Dutch
+strings such as "1,29", "€ 1.299,00" or "2,-", multi-buy offers such as
+"2 voor €3", or no discount price at all next to a promotion label such as
+"1+1 gratis". normalize_batch() turns a whole batch into a DataFrame,
+parses every price and computes every discount percentage with vectorized
+pandas operations, and drops invalid rows into a RejectsReport instead of
+silently storing 0.0 prices.
+
+Vectorizing pays for the validation, not for raw speed: building the
+DataFrame and the output dicts costs about as much as the old per-row
+parse_price() calls, which validate nothing (see
+benchmarks/bench_normalization.py), while the same rules applied record
+by record take about twice as long.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from models.database import DB_DIR
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+REJECTS_DIR = os.path.join(DB_DIR, 'raw', 'rejects')
+
+# Rejected rows kept per report for the CSV; all rejects are counted
+REJECTS_SAMPLE_SIZE = int(os.getenv('REJECTS_SAMPLE_SIZE', '1000'))
+
+# "1,29", "€ 1.299,00", "2,-", "0.99 EUR"; '.' followed by three digits is a thousands separator
+PRICE_PATTERN = (
+    r'^(?:€|eur)?\s*(?P<units>\d{1,3}(?:\.\d{3})+|\d+)(?:[,.](?P<cents>\d{1,2}|-))?\s*(?:€|eur)?$'
+)
+# "2 voor €3", "3 voor 5,00"
+MULTIBUY_PATTERN = r'(?P<qty>\d+)\s*voor\s*(?:€|eur)?\s*(?P<units>\d+)(?:[,.](?P<cents>\d{1,2}|-))?'
+# "1+1 gratis", "2 + 1 gratis"
+FREE_PATTERN = r'(?P<paid>\d+)\s*\+\s*(?P<free>\d+)\s*gratis'
+# "2e halve prijs", "tweede halve prijs"
+HALF_PRICE_PATTERN = r'(?:2e|tweede)\s+halve\s+prijs'
+# "25% korting"
+PERCENT_PATTERN = r'(?P<pct>\d+(?:[,.]\d+)?)\s*%\s*korting'
+
+# Rejection reasons, checked in this order
+REJECT_REASONS = [
+    'missing product_name',
+    'invalid original_price',
+    'invalid discount_price',
+    'discount_price above original_price',
+    'valid_until before valid_from',
+]
+
+# Columns normalize_batch loads into the DataFrame
+FRAME_COLUMNS = ['product_name', 'original_price', 'discount_price', 'description']
+DATE_COLUMNS = ['valid_from', 'valid_until']
+
+
+def _per_unique(func):
+    """
+    Apply a Series -> float Series function to each distinct value only.
+    
+    Scraped price and promotion strings repeat heavily, so the regex work
+    runs over the factorized uniques and is broadcast back by code.
+    """
+    def wrapper(values):
+        codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        if len(uniques) == len(values):
+            return func(values)
+        results = np.append(func(pd.Series(uniques)).to_numpy(dtype=float), np.nan)
+        # Missing values have code -1, which picks the trailing NaN
+        return pd.Series(results[codes], index=values.index)
+    
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _round_cents(prices):
+    """Round to whole cents, halves up (numpy's round() goes to even)."""
+    return np.floor(prices * 100 + 0.5 + 1e-9) / 100
+
+
+def _amounts(units, cents):
+    """Combine extracted units/cents string columns into floats."""
+    cents = cents.fillna('00').replace('-', '00').str.ljust(2, '0')
+    return units.str.replace('.', '', regex=False).astype(float) + cents.astype(float) / 100
+
+
+@_per_unique
+def parse_prices(values):
+    """
+    Parse a Series of scraped prices into floats, NaN where unparseable.
+    
+    Numbers pass through unchanged; strings are read in Dutch notation.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    
+    # .str.len() is NaN for anything that is not a string
+    is_text = values.str.len().notna()
+    prices = pd.to_numeric(values.mask(is_text), errors='coerce').astype(float)
+    
+    if is_text.any():
+        text = values[is_text].str.strip().str.lower()
+        parts = text.str.extract(PRICE_PATTERN)
+        parsed = _amounts(parts['units'].fillna('nan'), parts['cents'])
+        prices[is_text] = parsed.where(parts['units'].notna())
+    return prices
+
+
+@_per_unique
+def multibuy_unit_prices(values):
+    """Per-item price of "N voor €X" offers, NaN for anything else."""
+    unit_prices = pd.Series(np.nan, index=values.index)
+    if pd.api.types.is_numeric_dtype(values):
+        return unit_prices
+    
+    text = values.where(values.str.len().notna()).astype('string')
+    parts = text.str.lower().str.extract(MULTIBUY_PATTERN)
+    found = parts['units'].notna()
+    if found.any():
+        totals = _amounts(parts.loc[found, 'units'], parts.loc[found, 'cents'])
+        unit_prices[found] = totals / parts.loc[found, 'qty'].astype(float)
+    return unit_prices
+
+
+@_per_unique
+def promotion_factors(texts):
+    """
+    Fraction of the original price paid under a promotion label.
+    
+    "1+1 gratis" pays 1 of 2 items (0.5), "2e halve prijs" 0.75 and
+    "25% korting" 0.75; NaN where no known promotion is found.
+    """
+    text = texts.astype('string').str.lower()
+    factors = pd.Series(np.nan, index=texts.index)
+    
+    free = text.str.extract(FREE_PATTERN)
+    found = free['paid'].notna()
+    paid = free.loc[found, 'paid'].astype(float)
+    factors[found] = paid / (paid + free.loc[found, 'free'].astype(float))
+    
+    factors = factors.mask(factors.isna() & text.str.contains(HALF_PRICE_PATTERN, na=False), 0.75)
+    
+    percent = text.str.extract(PERCENT_PATTERN)['pct'].str.replace(',', '.', regex=False).astype(float)
+    factors = factors.fillna(1 - percent / 100)
+    return factors
+
+
+def normalize_frame(frame, dates_inverted=None):
+    """
+    Normalize the price columns of a DataFrame of scraped discounts.
+    
+    dates_inverted flags rows whose valid_until precedes valid_from; when
+    omitted it is computed from the frame's valid_from/valid_until columns.
+    Returns (clean, rejects): clean has float original_price,
+    discount_price and discount_percentage columns; rejects holds the
+    invalid rows with a 'reason' column. A missing original_price is
+    accepted next to a valid discount price and leaves original_price and
+    discount_percentage NaN; a promotion label alone needs one.
+    """
+    original = parse_prices(frame['original_price'])
+    discount = parse_prices(frame['discount_price'])
+    # Sites without a "was" price leave it out; only a given one must parse
+    no_original = frame['original_price'].isna()
+    if not pd.api.types.is_numeric_dtype(frame['original_price']):
+        no_original |= frame['original_price'].astype('string').str.strip().eq('').fillna(False)
+    
+    # "2 voor €3" as the discount price
+    missing = discount.isna()
+    if missing.any():
+        discount[missing] = multibuy_unit_prices(frame.loc[missing, 'discount_price'])
+    
+    # No usable price: derive it from a promotion label on the price or description
+    missing = discount.isna()
+    if missing.any():
+        factors = promotion_factors(frame.loc[missing, 'discount_price']).fillna(
+            promotion_factors(frame.loc[missing, 'description'])
+        )
+        discount[missing] = _round_cents(original[missing] * factors)
+    
+    names = frame['product_name']
+    # Anything but a string (None, NaN, a number) counts as a missing name
+    name = names.where(names.map(type) == str).astype('string')
+    if dates_inverted is None:
+        dates_inverted = (
+            pd.to_datetime(frame['valid_until'], errors='coerce')
+            < pd.to_datetime(frame['valid_from'], errors='coerce')
+        )
+    
+    failures = [
+        name.isna() | (name.str.strip() == ''),
+        ~no_original & (original.isna() | (original <= 0)),
+        discount.isna() | (discount < 0),
+        discount > original,
+        pd.Series(dates_inverted, index=frame.index),
+    ]
+    reasons = pd.Series(
+        np.select([f.fillna(False).to_numpy(dtype=bool) for f in failures], REJECT_REASONS, default=''),
+        index=frame.index
+    )
+    rejected = reasons != ''
+    
+    clean = frame.loc[~rejected].copy()
+    clean['original_price'] = original[~rejected]
+    clean['discount_price'] = _round_cents(discount[~rejected])
+    clean['discount_percentage'] = (
+        (clean['original_price'] - clean['discount_price']) / clean['original_price'] * 100
+    ).round(2)
+    
+    rejects = frame.loc[rejected].copy()
+    rejects['reason'] = reasons[rejected]
+    return clean, rejects
+
+
+def normalize_batch(records, report=None):
+    """
+    Normalize a list of scraped discount dicts.
+    
+    Returns the valid records with parsed prices and computed percentages,
+    leaving every other field untouched; invalid records are added to
+    report when one is given. Without an original_price, original_price
+    and discount_percentage are None.
+    """
+    if not records:
+        return []
+    
+    frame = pd.DataFrame(records, columns=FRAME_COLUMNS)
+    # Comparing the datetimes directly is far cheaper than building
+    # datetime64 columns from datetime objects
+    dates_inverted = np.fromiter((
+        isinstance(valid_from := r.get('valid_from'), datetime)
+        and isinstance(valid_until := r.get('valid_until'), datetime)
+        and valid_until < valid_from
+        for r in records
+    ), bool, len(records))
+    clean, rejects = normalize_frame(frame, dates_inverted)
+    
+    if report is not None and len(rejects):
+        for column in DATE_COLUMNS:
+            rejects[column] = [records[i].get(column) for i in rejects.index]
+        report.add(rejects)
+    
+    # NaN becomes None (NULL) for the offers without an original price
+    nullable = clean[['original_price', 'discount_percentage']].astype(object)
+    nullable = nullable.where(nullable.notna(), None)
+    return [
+        dict(records[i], original_price=original, discount_price=discount, discount_percentage=percentage)
+        for i, original, discount, percentage in zip(
+            clean.index.tolist(),
+            nullable['original_price'].tolist(),
+            clean['discount_price'].tolist(),
+            nullable['discount_percentage'].tolist()
+        )
+    ]
+
+
+class RejectsReport:
+    """Rejected records of one scraper run, counted by reason."""
+    
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self.counts = {}
+        self.samples = []
+        self._sampled = 0
+    
+    def add(self, rejects):
+        """Record a DataFrame of rejected rows carrying a 'reason' column."""
+        self.total += len(rejects)
+        for reason, count in rejects['reason'].value_counts().items():
+            self.counts[reason] = self.counts.get(reason, 0) + int(count)
+        
+        room = REJECTS_SAMPLE_SIZE - self._sampled
+        if room > 0:
+            self.samples.append(rejects.head(room))
+            self._sampled += min(room, len(rejects))
+    
+    def write(self, directory=REJECTS_DIR):
+        """Write the sampled rejects to <directory>/<name>.csv; returns the path, or None if clean."""
+        if not self.total:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.name}.csv')
+        frame = pd.concat(self.samples)
+        frame.insert(0, 'reported_at', datetime.now().isoformat(timespec='seconds'))
+        frame.to_csv(path, index=False)
+        return path
@@ -0,0 +1,364 @@
+"""
+Long-running collection scheduler.
+
+Each scraper runs on its own interval (SCRAPER_INTERVAL seconds, overridable
+per scraper as SCRAPER_INTERVAL_<NAME>, e.g. SCRAPER_INTERVAL_JUMBO=3600). A
+circuit breaker takes a scraper out of rotation after BREAKER_FAILURES
+consecutive failed or timed-out runs, then lets a single trial run through
+after a cooldown that doubles every time the trial fails.
+
+Expiry is incremental: instead of sweeping on a timer, the scheduler sleeps
+until the earliest valid_until among active discounts and then marks only
+the rows that have just expired.
+
+Run timings and breaker states are written to data/scheduler_status.json
+after every job, and served by /api/scheduler.
+
+Run with:
+    python utils/data_collector.py --schedule
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from scrapers import SCRAPERS
+from models import init_db
+from models.summary import SCHEDULER_STATUS_PATH
+from utils.data_collector import (
+    run_scrapers, clear_old_discounts, next_expiry, update_summary, SCRAPER_MAX_WORKERS
+)
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import heapq
+import itertools
+import json
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCRAPER_INTERVAL = float(os.getenv('SCRAPER_INTERVAL', str(6 * 3600)))
+# Upper bound on the time between expiry runs
+EXPIRY_MAX_INTERVAL = float(os.getenv('EXPIRY_MAX_INTERVAL', '3600'))
+
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '3'))
+BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '1800'))
+BREAKER_MAX_COOLDOWN = float(os.getenv('BREAKER_MAX_COOLDOWN', str(24 * 3600)))
+
+# Heap key of the expiry job
+EXPIRY_JOB = '__expiry__'
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+
+def scraper_interval(name):
+    """Interval in seconds for a scraper, from SCRAPER_INTERVAL_<NAME> or SCRAPER_INTERVAL."""
+    return float(os.getenv(f'SCRAPER_INTERVAL_{name.upper()}', SCRAPER_INTERVAL))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a doubling cooldown."""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN,
+                 max_cooldown=BREAKER_MAX_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.current_cooldown = cooldown
+        self.open_until = None
+    
+    def allow(self, now):
+        """Whether a run may start now; an expired cooldown admits one trial run."""
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return False
+            self.state = self.HALF_OPEN
+        return True
+    
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.current_cooldown = self.cooldown
+        self.open_until = None
+    
+    def record_failure(self, now):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN:
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+            self._open(now)
+        elif self.consecutive_failures >= self.failures:
+            self._open(now)
+    
+    def _open(self, now):
+        self.state = self.OPEN
+        self.open_until = now + self.current_cooldown
+    
+    def to_dict(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'open_until': _iso(self.open_until)
+        }
+
+
+class ScraperJob:
+    """Schedule, breaker and run statistics of one scraper."""
+    
+    def __init__(self, name, scraper_class, interval):
+        self.name = name
+        self.scraper_class = scraper_class
+        self.interval = interval
+        self.breaker = CircuitBreaker()
+        self.next_run = None
+        self.running = False
+        self.runs = 0
+        self.failed_runs = 0
+        self.total_duration = 0.0
+        self.last_run = None
+    
+    def record(self, result, started):
+        """Update statistics and the breaker from a run_scrapers result."""
+        self.runs += 1
+        self.total_duration += result['duration']
+        ingest = result['ingest'] or {}
+        self.last_run = {
+            'started_at': _iso(started),
+            'duration': result['duration'],
+            'status': result['status'],
+            'count': result['count'],
+            'inserted': ingest.get('inserted', 0),
+            'updated': ingest.get('updated', 0),
+            'rejected': ingest.get('rejected', 0),
+            'error': result['error']
+        }
+        
+        if result['status'] == 'ok':
+            self.breaker.record_success()
+        else:
+            self.failed_runs += 1
+            self.breaker.record_failure(time.time())
+    
+    def to_dict(self):
+        return {
+            'interval': self.interval,
+            'next_run': _iso(self.next_run),
+            'running': self.running,
+            'runs': self.runs,
+            'failed_runs': self.failed_runs,
+            'average_duration': round(self.total_duration / self.runs, 3) if self.runs else None,
+            'breaker': self.breaker.to_dict(),
+            'last_run': self.last_run
+        }
+
+
+class Scheduler:
+    """
+    Runs scrapers on their intervals and expires discounts as they lapse.
+    
+    Due jobs are kept in a min-heap keyed on their next run time; the loop
+    sleeps until the earliest one or until a finished run wakes it.
+    Scrapers run on a bounded thread pool through run_scrapers, so each run
+    keeps its timeout; expiry runs on the loop thread.
+    """
+    
+    def __init__(self, scrapers=None, max_workers=None, timeout=None, status_path=SCHEDULER_STATUS_PATH):
+        scrapers = SCRAPERS if scrapers is None else scrapers
+        self.jobs = {
+            name: ScraperJob(name, scraper_class, scraper_interval(name))
+            for name, scraper_class in scrapers.items()
+        }
+        self.timeout = timeout
+        self.status_path = status_path
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or SCRAPER_MAX_WORKERS, thread_name_prefix='scheduled'
+        )
+        
+        self.expiry = {'next_run': None, 'runs': 0, 'expired': 0, 'last_run': None}
+        self.started_at = None
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._summary_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+    
+    def stop(self):
+        """Ask the loop to exit after the current tick."""
+        self._stop.set()
+        self._wakeup.set()
+    
+    def _schedule(self, name, due):
+        """Push a job onto the heap; earlier entries for it become stale."""
+        if name == EXPIRY_JOB:
+            self.expiry['next_run'] = due
+        else:
+            self.jobs[name].next_run = due
+        heapq.heappush(self._heap, (due, next(self._seq), name))
+    
+    def _scheduled_at(self, name):
+        return self.expiry['next_run'] if name == EXPIRY_JOB else self.jobs[name].next_run
+    
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, name = heapq.heappop(self._heap)
+                if when == self._scheduled_at(name):
+                    due.append(name)
+        return due
+    
+    def run_forever(self):
+        """Run until stop() is called."""
+        init_db()
+        self.started_at = time.time()
+        now = time.time()
+        with self._lock:
+            for name in self.jobs:
+                self._schedule(name, now)
+            self._schedule(EXPIRY_JOB, now)
+        
+        logger.info(
+            "Scheduler started: " + ', '.join(f"{name} every {job.interval:.0f}s" for name, job in self.jobs.items())
+        )
+        
+        try:
+            while not self._stop.is_set():
+                for name in self._pop_due(time.time()):
+                    if name == EXPIRY_JOB:
+                        self._run_expiry()
+                    else:
+                        self._dispatch(self.jobs[name])
+                
+                self.write_status()
+                
+                with self._lock:
+                    wait_for = self._heap[0][0] - time.time() if self._heap else EXPIRY_MAX_INTERVAL
+                self._wakeup.wait(timeout=min(max(wait_for, 0), EXPIRY_MAX_INTERVAL))
+                self._wakeup.clear()
+        
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.write_status()
+            logger.info("Scheduler stopped")
+    
+    def _dispatch(self, job):
+        now = time.time()
+        with self._lock:
+            if job.running:
+                # Rescheduled when the current run finishes
+                return
+            if not job.breaker.allow(now):
+                logger.warning(f"Skipping {job.name}: circuit open until {_iso(job.breaker.open_until)}")
+                self._schedule(job.name, job.breaker.open_until)
+                return
+            job.running = True
+        self.executor.submit(self._run_scraper, job)
+    
+    def _run_scraper(self, job):
+        started = time.time()
+        try:
+            result = run_scrapers({job.name: job.scraper_class}, max_workers=1, timeout=self.timeout)[job.name]
+        except Exception as e:
+            logger.error(f"Scheduled run of {job.name} failed: {e}")
+            result = {
+                'status': 'error', 'count': 0, 'ingest': None,
+                'duration': round(time.time() - started, 3), 'error': str(e)
+            }
+        
+        with self._lock:
+            job.record(result, started)
+            job.running = False
+            breaker = job.breaker
+            due = breaker.open_until if breaker.state == breaker.OPEN else started + job.interval
+            self._schedule(job.name, max(due, time.time()))
+        
+        logger.info(
+            f"Scheduled run of {job.name}: {result['status']} in {result['duration']}s "
+            f"({result['count']} records), breaker {job.breaker.state}"
+        )
+        
+        ingest = result['ingest'] or {}
+        if ingest.get('inserted') or ingest.get('updated'):
+            with self._summary_lock:
+                update_summary()
+            # New rows may expire before the currently scheduled expiry run
+            upcoming = next_expiry()
+            if upcoming is not None:
+                with self._lock:
+                    due = upcoming.timestamp() + 1
+                    if self.expiry['next_run'] is None or due < self.expiry['next_run']:
+                        self._schedule(EXPIRY_JOB, due)
+        
+        self._wakeup.set()
+    
+    def _run_expiry(self):
+        started = time.time()
+        with self._summary_lock:
+            expired = clear_old_discounts()
+        upcoming = next_expiry()
+        duration = round(time.time() - started, 3)
+        
+        due = time.time() + EXPIRY_MAX_INTERVAL
+        if upcoming is not None:
+            # valid_until is inclusive, so run just after it has passed
+            due = min(due, upcoming.timestamp() + 1)
+        
+        with self._lock:
+            self.expiry['runs'] += 1
+            self.expiry['expired'] += expired
+            self.expiry['last_run'] = {'started_at': _iso(started), 'duration': duration, 'expired': expired}
+            self._schedule(EXPIRY_JOB, due)
+    
+    def status(self):
+        """Snapshot of the scheduler state and run timings."""
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': _iso(self.started_at),
+                'updated_at': _iso(time.time()),
+                'scrapers': {name: job.to_dict() for name, job in self.jobs.items()},
+                'expiry': {
+                    'next_run': _iso(self.expiry['next_run']),
+                    'runs': self.expiry['runs'],
+                    'expired': self.expiry['expired'],
+                    'last_run': self.expiry['last_run']
+                }
+            }
+    
+    def write_status(self):
+        """Atomically write status() to the status file read by the API."""
+        tmp_path = f'{self.status_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.status(), f, indent=2)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.error(f"Error writing scheduler status: {e}")
+
+
+def run_scheduler(scrapers=None, max_workers=None, timeout=None):
+    """Run a Scheduler in the foreground until SIGINT or SIGTERM."""
+    scheduler = Scheduler(scrapers=scrapers, max_workers=max_workers, timeout=timeout)
+    
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping scheduler")
+        scheduler.stop()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    scheduler.run_forever()
+    return scheduler
+
+
+if __name__ == '__main__':
+    run_scheduler()
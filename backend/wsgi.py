@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers.
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Run from the backend directory, which puts it on sys.path.
+"""
+from api.app import create_app
+
+app = create_app()
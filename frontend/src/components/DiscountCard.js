@@ -4,6 +4,19 @@
 import React from 'react';
 import './DiscountCard.css';
 
+// Fields rendered by the card; the dashboard requests only these via ?fields=
+export const DISCOUNT_CARD_FIELDS = [
+  'id',
+  'supermarket',
+  'product_name',
+  'category',
+  'original_price',
+  'discount_price',
+  'discount_percentage',
+  'description',
+  'valid_until'
+];
+
 const DiscountCard = ({ discount }) => {
   const formatPrice = (price) => {
     return price ? `€${price.toFixed(2)}` : 'N/A';
@@ -1,20 +1,27 @@
 /**
  * Dashboard page - main view for displaying discounts
  */
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { getDiscounts, getSupermarkets, getCategories, getStats } from '../services/api';
-import DiscountCard from '../components/DiscountCard';
+import DiscountCard, { DISCOUNT_CARD_FIELDS } from '../components/DiscountCard';
 import FilterBar from '../components/FilterBar';
 import './Dashboard.css';
 
+const PAGE_SIZE = 50;
+const CARD_FIELDS = DISCOUNT_CARD_FIELDS.join(',');
+
 const Dashboard = () => {
   const [discounts, setDiscounts] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [supermarkets, setSupermarkets] = useState([]);
   const [categories, setCategories] = useState([]);
   const [stats, setStats] = useState(null);
   const [filters, setFilters] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const sentinelRef = useRef(null);
 
   useEffect(() => {
     loadInitialData();
@@ -45,8 +52,10 @@ const Dashboard = () => {
   const loadDiscounts = async () => {
     setLoading(true);
     try {
-      const data = await getDiscounts(filters);
+      const data = await getDiscounts({ ...filters, limit: PAGE_SIZE, fields: CARD_FIELDS });
       setDiscounts(data.discounts);
+      setTotal(data.total);
+      setNextCursor(data.next_cursor);
       setError(null);
     } catch (err) {
       setError('Failed to load discounts');
@@ -56,6 +65,45 @@ const Dashboard = () => {
     }
   };
 
+  // Keyset pagination: follow next_cursor and skip the count on later pages
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || loadingMore) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const data = await getDiscounts({
+        ...filters,
+        limit: PAGE_SIZE,
+        fields: CARD_FIELDS,
+        cursor: nextCursor,
+        include_total: false
+      });
+      setDiscounts(prev => [...prev, ...data.discounts]);
+      setNextCursor(data.next_cursor);
+    } catch (err) {
+      setError('Failed to load more discounts');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [filters, nextCursor, loadingMore]);
+
+  // Infinite scroll: load the next page when the sentinel becomes visible
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor) {
+      return undefined;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        loadMore();
+      }
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [loadMore, nextCursor]);
+
   const handleFilterChange = (key, value) => {
     if (key === 'reset') {
       setFilters({});
@@ -117,13 +165,18 @@ const Dashboard = () => {
           ) : (
             <>
               <div className="results-info">
-                <p>{discounts.length} kortingen gevonden</p>
+                <p>{total} kortingen gevonden</p>
               </div>
               <div className="discounts-grid">
                 {discounts.map((discount) => (
                   <DiscountCard key={discount.id} discount={discount} />
                 ))}
               </div>
+              {nextCursor && (
+                <div ref={sentinelRef} className="load-more">
+                  {loadingMore && <p>Meer laden...</p>}
+                </div>
+              )}
             </>
           )}
         </>
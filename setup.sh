@@ -65,7 +65,7 @@ echo ""
 echo "Terminal 1 (Backend):"
 echo "  cd backend"
 echo "  source venv/bin/activate"
-echo "  python api/app.py"
+echo "  python -m api.app"
 echo ""
 echo "Terminal 2 (Frontend):"
 echo "  cd frontend"
@@ -12,7 +12,7 @@ else
     cd backend
     source venv/bin/activate
     export FLASK_ENV=development
-    nohup python api/app.py > /tmp/backend.log 2>&1 &
+    nohup python -m api.app > /tmp/backend.log 2>&1 &
     cd ..
     echo "✅ Backend started on http://localhost:5000"
 fi
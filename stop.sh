@@ -8,7 +8,7 @@ echo "🛑 Stopping Bonus Discount Dashboard..."
 if lsof -ti:5000 > /dev/null 2>&1; then
     echo "Stopping backend..."
     lsof -ti:5000 | xargs kill
-    pkill -f "python.*api/app.py"
+    pkill -f "python.*api.app"
     echo "✅ Backend stopped"
 else
     echo "Backend not running"
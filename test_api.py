@@ -117,6 +117,21 @@ def test_stats():
         print(f"❌ Stats endpoint failed: {e}")
         return False
 
+def test_metrics():
+    """Test metrics endpoint."""
+    print("\nTesting /api/metrics...")
+    try:
+        response = requests.get(f"{API_BASE_URL}/metrics")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert "# TYPE api_request_duration_seconds histogram" in response.text
+        assert 'api_requests_total{endpoint="/api/stats",method="GET",status="200"}' in response.text
+        print("✅ Metrics endpoint passed")
+        return True
+    except Exception as e:
+        print(f"❌ Metrics endpoint failed: {e}")
+        return False
+
 def main():
     """Run all tests."""
     print("=" * 60)
@@ -129,7 +144,8 @@ def main():
         test_discounts_with_filters,
         test_supermarkets,
         test_categories,
-        test_stats
+        test_stats,
+        test_metrics
     ]
     
     results = []
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Ingestion Test Script
+
+Runs the ingestion paths (bulk upserts, price history, product matching)
+against a throwaway SQLite database and checks the rows they leave behind.
+
+Failures raise, so pytest can collect the tests as well.
+
+Usage:
+    python test_ingestion.py
+    python -m pytest test_ingestion.py
+"""
+
+import sys
+import os
+import tempfile
+
+# Point the backend at a temporary database before anything imports it
+DB_FD, DB_PATH = tempfile.mkstemp(suffix='.db', prefix='ingestion_')
+os.close(DB_FD)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from benchmarks.bench_pipeline import FixtureScraper
+from benchmarks.fixture_server import serve_fixtures
+from benchmarks.synthetic import synthetic_discounts, remove_database
+from models.database import Base, SessionLocal, engine, init_db
+from scrapers.page_cache import PageCache
+from utils.data_collector import run_pipeline
+from utils.export import iter_chunks
+from utils.ingestion import bulk_ingest
+from utils.normalization import RejectsReport, normalize_batch
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from sqlalchemy import event, text
+import logging
+import shutil
+import threading
+
+
+def reset_database():
+    """Drop and recreate every table, so each test starts empty."""
+    Base.metadata.drop_all(engine)
+    init_db()
+
+
+def teardown_module():
+    """Remove the throwaway database; pytest calls this after the last test."""
+    engine.dispose()
+    remove_database(DB_PATH)
+
+
+def passed(test):
+    """Run one test, which prints its own result; returns whether it passed."""
+    try:
+        test()
+        return True
+    except Exception:
+        return False
+
+
+def scalar(sql):
+    with engine.connect() as conn:
+        return conn.execute(text(sql)).scalar()
+
+
+def test_concurrent_matching():
+    """Test that stores ingesting the same product names at once all succeed."""
+    print("\nTesting concurrent ingestion of shared product names...")
+    try:
+        reset_database()
+        names = list(synthetic_discounts(3000))
+        stores = ['Store A', 'Store B', 'Store C', 'Store D']
+        barrier = threading.Barrier(len(stores))
+        errors = []
+        
+        def ingest(store):
+            records = [dict(r, supermarket=store, product_url=f"{r['product_url']}?{store}") for r in names]
+            barrier.wait()
+            try:
+                bulk_ingest(records, batch_size=500)
+            except Exception as e:
+                errors.append(f"{store}: {e}")
+        
+        threads = [threading.Thread(target=ingest, args=(store,)) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert not errors, errors[0]
+        assert scalar("SELECT COUNT(*) FROM discounts") == len(names) * len(stores)
+        # Each name is one canonical product shared by every store
+        assert scalar("SELECT COUNT(*) FROM canonical_products") == len(names)
+        assert scalar("SELECT COUNT(DISTINCT canonical_id) FROM products") == len(names)
+        assert scalar("SELECT COUNT(*) FROM products WHERE canonical_id IS NULL") == 0
+        print(f"✅ Concurrent matching passed ({len(stores)} stores x {len(names)} names)")
+    except Exception as e:
+        print(f"❌ Concurrent matching failed: {e}")
+        raise
+
+
+def test_reingest_without_valid_from():
+    """Test that re-scrapes of an offer without a valid_from update one row."""
+    print("\nTesting re-ingestion without valid_from...")
+    try:
+        reset_database()
+        record = dict(next(synthetic_discounts(1)), valid_from=None)
+        counts = []
+        for price in (1.99, 1.49, 0.99):
+            stats = bulk_ingest([dict(record, discount_price=price)])
+            counts.append((stats['inserted'], stats['updated']))
+        
+        assert counts == [(1, 0), (0, 1), (0, 1)], f"(inserted, updated) per run: {counts}"
+        active = scalar("SELECT COUNT(*) FROM discounts WHERE is_active = 1")
+        assert active == 1, f"{active} active rows"
+        assert scalar("SELECT discount_price FROM discounts") == 0.99
+        assert scalar("SELECT COUNT(*) FROM discounts WHERE valid_from IS NULL") == 0
+        print("✅ Re-ingestion without valid_from passed (3 runs, 1 row)")
+    except Exception as e:
+        print(f"❌ Re-ingestion without valid_from failed: {e}")
+        raise
+
+
+def test_null_valid_from_migration():
+    """Test that init_db collapses rows stored with a NULL valid_from."""
+    print("\nTesting migration of NULL valid_from rows...")
+    try:
+        reset_database()
+        bulk_ingest(synthetic_discounts(3))
+        # Duplicates of the first product, as ingestion used to insert them
+        with engine.begin() as conn:
+            for price in (2.0, 1.5):
+                conn.execute(text(
+                    "INSERT INTO discounts (supermarket, product_key, product_name, discount_price, "
+                    "is_active, is_all_time_low, created_at, updated_at) "
+                    "SELECT supermarket, product_key, product_name, :price, 1, 0, created_at, updated_at "
+                    "FROM discounts WHERE id = 1"
+                ), {'price': price})
+                conn.execute(text(
+                    "INSERT INTO discounts (supermarket, product_key, product_name, discount_price, "
+                    "is_active, is_all_time_low, created_at, updated_at) "
+                    "SELECT supermarket, product_key || '-old', product_name, :price, 1, 0, created_at, updated_at "
+                    "FROM discounts WHERE id = 2"
+                ), {'price': price})
+        
+        init_db()
+        # The first product's duplicates collide with its stored offer and are dropped;
+        # the second product's newest duplicate is kept, keyed on its created_at day
+        assert scalar("SELECT COUNT(*) FROM discounts WHERE valid_from IS NULL") == 0
+        rows = scalar("SELECT COUNT(*) FROM discounts")
+        assert rows == 4, f"{rows} rows left"
+        assert scalar("SELECT discount_price FROM discounts WHERE product_key LIKE '%-old'") == 1.5
+        print("✅ NULL valid_from migration passed")
+    except Exception as e:
+        print(f"❌ NULL valid_from migration failed: {e}")
+        raise
+
+
+def test_unchanged_rerun_extends_history():
+    """Test that re-ingesting unchanged records only extends the history and changed ones update it."""
+    print("\nTesting re-ingestion of unchanged and changed records...")
+    writes = []
+    
+    def count_writes(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            writes.append(statement)
+    
+    try:
+        reset_database()
+        records = list(synthetic_discounts(2000))
+        bulk_ingest(records, batch_size=500)
+        
+        event.listen(engine, 'before_cursor_execute', count_writes)
+        try:
+            stats = bulk_ingest(records, batch_size=500)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_writes)
+        # Extending the runs and the products, per batch; no discount is rewritten
+        assert all(w.lstrip().upper().startswith('UPDATE') for w in writes), writes
+        assert len(writes) == 2 * stats['batches'], f"{len(writes)} writes in {stats['batches']} batches"
+        assert stats['unchanged'] == len(records), stats
+        assert scalar("SELECT COUNT(*) FROM price_history WHERE observations = 2") == len(records)
+        assert scalar("SELECT COUNT(*) FROM products WHERE observations = 2") == len(records)
+        
+        # The first half keeps its prices (one run, extended), the second half gets new ones
+        half = len(records) // 2
+        changed = [dict(r, description='Nu extra voordelig') for r in records[:half]]
+        changed += [dict(r, discount_price=round(r['discount_price'] * 0.9, 2)) for r in records[half:]]
+        stats = bulk_ingest(changed, batch_size=500)
+        assert stats['updated'] == len(records), stats
+        
+        extended = scalar("SELECT COUNT(*) FROM price_history WHERE observations = 3")
+        appended = scalar("SELECT COUNT(*) FROM products WHERE observations = 3") - extended
+        assert extended == half, f"{extended} runs extended"
+        assert appended == len(records) - half, f"{appended} runs appended"
+        assert scalar("SELECT COUNT(*) FROM price_history") == len(records) + appended
+        assert scalar(
+            "SELECT COUNT(*) FROM products p JOIN price_history r ON r.id = p.last_run_id "
+            "WHERE r.discount_price IS NOT p.last_price OR r.last_seen IS NOT p.last_seen"
+        ) == 0
+        print(f"✅ Re-ingestion passed (unchanged run wrote {len(writes)} UPDATEs, {extended} runs extended)")
+    except Exception as e:
+        print(f"❌ Re-ingestion of unchanged records failed: {e}")
+        raise
+
+
+def test_rejects_bad_product_names():
+    """Test that records without a usable product name are rejected, not the whole batch."""
+    print("\nTesting normalization of bad product names...")
+    try:
+        reset_database()
+        records = list(synthetic_discounts(5))
+        bad_names = [None, float('nan'), 42, '   ']
+        for record, name in zip(records, bad_names):
+            record['product_name'] = name
+        
+        report = RejectsReport('test')
+        stats = bulk_ingest(records, prepare=partial(normalize_batch, report=report))
+        assert stats['rejected'] == len(bad_names), stats
+        assert stats['inserted'] == len(records) - len(bad_names), stats
+        assert report.counts == {'missing product_name': len(bad_names)}, report.counts
+        # Batches of nothing but bad names are rejected too
+        assert normalize_batch([dict(records[0], product_name=42)]) == []
+        print(f"✅ Bad product names passed ({len(bad_names)} rejected, 1 stored)")
+    except Exception as e:
+        print(f"❌ Bad product names failed: {e}")
+        raise
+
+
+def test_missing_original_price():
+    """Test that offers without an original price are stored with NULL prices, not rejected."""
+    print("\nTesting normalization of missing original prices...")
+    try:
+        reset_database()
+        records = list(synthetic_discounts(6))
+        for record, original in zip(records, [None, float('nan'), '', 'gratis', 0]):
+            record['original_price'] = original
+        # A promotion label alone cannot be priced without an original price
+        records[5].update(original_price=None, discount_price='1+1 gratis')
+        
+        report = RejectsReport('test')
+        stats = bulk_ingest(records, prepare=partial(normalize_batch, report=report))
+        assert stats['inserted'] == 3, stats
+        assert report.counts == {'invalid original_price': 2, 'invalid discount_price': 1}, report.counts
+        rows = scalar(
+            "SELECT COUNT(*) FROM discounts WHERE original_price IS NULL "
+            "AND discount_percentage IS NULL AND discount_price > 0"
+        )
+        assert rows == 3, f"{rows} rows stored with NULL original prices"
+        print(f"✅ Missing original prices passed ({rows} stored, {report.total} rejected)")
+    except Exception as e:
+        print(f"❌ Missing original prices failed: {e}")
+        raise
+
+
+def test_export_during_ingestion():
+    """Test that an export running while the collector ingests reads one snapshot."""
+    print("\nTesting an export overlapping an ingestion...")
+    session = SessionLocal()
+    try:
+        reset_database()
+        records = list(synthetic_discounts(400))
+        bulk_ingest(records[:200])
+        
+        chunks = iter_chunks(session, columns=['id'], chunk_size=50)
+        exported = len(next(chunks))
+        # Committed after the export started; the new rows sort after the exported ones
+        bulk_ingest(records[200:])
+        exported += sum(len(chunk) for chunk in chunks)
+        
+        assert scalar("SELECT COUNT(*) FROM discounts") == 400
+        assert exported == 200, f"{exported} rows exported"
+        print(f"✅ Export during ingestion passed ({exported} rows, one snapshot)")
+    except Exception as e:
+        print(f"❌ Export during ingestion failed: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def test_pipeline_skips_unchanged_pages():
+    """Test that a pipeline re-run drops pages the page cache has seen unchanged."""
+    print("\nTesting pipeline re-run over unchanged pages...")
+    cache_dir = tempfile.mkdtemp(prefix='page_cache_')
+    try:
+        reset_database()
+        pages = 5
+        runs = []
+        with serve_fixtures() as server, ThreadPoolExecutor(max_workers=1) as pool:
+            scraper = FixtureScraper(server.base_url, pages)
+            scraper.page_cache = PageCache(cache_dir)
+            try:
+                for _ in range(2):
+                    count, _ = run_pipeline(scraper, scraper.page_urls(), parse_pool=pool)
+                    runs.append(count)
+            finally:
+                scraper.close()
+        
+        assert runs[0] > 0 and runs[1] == 0, f"records per run: {runs}"
+        skipped = scraper.page_cache.stats['skipped']
+        assert skipped == pages, f"{skipped} pages skipped"
+        print(f"✅ Pipeline re-run passed ({runs[0]} records, then {skipped} pages skipped)")
+    except Exception as e:
+        print(f"❌ Pipeline re-run failed: {e}")
+        raise
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_pipeline_retries_failed_pages():
+    """Test that pages of a run whose ingest failed are processed again on the next run."""
+    print("\nTesting pipeline re-run after a failed ingest...")
+    cache_dir = tempfile.mkdtemp(prefix='page_cache_')
+    
+    def failing_session():
+        raise RuntimeError("database unavailable")
+    
+    try:
+        reset_database()
+        pages = 5
+        with serve_fixtures() as server, ThreadPoolExecutor(max_workers=1) as pool:
+            scraper = FixtureScraper(server.base_url, pages)
+            scraper.page_cache = PageCache(cache_dir)
+            try:
+                try:
+                    run_pipeline(scraper, scraper.page_urls(), parse_pool=pool, session_factory=failing_session)
+                    raise AssertionError("the failing run did not raise")
+                except RuntimeError:
+                    pass
+                count, stats = run_pipeline(scraper, scraper.page_urls(), parse_pool=pool)
+            finally:
+                scraper.close()
+        
+        stored = scalar("SELECT COUNT(*) FROM discounts")
+        # Fixture pages repeat some products, so rows are fewer than records
+        assert count > 0 and stats['inserted'] > 0, f"second run: {count} records, {stats}"
+        assert stored == stats['inserted'], f"{stored} rows stored"
+        assert scraper.page_cache.stats['skipped'] == 0
+        print(f"✅ Pipeline retry passed ({count} records ingested after the failed run)")
+    except Exception as e:
+        print(f"❌ Pipeline retry failed: {e}")
+        raise
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    """Run all tests."""
+    logging.disable(logging.INFO)
+    print("=" * 60)
+    print("Ingestion Tests")
+    print("=" * 60)
+    
+    tests = [
+        test_concurrent_matching,
+        test_reingest_without_valid_from,
+        test_null_valid_from_migration,
+        test_unchanged_rerun_extends_history,
+        test_rejects_bad_product_names,
+        test_missing_original_price,
+        test_export_during_ingestion,
+        test_pipeline_skips_unchanged_pages,
+        test_pipeline_retries_failed_pages
+    ]
+    
+    try:
+        results = [passed(test) for test in tests]
+    finally:
+        teardown_module()
+    
+    print("\n" + "=" * 60)
+    print(f"Results: {sum(results)}/{len(results)} tests passed")
+    print("=" * 60)
+    
+    if all(results):
+        print("✅ All tests passed!")
+        sys.exit(0)
+    else:
+        print("❌ Some tests failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Query Plan Test Script
+
+Runs every API endpoint (plus ingestion and expiry) against a throwaway
+SQLite database filled with synthetic discounts, records the SQL each one
+executes and checks it with EXPLAIN QUERY PLAN. A query fails when SQLite
+scans one of the model tables without an index or builds a temporary
+B-tree to sort or group its rows, i.e. when an access pattern is no longer
+covered by the indexes on the models.
+
+Usage:
+    python test_query_plans.py [ROWS]
+"""
+
+import sys
+import os
+import tempfile
+
+# Point the backend at a temporary database before anything imports it
+DB_FD, DB_PATH = tempfile.mkstemp(suffix='.db', prefix='plans_')
+os.close(DB_FD)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from api.app import create_app
+from benchmarks.synthetic import synthetic_discounts, remove_database
+from models.database import Base, engine, SessionLocal, init_db
+from models.summary import refresh_summary
+from utils.ingestion import bulk_ingest
+from utils.data_collector import clear_old_discounts, next_expiry
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import re
+
+# Access patterns that are allowed to sort with a temporary B-tree, and why.
+# Each sorts a set that is already narrowed down, not the discounts table.
+ALLOWED_TEMP_BTREES = {
+    'stats': 'window functions rank the rows of each filtered group',
+    'search': 'full-text matches are looked up by rowid, then ordered',
+    'relevance': 'bm25 rank is computed per query',
+    'compare': 'category and search filters narrow the offers first, then group them',
+}
+
+# Tables whose full scans fail a check (FTS and subqueries are not included)
+TABLES = set(Base.metadata.tables)
+
+captured = []
+
+
+def capture_statements(conn, cursor, statement, parameters, context, executemany):
+    """Record every statement that reads or updates a model table."""
+    if not any(table in statement for table in TABLES):
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper()
+    if verb in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+        # The plan of an executemany is the plan of any one parameter set
+        captured.append((statement, parameters[0] if executemany else parameters))
+
+
+def explain(statement, parameters):
+    """Return the EXPLAIN QUERY PLAN detail lines of a statement."""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan, allowed=None):
+    """Full table scans and disallowed temp B-trees in a plan."""
+    problems = []
+    for step in plan:
+        scan = re.match(r'SCAN (\w+)', step)
+        if scan and scan.group(1) in TABLES and 'USING' not in step:
+            problems.append(step)
+        elif 'USE TEMP B-TREE' in step and allowed is None:
+            problems.append(step)
+    return problems
+
+
+def check(name, run, allowed=None):
+    """Run one access pattern and check the plan of every query it executed."""
+    print(f"\nChecking {name}...")
+    captured.clear()
+    try:
+        run()
+        assert captured, "no queries on the model tables were executed"
+        failures = []
+        for statement, parameters in captured:
+            plan = explain(statement, parameters)
+            problems = plan_problems(plan, allowed)
+            if problems:
+                failures.append((statement, plan, problems))
+        
+        if failures:
+            for statement, plan, problems in failures:
+                print(f"❌ {' '.join(statement.split())[:200]}")
+                for step in plan:
+                    print(f"     {'!!' if step in problems else '  '} {step}")
+            print(f"❌ {name} failed: {len(failures)} of {len(captured)} queries not served by an index")
+            return False
+        
+        note = f" (temp B-tree allowed: {ALLOWED_TEMP_BTREES[allowed]})" if allowed else ""
+        print(f"✅ {name} passed ({len(captured)} queries){note}")
+        return True
+    except Exception as e:
+        print(f"❌ {name} failed: {e}")
+        return False
+
+
+def get(client, url):
+    """Request url and fail on a non-200 response."""
+    def run():
+        response = client.get(url)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+        return response.get_json()
+    return run
+
+
+def get_body(client, url):
+    """Request url and read its streamed body."""
+    def run():
+        response = client.get(url)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+        response.get_data()
+    return run
+
+
+def get_next_page(client, url):
+    """Request the page after the first page of url via its cursor."""
+    def run():
+        first = get(client, url)()
+        assert first['next_cursor'], "first page has no next_cursor"
+        captured.clear()
+        separator = '&' if '?' in url else '?'
+        get(client, f"{url}{separator}cursor={first['next_cursor']}")()
+    return run
+
+
+def refresh():
+    """Rebuild the summary: the unfiltered stats aggregate behind /api/stats."""
+    session = SessionLocal()
+    try:
+        refresh_summary(session)
+    finally:
+        session.close()
+
+
+def one_supermarket(records, supermarket='Jumbo'):
+    """Records of one supermarket, the way a scraper ingests them."""
+    return (r for r in records if r['supermarket'] == supermarket)
+
+
+def populate(rows):
+    """Fill the database with active and expired synthetic discounts."""
+    init_db()
+    bulk_ingest(synthetic_discounts(rows))
+    # A slice of last week's offers, already expired
+    past = datetime.now() - timedelta(days=7)
+    expired = [
+        dict(d, valid_from=past, valid_until=past + timedelta(days=3))
+        for d in synthetic_discounts(rows // 5, seed=7, start=rows)
+    ]
+    bulk_ingest(expired)
+    clear_old_discounts()
+    refresh()
+
+
+def main():
+    """Run all plan checks."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    
+    print("=" * 60)
+    print("Query Plan Tests")
+    print("=" * 60)
+    
+    try:
+        populate(rows)
+        print(f"Database populated with {rows} active discounts")
+        
+        event.listen(engine, 'before_cursor_execute', capture_statements)
+        client = create_app().test_client()
+        
+        checks = [
+            ("/api/discounts", get(client, '/api/discounts')),
+            ("/api/discounts?supermarket", get(client, '/api/discounts?supermarket=Jumbo')),
+            ("/api/discounts?category", get(client, '/api/discounts?category=Zuivel')),
+            ("/api/discounts?min_discount", get(client, '/api/discounts?min_discount=40')),
+            ("/api/discounts?supermarket&category", get(client, '/api/discounts?supermarket=Lidl&category=Brood')),
+            ("/api/discounts?supermarket&min_discount", get(client, '/api/discounts?supermarket=Dirk&min_discount=30')),
+            ("/api/discounts?include_total=false", get(client, '/api/discounts?include_total=false&limit=20')),
+            ("/api/discounts?cursor", get_next_page(client, '/api/discounts?include_total=false')),
+            (
+                "/api/discounts?supermarket&cursor",
+                get_next_page(client, '/api/discounts?supermarket=Jumbo&include_total=false')
+            ),
+            ("/api/discounts?category&cursor", get_next_page(client, '/api/discounts?category=Vlees&include_total=false')),
+            ("/api/discounts?format=ndjson", get_body(client, '/api/discounts?format=ndjson&category=Brood')),
+            ("/api/discounts?search", get(client, '/api/discounts?search=koffie'), 'search'),
+            (
+                "/api/discounts?search&supermarket",
+                get(client, '/api/discounts?search=kaas&supermarket=Jumbo'), 'search'
+            ),
+            ("/api/discounts/<id>", get(client, '/api/discounts/1')),
+            ("/api/products/<id>/history", get(client, '/api/products/1/history')),
+            ("/api/compare", get(client, '/api/compare')),
+            ("/api/compare?include_single", get(client, '/api/compare?include_single=true')),
+            ("/api/compare?after", get(client, '/api/compare?include_single=true&after=100')),
+            ("/api/compare?canonical_id", get(client, '/api/compare?canonical_id=1&include_single=true')),
+            (
+                "/api/compare?category",
+                get(client, '/api/compare?category=Zuivel&include_single=true'), 'compare'
+            ),
+            ("/api/compare?search", get(client, '/api/compare?search=cola&include_single=true'), 'compare'),
+            ("/api/export", get_body(client, '/api/export')),
+            ("/api/export?supermarket", get_body(client, '/api/export?supermarket=Jumbo&format=json')),
+            ("/api/export?category", get_body(client, '/api/export?category=Zuivel')),
+            ("/api/supermarkets", get(client, '/api/supermarkets')),
+            ("/api/categories", get(client, '/api/categories')),
+            ("/api/stats", get(client, '/api/stats')),
+            ("/api/stats aggregate (summary refresh)", refresh, 'stats'),
+            ("/api/stats?supermarket", get(client, '/api/stats?supermarket=Jumbo'), 'stats'),
+            ("/api/stats?category", get(client, '/api/stats?category=Zuivel'), 'stats'),
+            ("/api/discounts?sort=relevance", get(client, '/api/discounts?search=melk&sort=relevance'), 'relevance'),
+            ("ingestion (re-run)", lambda: bulk_ingest(one_supermarket(synthetic_discounts(4000)))),
+            (
+                "ingestion (new lows)",
+                lambda: bulk_ingest(
+                    dict(r, discount_price=round(r['discount_price'] * 0.9, 2))
+                    for r in one_supermarket(synthetic_discounts(4000))
+                )
+            ),
+            ("expiry", clear_old_discounts),
+            ("next expiry", next_expiry),
+        ]
+        
+        results = [check(*args) for args in checks]
+    
+    finally:
+        engine.dispose()
+        remove_database(DB_PATH)
+    
+    print("\n" + "=" * 60)
+    print(f"Results: {sum(results)}/{len(results)} tests passed")
+    print("=" * 60)
+    
+    if all(results):
+        print("✅ All tests passed!")
+        sys.exit(0)
+    else:
+        print("❌ Some tests failed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()